@@ -1,3 +1,5 @@
+from typing import Any
+
 import awkward as ak
 import numpy as np
 from numpy.typing import NDArray
@@ -32,6 +34,90 @@ def flat_np_view(ak_array: ak.Array, axis: int | None = None) -> NDArray:
     return np.asarray(ak.flatten(ak_array, axis=axis))
 
 
+def flat_offsets(ak_array: ak.Array) -> NDArray[np.int64]:
+    """
+    Returns the per-event offsets into the flattened contents of *ak_array* (with one level of
+    nesting), i.e. the contents of event *i* are ``flat_np_view(ak_array)[offsets[i]:offsets[i + 1]]``.
+    """
+    offsets = np.zeros(len(ak_array) + 1, dtype=np.int64)
+    np.cumsum(ak.num(ak_array, axis=1), out=offsets[1:])
+    return offsets
+
+
+def project_fields(array: ak.Array, fields: list[str] | tuple[str, ...]) -> ak.Array:
+    """
+    Returns a record array with only the requested *fields* of *array*. Nested fields are given
+    as dotted paths, e.g. ``["run", "muons.pt", "muons.eta"]`` keeps ``run`` and a ``muons``
+    collection with only ``pt`` and ``eta``. Buffers are shared with *array*, nothing is copied.
+    """
+    projection: dict[str, list[str] | None] = {}
+    for field in fields:
+        top, _, nested = field.partition(".")
+        if top not in ak.fields(array):
+            raise ValueError(f"{top} is not a field of the array")
+
+        if nested == "" or projection.get(top, []) is None:
+            projection[top] = None
+        else:
+            projection.setdefault(top, []).append(nested)  # type: ignore
+
+    contents = []
+    for top, nested in projection.items():
+        if nested is None:
+            contents.append(ak.to_layout(array[top]))
+        else:
+            contents.append(ak.to_layout(array[top][list(dict.fromkeys(nested))]))
+
+    return ak.Array(
+        ak.contents.RecordArray(contents, list(projection), length=len(array)),
+        behavior=array.behavior,
+    )
+
+
+def constant_array(value: Any, length: int, dtype: Any = None) -> ak.Array:
+    """
+    Returns a flat array of *length* copies of *value*, without allocating them: the buffer is a
+    zero-stride NumPy view of a single value, only materialized if a consumer needs a real buffer
+    (e.g. ``ak.values_astype`` or ``np.ascontiguousarray``).
+    """
+    dtype = np.asarray(value).dtype if dtype is None else np.dtype(dtype)
+    return ak.Array(
+        ak.contents.NumpyArray(
+            np.broadcast_to(np.asarray(value, dtype=dtype), (length,))
+        )
+    )
+
+
+def constant_jagged(value: Any, offsets: NDArray, dtype: Any = None) -> ak.Array:
+    """
+    Returns a jagged array with the structure given by *offsets* and every entry equal to *value*.
+    Only the offsets are stored, see ``constant_array``.
+    """
+    content = constant_array(value, int(offsets[-1]), dtype)
+    return ak.Array(
+        ak.contents.ListOffsetArray(
+            ak.index.Index64(np.asarray(offsets, dtype=np.int64)),
+            ak.to_layout(content),
+        )
+    )
+
+
+def constant_like(template: ak.Array, value: Any, dtype: Any = None) -> ak.Array:
+    """
+    Returns an array with the same structure as *template* (flat or with one level of nesting) and
+    every entry equal to *value*. Same as ``ak.full_like``, but without allocating the values.
+    """
+    layout = ak.to_layout(template)
+    if isinstance(layout, ak.contents.NumpyArray):
+        return constant_array(
+            value, len(template), layout.dtype if dtype is None else dtype
+        )
+
+    if dtype is None:
+        dtype = flat_np_view(template).dtype
+    return constant_jagged(value, flat_offsets(template), dtype)
+
+
 def _metric_table(a, b, axis, metric, return_combinations, nested):
     if axis is None:
         a, b = a, b
@@ -61,3 +147,39 @@ def deltaR_table(
         return_combinations=False,
         nested=False,
     )
+
+
+def overlay_fields(array: ak.Array, replacements: dict[str, ak.Array]) -> ak.Array:
+    """
+    Returns a new record array that shares every column of *array* and takes the columns given in
+    *replacements* instead of the original ones (new fields are appended). The record layout is
+    assembled directly from the existing contents, so no buffer is copied and *array* itself is
+    never modified. The cost is proportional to the number of fields, not to the number of events.
+    """
+    layout = ak.to_layout(array)
+    fields = list(ak.fields(array))
+
+    contents = []
+    for field in fields:
+        if field in replacements:
+            contents.append(ak.to_layout(replacements[field]))
+        elif isinstance(layout, ak.contents.RecordArray):
+            contents.append(layout.content(field))
+        else:
+            contents.append(ak.to_layout(array[field]))
+
+    for field in replacements:
+        if field not in fields:
+            fields.append(field)
+            contents.append(ak.to_layout(replacements[field]))
+
+    for field, content in zip(fields, contents):
+        if content.length != len(array):
+            raise ValueError(
+                f"{field} has length {content.length}, expected {len(array)}"
+            )
+
+    return ak.Array(
+        ak.contents.RecordArray(contents, fields, length=len(array)),
+        behavior=array.behavior,
+    )
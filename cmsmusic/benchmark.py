@@ -0,0 +1,214 @@
+"""
+Offline benchmarks of the building blocks of the analysis, on synthetic files (see `synthetic.py`).
+
+For each dataset type and number of events, a synthetic file is written and the /cvmfs inputs are
+read from local stand-ins. Both are written once and reused as long as the configuration does not
+change.
+Every benchmark runs once to warm up (numba compilation, loading of the corrections), then is
+timed `repeat` times, keeping the fastest run.
+"""
+
+import contextlib
+import hashlib
+import io
+import logging
+import os
+import shutil
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import awkward as ak
+import numpy as np
+import uproot
+from numba import njit
+
+from .ak_utils import deltaR_table
+from .classification import classification_variations
+from .cvmfs import CVMFS_MIRROR_VAR
+from .dataset import Dataset, DatasetType
+from .events import Events, EventsBuilder
+from .events.jets import _build_jets
+from .events.muons import _build_muons
+from .filters import JetId, JetIdWP, JetVetoMaps, LumiMask
+from .nb_hist import make_uniform_hist, make_uniform_hist_collection, make_variable_hist
+from .synthetic import (
+    SyntheticConfig,
+    synthetic_dataset,
+    write_stand_ins,
+    write_synthetic_file,
+)
+from .variation import Variation, VariationEngine, VariationType
+from .weights import scale_factors
+
+logger = logging.getLogger("Benchmark")
+
+BENCHMARK_DIR = Path("benchmark")
+NUM_EVENTS = [10_000, 100_000]
+
+# jet energy scale shift of the DIFFERENTIAL variation benchmarked next to the classification ones
+JET_SCALE_SHIFT = 1.02
+
+
+class BenchmarkResult(NamedTuple):
+    name: str
+    dataset_type: DatasetType
+    num_events: int
+    # fastest run
+    seconds: float
+
+    @property
+    def events_per_second(self) -> float:
+        return self.num_events / self.seconds if self.seconds > 0 else float("inf")
+
+
+def _time(function: Callable[[], Any], repeat: int) -> float:
+    # the builders print the events, keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@njit
+def _fill_uniform_hist(values, weights):
+    h = make_uniform_hist(100, 0.0, 5000.0, "benchmark")
+    for i in range(len(values)):
+        h.fill(values[i], weights[i])
+    return h
+
+
+@njit
+def _fill_variable_hist(values, weights, edges):
+    h = make_variable_hist(edges, "benchmark")
+    for i in range(len(values)):
+        h.fill(values[i], weights[i])
+    return h
+
+
+@njit
+def _fill_hist_collection(keys, values, weights):
+    h = make_uniform_hist_collection(100, 0.0, 5000.0, "benchmark")
+    for i in range(len(values)):
+        h.fill(keys[i], values[i], weights[i])
+    return h
+
+
+def _apply_variations(
+    events: Events, dataset: Dataset, variations: list[Variation]
+) -> None:
+    for variation in variations:
+        with VariationEngine(variation, dataset, events) as varied_events:
+            varied_events.get_event_filter()
+
+
+def _benchmarks(tree: uproot.TTree, dataset: Dataset) -> dict[str, Callable[[], Any]]:
+    def builder() -> EventsBuilder:
+        return (
+            EventsBuilder(dataset, 0, False)
+            .with_entries(tree, 0)
+            .with_scale_factors(scale_factors(dataset))
+        )
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        events = builder().build()
+    data = events.data
+
+    lumi_mask = LumiMask(dataset)
+    jet_id = JetId(dataset, list(JetIdWP))
+    jet_veto_maps = JetVetoMaps(dataset)
+
+    sum_pt = np.asarray(ak.sum(data.jets.pt, axis=1), dtype=np.float64)
+    weights = np.ones(len(sum_pt), dtype=np.float64)
+    edges = np.geomspace(10.0, 5000.0, 101)
+    # stand-in for the event class IDs
+    keys = np.asarray(100 * ak.num(data.muons) + ak.num(data.jets), dtype=np.int64)
+
+    variations = classification_variations(dataset) + [
+        Variation(
+            name="JetScale_Up",
+            variation_type=VariationType.DIFFERENTIAL,
+            transformer=lambda events: {
+                "jets": ak.with_field(
+                    events.data.jets, events.data.jets.pt * JET_SCALE_SHIFT, "pt"
+                )
+            },
+        )
+    ]
+
+    return {
+        "load_fields (Muon)": lambda: _build_muons(tree),
+        "load_fields (Jet)": lambda: _build_jets(tree),
+        "EventsBuilder.build": lambda: builder().build(),
+        "EventsBuilder.build (preselection)": lambda: builder()
+        .with_preselection()
+        .build(),
+        "LumiMask": lambda: lumi_mask(data.run, data.luminosityBlock),
+        "JetId": lambda: jet_id(data.jets),
+        "JetVetoMaps": lambda: jet_veto_maps(data.jets, data.muons),
+        "deltaR_table": lambda: deltaR_table(data.jets, data.muons),
+        "nb_hist (uniform)": lambda: _fill_uniform_hist(sum_pt, weights),
+        "nb_hist (variable)": lambda: _fill_variable_hist(sum_pt, weights, edges),
+        "nb_hist (collection)": lambda: _fill_hist_collection(keys, sum_pt, weights),
+        f"VariationEngine ({len(variations)} variations)": lambda: _apply_variations(
+            events, dataset, variations
+        ),
+    }
+
+
+def _config_hash(config: SyntheticConfig) -> str:
+    return hashlib.sha256(config.model_dump_json().encode()).hexdigest()[:12]
+
+
+def run_benchmarks(
+    num_events: list[int] = NUM_EVENTS,
+    dataset_types: list[DatasetType] = [DatasetType.DATA, DatasetType.BACKGROUND],
+    repeat: int = 3,
+    benchmark_dir: Path = BENCHMARK_DIR,
+    config: SyntheticConfig = SyntheticConfig(),
+) -> list[BenchmarkResult]:
+    """
+    Time every benchmark for each dataset type and number of events.
+    """
+    mirror = benchmark_dir / "cvmfs" / _config_hash(config)
+    if not mirror.exists():
+        logger.info(f"Writing the /cvmfs stand-ins into {mirror}")
+        # renamed once complete, an interrupted run leaves no partial mirror behind
+        partial = mirror.with_name(f"{mirror.name}.partial")
+        shutil.rmtree(partial, ignore_errors=True)
+        write_stand_ins(partial, config)
+        partial.rename(mirror)
+    os.environ[CVMFS_MIRROR_VAR] = str(mirror)
+    logger.info(f"Reading the /cvmfs inputs from {mirror}")
+
+    results: list[BenchmarkResult] = []
+    for dataset_type in dataset_types:
+        file_config = config.model_copy(update={"dataset_type": dataset_type})
+        for n in num_events:
+            path = (
+                benchmark_dir
+                / "files"
+                / f"{dataset_type}_{n}_{_config_hash(file_config)}.root"
+            )
+            if not path.exists():
+                logger.info(f"Writing {path}")
+                write_synthetic_file(path, n, file_config)
+
+            dataset = synthetic_dataset(path, file_config)
+            tree: uproot.TTree = uproot.open(
+                {str(path): "Events"}, array_cache=None  # type: ignore
+            )
+            for name, function in _benchmarks(tree, dataset).items():
+                result = BenchmarkResult(name, dataset_type, n, _time(function, repeat))
+                logger.info(
+                    f"{name}, {dataset_type}, {n} events: {result.seconds:.4f} s "
+                    f"({result.events_per_second:.3g} events/s)"
+                )
+                results.append(result)
+
+    return results
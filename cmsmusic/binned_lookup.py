@@ -0,0 +1,153 @@
+"""
+Native evaluation of correctionlib corrections that are plain N-D binnings (e.g. jet veto maps).
+
+The binning is converted once into NumPy edges and content, then evaluated with a vectorized
+bin search or, from inside njit kernels, with `lookup_1d` / `lookup_2d`.
+"""
+
+from typing import Any, NamedTuple
+
+import correctionlib.schemav2 as cs
+import numpy as np
+from numba import njit
+from numpy.typing import NDArray
+
+
+class BinnedLookup(NamedTuple):
+    """
+    N-D binned content. Values outside the edges are clamped to the first/last bin if `clamp`,
+    raise a ValueError if `error` (correctionlib flow "error"), otherwise evaluate to `default`.
+    """
+
+    inputs: tuple[str, ...]
+    edges: tuple[NDArray[np.float64], ...]
+    content: NDArray[np.float64]
+    clamp: bool
+    error: bool
+    default: float
+
+    @staticmethod
+    def from_correction(
+        correction: cs.Correction, categories: dict[str, Any] = {}
+    ) -> "BinnedLookup":
+        """
+        Convert a correction made of (possibly nested) categories, resolved with `categories`,
+        over a Binning or MultiBinning of numbers.
+        """
+        node = correction.data
+        while isinstance(node, cs.Category):
+            if node.input not in categories:
+                raise ValueError(
+                    f"{correction.name}: a value for category {node.input} is required"
+                )
+            items = [
+                item for item in node.content if item.key == categories[node.input]
+            ]
+            if len(items) != 1:
+                raise ValueError(
+                    f"{correction.name}: no {node.input} category {categories[node.input]}"
+                )
+            node = items[0].value
+
+        match node:
+            case cs.Binning():
+                inputs = [node.input]
+                edges = [node.edges]
+            case cs.MultiBinning():
+                inputs = node.inputs
+                edges = node.edges
+            case _:
+                raise ValueError(
+                    f"{correction.name}: {type(node).__name__} is not a plain binning"
+                )
+
+        if not all(isinstance(c, (int, float)) for c in node.content):
+            raise ValueError(f"{correction.name}: content is not only numbers")
+
+        _edges = tuple(
+            (
+                np.linspace(e.low, e.high, e.n + 1)
+                if isinstance(e, cs.UniformBinning)
+                else np.asarray(e, dtype=np.float64)
+            )
+            for e in edges
+        )
+        content = np.asarray(node.content, dtype=np.float64).reshape(
+            [len(e) - 1 for e in _edges]
+        )
+
+        match node.flow:
+            case "clamp":
+                clamp, error, default = True, False, np.nan
+            case "error":
+                clamp, error, default = False, True, np.nan
+            case float() | int():
+                clamp, error, default = False, False, float(node.flow)
+            case _:
+                raise ValueError(
+                    f"{correction.name}: unsupported flow {node.flow} for a native lookup"
+                )
+
+        return BinnedLookup(tuple(inputs), _edges, content, clamp, error, default)
+
+    def evaluate(self, *values: NDArray) -> NDArray[np.float64]:
+        """
+        Vectorized lookup, one array of values per input.
+        """
+        if len(values) != len(self.edges):
+            raise ValueError(f"Expected {len(self.edges)} inputs, got {len(values)}")
+
+        index = []
+        in_range = np.ones(np.shape(values[0]), dtype=np.bool_)
+        for name, edges, x in zip(self.inputs, self.edges, values):
+            i = np.searchsorted(edges, x, side="right") - 1
+            in_range_x = (i >= 0) & (i < len(edges) - 1)
+            if self.error and not np.all(in_range_x):
+                raise ValueError(
+                    f"{name} out of range [{edges[0]}, {edges[-1]}): "
+                    f"{np.asarray(x)[~in_range_x][:5]}"
+                )
+            in_range &= in_range_x
+            index.append(np.clip(i, 0, len(edges) - 2))
+
+        res = self.content[tuple(index)]
+        if not self.clamp:
+            res = np.where(in_range, res, self.default)
+        return res
+
+
+@njit(inline="always")
+def _find_bin(edges, x, clamp, error):
+    """
+    Bin index of `x`, or -1 if out of range and neither `clamp` nor `error`.
+    """
+    i = np.searchsorted(edges, x, side="right") - 1
+    if (i < 0 or i >= len(edges) - 1) and error:
+        raise ValueError("Input out of range of the binning")
+    if i < 0:
+        return 0 if clamp else -1
+    if i >= len(edges) - 1:
+        return len(edges) - 2 if clamp else -1
+    return i
+
+
+@njit(inline="always")
+def lookup_1d(edges, content, clamp, error, default, x):
+    i = _find_bin(edges, x, clamp, error)
+    if i < 0:
+        return default
+    return content[i]
+
+
+@njit(inline="always")
+def lookup_2d(edges_x, edges_y, content, clamp, error, default, x, y):
+    """
+    Inside kernels, e.g. `lookup_2d(*veto_map.edges, veto_map.content, veto_map.clamp,
+    veto_map.error, veto_map.default, jet.eta, jet.phi)` with the `BinnedLookup` fields passed
+    as arguments.
+    """
+    i = _find_bin(edges_x, x, clamp, error)
+    j = _find_bin(edges_y, y, clamp, error)
+    if i < 0 or j < 0:
+        return default
+    return content[i, j]
@@ -1,31 +1,97 @@
 import logging
-from typing import Literal
+from functools import partial
+from typing import Literal, NamedTuple
 import gc
+from pathlib import Path
 
 import awkward as ak
+import hist
+import numpy as np
 from numba import njit
+from numpy.typing import NDArray
 
+from .corrections import preload
 from .dataset import Dataset, DatasetType
 from .eras import Year
+from .event_classes import (
+    EventClassEncoding,
+    OBJECT_COLLECTIONS,
+    ObjectType,
+    build_fanout_table,
+    event_class_ids,
+)
 from .events import Events, EventsBuilder
-from .utils import vec, null_vec
+from .events.events import (
+    _filter_patterns,
+    cutflow_from_patterns,
+    load_file,
+    n_minus_one_from_patterns,
+)
+from .events.padded import pad_values
+from .filters import JetId, JetIdWP, JetVetoMaps, LumiMask
+from .filters.lumi_filter import LumiMaskIndex
+from .kinematics import invariant_mass
+from .lumi_sections import merge_lumi_ranges, processed_lumis_path, save_lumi_ranges
+from .matching import ISO_MU24_FILTER_BITS, TrigObjId, match_trigger_objects
+from .pipeline import CHUNK_ENTRIES, MemoryTree, run_pipeline
+from .skims import find_skim, load_skim, used_branches
+from .utils import kernel_inputs
+from .weights import scale_factors, weight_variation
 from .variation import Variation, VariationEngine, VariationType
-from .nb_hist import make_uniform_hist, make_variable_hist, to_hist, to_root
+from .nb_hist import (
+    collection_to_hists,
+    make_uniform_hist,
+    make_uniform_hist_collection,
+    make_variable_hist,
+    to_hist,
+    to_root,
+)
 
 logger = logging.getLogger("Classification")
 
+# muons per event (leading in pt) considered by `do_classification`
+MAX_MUONS = 8
 
-def run_classification(file_index: int, dataset: Dataset, enable_cache: bool) -> None:
+
+@njit
+def fill_event_classes(
+    class_ids, values, weights, event_filter, fanout_offsets, fanout_targets
+):
     """
-    Classify one file
+    Fill `values` in the histograms of the exclusive, inclusive and jet-inclusive classes of each event.
+    The fan-out comes from the precomputed `FanoutTable`, no per-event enumeration is needed.
     """
-    assert isinstance(dataset.lfns, list)
-    if file_index >= len(dataset.lfns):
-        raise IndexError(
-            f"{file_index} is larger then the length of the {dataset.short_str()} ({len(dataset.lfns)} files)"
-        )
+    h = make_uniform_hist_collection(bins=100, low=0.0, high=5000.0, name="sum_pt")
+    for idx_evt in range(len(class_ids)):
+        if not event_filter[idx_evt]:
+            continue
 
-    logger.info(f"Processing {dataset.lfns[file_index]} from {dataset.short_str()} ...")
+        class_id = class_ids[idx_evt]
+        for k in range(fanout_offsets[class_id], fanout_offsets[class_id + 1]):
+            h.fill(fanout_targets[k], values[idx_evt], weights[idx_evt])
+
+    return h
+
+
+def sum_pt(data: ak.Array, encoding: EventClassEncoding) -> np.ndarray:
+    """
+    Scalar sum of the transverse momenta of the objects entering the event class.
+    """
+    _sum_pt = np.zeros(len(data), dtype=np.float64)
+    for object_type, collection in OBJECT_COLLECTIONS.items():
+        if object_type == ObjectType.MET:
+            met_pt = np.asarray(data[collection].pt, dtype=np.float64)
+            _sum_pt += np.where(met_pt >= encoding.met_threshold, met_pt, 0.0)
+        else:
+            _sum_pt += np.asarray(ak.sum(data[collection].pt, axis=1), dtype=np.float64)
+
+    return _sum_pt
+
+
+def classification_variations(dataset: Dataset) -> list[Variation]:
+    """
+    Variations to run for `dataset`.
+    """
 
     # define events tranformers
     def lumi_var(
@@ -57,6 +123,8 @@ def run_classification(file_index: int, dataset: Dataset, enable_cache: bool) ->
 
         return {"int_lumi": events.data.int_lumi * (1 + mult_factor * uncert / 100)}
 
+    object_scale_factors = scale_factors(dataset)
+
     # variations to run
     variations = [
         Variation(
@@ -69,16 +137,18 @@ def run_classification(file_index: int, dataset: Dataset, enable_cache: bool) ->
             variation_type=VariationType.INTEGRAL,
             transformer=lambda e: lumi_var(e, "up"),
         ),
-        Variation(
-            name="MuonID_Up",
-            variation_type=VariationType.CONSTANT,
-            transformer=lambda e: {"muons": e.data.muons * 10_000.0},
-        ),
-        Variation(
-            name="MuonID_Down",
-            variation_type=VariationType.CONSTANT,
-            transformer=lambda e: {"muons": e.data.muons / 10_000.0},
-        ),
+        *[
+            Variation(
+                name=f"{sf.name}_{shift.capitalize()}",
+                variation_type=VariationType.CONSTANT,
+                transformer=lambda e, name=sf.name, shift=shift: weight_variation(
+                    e, name, shift
+                ),
+            )
+            for osf in object_scale_factors
+            for sf in osf.scale_factors
+            for shift in ("up", "down")
+        ],
         Variation(
             name="Lumi_Down",
             variation_type=VariationType.INTEGRAL,
@@ -91,55 +161,375 @@ def run_classification(file_index: int, dataset: Dataset, enable_cache: bool) ->
         set([v.name for v in variations])
     ), "There are repeated variations"
 
-    # load and build event data
-    def apply_nominal_corrections(events):
-        logger.warning("TODO: implement nominal corrections")
-        # events.data.muons["pt"] = events.data.muons.pt * 10e5
+    return variations
 
-        return events
 
-    nominal_events = (
+def apply_nominal_corrections(events: Events) -> Events:
+    logger.warning("TODO: implement nominal corrections")
+    # events.data.muons["pt"] = events.data.muons.pt * 10e5
+
+    return events
+
+
+def events_builder(
+    dataset: Dataset,
+    file_index: int,
+    enable_cache: bool,
+    compact_events: bool = False,
+    duplicate_index_dir: Path | None = None,
+    preselection: bool = False,
+    skims_dir: Path | None = None,
+) -> EventsBuilder:
+    """
+    Builder of the nominal events of one file.
+    """
+    return (
         EventsBuilder(dataset, file_index, enable_cache)
+        .with_compaction(compact_events)
+        .with_scale_factors(scale_factors(dataset))
+        .with_duplicate_veto(duplicate_index_dir)
+        .with_preselection(preselection)
+        .with_skims(skims_dir)
+        .with_padded_collections({"muons": MAX_MUONS})
         .add_transformation(apply_nominal_corrections)
-        .build()
     )
 
-    @njit
-    def do_classification(data, event_filter):
-        h = make_uniform_hist(bins=30, low=70.0, high=110.0, name="regular")
-        for idx_evt, evt in enumerate(data):
-            if not event_filter[idx_evt]:
-                continue
 
-            if not evt.hlt_bits.HLT_IsoMu24:
-                continue
+def warm_start(dataset: Dataset) -> None:
+    """
+    Load the corrections and the golden JSON index used by the builders of `dataset` into the
+    registries of this process (see `corrections`), e.g. when a worker process starts, so that
+    its first file or chunk does not pay for it.
+    """
+    preload(
+        [
+            (sf.path, sf.correction)
+            for osf in scale_factors(dataset)
+            for sf in osf.scale_factors
+        ]
+    )
+    JetId(dataset, list(JetIdWP))
+    JetVetoMaps(dataset)
+    if dataset.dataset_type == DatasetType.DATA:
+        LumiMask(dataset)
+
+
+@kernel_inputs("hlt_bits")
+@njit
+def do_classification(
+    data, muons, event_filter, trigger_word, trigger_mask, muon_trigger_matched
+):
+    """
+    Z candidates from the pairs of the leading `MAX_MUONS` muons of each event.
+    `muons` and `muon_trigger_matched` are padded (see `Events.padded`).
+    """
+    h = make_uniform_hist(bins=30, low=70.0, high=110.0, name="regular")
+    for idx_evt, evt in enumerate(data):
+        if not event_filter[idx_evt]:
+            continue
+
+        if not evt.hlt_bits[trigger_word] & trigger_mask:
+            continue
+
+        for i in range(muons.num[idx_evt]):
+            for j in range(i + 1, muons.num[idx_evt]):
+                if (
+                    muons.pt[idx_evt, i] > 7.0
+                    and muons.pt[idx_evt, j] > 7.0
+                    and (
+                        muon_trigger_matched[idx_evt, i]
+                        or muon_trigger_matched[idx_evt, j]
+                    )
+                ):
+                    z_cand_mass = invariant_mass(
+                        muons.pt[idx_evt, i],
+                        muons.eta[idx_evt, i],
+                        muons.phi[idx_evt, i],
+                        muons.mass[idx_evt, i],
+                        muons.pt[idx_evt, j],
+                        muons.eta[idx_evt, j],
+                        muons.phi[idx_evt, j],
+                        muons.mass[idx_evt, j],
+                    )
+                    if 70 <= z_cand_mass <= 110.0:
+                        h.fill(z_cand_mass)
+
+    return h
+
+
+class ClassificationResult(NamedTuple):
+    """
+    Output of the classification of (a part of) one file. Results of disjoint sets of events of the
+    same file add up, see `merge_results`.
+    """
+
+    num_events: int
+    filter_names: list[str]
+    # see `Events.filter_patterns`
+    filter_patterns: tuple[NDArray[np.uint64], NDArray[np.float64]]
+    processed_lumis: LumiMaskIndex | None
+    # per variation
+    z_mass: dict[str, hist.Hist]
+    event_classes: dict[str, dict[int, hist.Hist]]
 
-            for i, m1 in enumerate(evt.muons):
-                for j, m2 in enumerate(evt.muons):
-                    if j > i:
-                        if m1.pt > 7.0 and m2.pt > 7.0:
-                            m1 = vec(m1)
-                            m2 = vec(m2)
-                            z_cand = m1 + m2
-                            if 70 <= z_cand.mass <= 110.0:
-                                h.fill(z_cand.mass)
 
-        return h
+def classify(
+    nominal_events: Events, dataset: Dataset, variations: list[Variation]
+) -> ClassificationResult:
+    class_encoding = EventClassEncoding()
+    fanout_table = build_fanout_table(class_encoding)
 
+    z_mass: dict[str, hist.Hist] = {}
+    event_classes: dict[str, dict[int, hist.Hist]] = {}
     for var in variations:
         if dataset.dataset_type == DatasetType.DATA and var.name != "Nominal":
             continue
 
         with VariationEngine(var, dataset, nominal_events) as events:
             # here goes the analysis ...
+            event_filter = events.get_event_filter()
 
-            h = do_classification(events.data, events.get_event_filter())
+            class_ids = event_class_ids(events.data, class_encoding)
+            class_hists = fill_event_classes(
+                class_ids,
+                sum_pt(events.data, class_encoding),
+                np.asarray(events.data.gen_weights.genWeight, dtype=np.float64)
+                * np.asarray(events.data.weights.nominal),
+                event_filter,
+                fanout_table.offsets,
+                fanout_table.targets,
+            )
+            event_classes[var.name] = collection_to_hists(class_hists)
+            logger.info(
+                f"[{var.name}] {class_hists.size} event classes populated: "
+                f"{[class_encoding.class_name(c) for c in event_classes[var.name]]}"
+            )
 
-            root_hist = to_root(h)
-            root_hist.Print("all")
-            print(to_hist(h))
-            # print(to_hist(h1), to_hist(h2))
+            assert events.hlt_index is not None
+            h = do_classification(
+                events.project(do_classification.inputs),
+                events.padded["muons"],
+                event_filter,
+                *events.hlt_index.bit("HLT_IsoMu24"),
+                pad_values(
+                    events.data.muons,
+                    match_trigger_objects(
+                        events.data.muons,
+                        events.data.trigobjs,
+                        TrigObjId.Muon,
+                        ISO_MU24_FILTER_BITS,
+                    ),
+                    MAX_MUONS,
+                ),
+            )
+            z_mass[var.name] = to_hist(h)
+
+    return ClassificationResult(
+        num_events=nominal_events.num_events,
+        filter_names=nominal_events.filter_names,
+        filter_patterns=nominal_events.filter_patterns(),
+        processed_lumis=nominal_events.processed_lumis,
+        z_mass=z_mass,
+        event_classes=event_classes,
+    )
 
-    logger.info(f"Num of events: {nominal_events.num_events}")
+
+def merge_results(results: list[ClassificationResult]) -> ClassificationResult:
+    """
+    Sum of the results of disjoint sets of events.
+    """
+    filter_names = results[0].filter_names
+    assert all(r.filter_names == filter_names for r in results)
+
+    patterns, inverse = np.unique(
+        np.concatenate([r.filter_patterns[0] for r in results]), return_inverse=True
+    )
+    counts = np.bincount(
+        inverse,
+        weights=np.concatenate([r.filter_patterns[1] for r in results]),
+        minlength=len(patterns),
+    )
+
+    processed_lumis = None
+    if any(r.processed_lumis is not None for r in results):
+        processed_lumis = merge_lumi_ranges(
+            [r.processed_lumis for r in results if r.processed_lumis is not None]
+        )
+
+    z_mass: dict[str, hist.Hist] = {}
+    event_classes: dict[str, dict[int, hist.Hist]] = {}
+    for r in results:
+        for var_name, h in r.z_mass.items():
+            z_mass[var_name] = z_mass[var_name] + h if var_name in z_mass else h
+        for var_name, hists in r.event_classes.items():
+            merged = event_classes.setdefault(var_name, {})
+            for class_id, h in hists.items():
+                merged[class_id] = merged[class_id] + h if class_id in merged else h
+
+    return ClassificationResult(
+        num_events=sum(r.num_events for r in results),
+        filter_names=filter_names,
+        filter_patterns=(patterns, counts),
+        processed_lumis=processed_lumis,
+        z_mass=z_mass,
+        event_classes=event_classes,
+    )
+
+
+def report(result: ClassificationResult, dataset: Dataset, file_index: int) -> None:
+    """
+    Save and print the results of one file.
+    """
+    if result.processed_lumis is not None:
+        save_lumi_ranges(
+            processed_lumis_path(dataset, file_index), result.processed_lumis
+        )
+
+    for h in result.z_mass.values():
+        root_hist = to_root(h)
+        root_hist.Print("all")
+        print(h)
+
+    logger.info(f"Num of events: {result.num_events}")
+    logger.info(
+        f"Cutflow: {cutflow_from_patterns(result.filter_names, *result.filter_patterns)}"
+    )
+    logger.info(
+        f"N-1: {n_minus_one_from_patterns(result.filter_names, *result.filter_patterns)}"
+    )
+
+
+def run_classification(
+    file_index: int,
+    dataset: Dataset,
+    enable_cache: bool,
+    compact_events: bool = False,
+    duplicate_index_dir: Path | None = None,
+    preselection: bool = False,
+    skims_dir: Path | None = None,
+) -> None:
+    """
+    Classify one file
+    """
+    assert isinstance(dataset.lfns, list)
+    if file_index >= len(dataset.lfns):
+        raise IndexError(
+            f"{file_index} is larger then the length of the {dataset.short_str()} ({len(dataset.lfns)} files)"
+        )
+
+    logger.info(f"Processing {dataset.lfns[file_index]} from {dataset.short_str()} ...")
+
+    # load and build event data
+    nominal_events = events_builder(
+        dataset,
+        file_index,
+        enable_cache,
+        compact_events,
+        duplicate_index_dir,
+        preselection,
+        skims_dir,
+    ).build()
+
+    report(
+        classify(nominal_events, dataset, classification_variations(dataset)),
+        dataset,
+        file_index,
+    )
 
     return
+
+
+def _classify_chunk(
+    tree: MemoryTree,
+    entry_start: int,
+    dataset: Dataset,
+    file_index: int,
+    compact_events: bool,
+    duplicate_index_dir: Path | None,
+    preselection: bool,
+    skimmed: bool,
+) -> ClassificationResult:
+    nominal_events = (
+        events_builder(
+            dataset,
+            file_index,
+            False,
+            compact_events,
+            duplicate_index_dir,
+            preselection,
+            None,
+        )
+        .with_entries(tree, entry_start, skimmed)
+        .build()
+    )
+    return classify(nominal_events, dataset, classification_variations(dataset))
+
+
+def run_classification_pipelined(
+    file_index: int,
+    dataset: Dataset,
+    enable_cache: bool,
+    compact_events: bool = False,
+    duplicate_index_dir: Path | None = None,
+    preselection: bool = False,
+    skims_dir: Path | None = None,
+    *,
+    num_readers: int = 1,
+    num_workers: int = 1,
+    chunk_entries: int = CHUNK_ENTRIES,
+) -> None:
+    """
+    Classify one file in chunks, with `num_readers` reader and `num_workers` compute processes
+    (see `pipeline.run_pipeline`). Same results as `run_classification`.
+    """
+    assert isinstance(dataset.lfns, list)
+    if file_index >= len(dataset.lfns):
+        raise IndexError(
+            f"{file_index} is larger then the length of the {dataset.short_str()} ({len(dataset.lfns)} files)"
+        )
+
+    logger.info(
+        f"Processing {dataset.lfns[file_index]} from {dataset.short_str()} (pipelined) ..."
+    )
+
+    skim = None
+    if skims_dir is not None:
+        skim = find_skim(skims_dir, dataset, file_index, duplicate_index_dir)
+    if skim is not None:
+        tree, _, dropped_filters, skim_lumis = load_skim(skim)
+    else:
+        tree = load_file(dataset.lfns[file_index], enable_cache)
+
+    results = run_pipeline(
+        tree,
+        used_branches(tree, dataset),
+        partial(
+            _classify_chunk,
+            dataset=dataset,
+            file_index=file_index,
+            compact_events=compact_events,
+            duplicate_index_dir=duplicate_index_dir,
+            preselection=preselection,
+            skimmed=skim is not None,
+        ),
+        num_readers,
+        num_workers,
+        chunk_entries,
+        worker_initializer=partial(warm_start, dataset),
+    )
+
+    if skim is not None:
+        # the events dropped when skimming, and the lumisections of the whole file
+        filter_names = results[0].filter_names
+        results.append(
+            ClassificationResult(
+                num_events=0,
+                filter_names=filter_names,
+                filter_patterns=_filter_patterns(filter_names, *dropped_filters),
+                processed_lumis=skim_lumis,
+                z_mass={},
+                event_classes={},
+            )
+        )
+
+    report(merge_results(results), dataset, file_index)
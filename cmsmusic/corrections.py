@@ -0,0 +1,124 @@
+"""
+Process-wide registry of correctionlib evaluators.
+
+Each correction file is decompressed and parsed once per process, no matter how many files,
+working points or variations use it. Gzipped files (e.g. from /cvmfs) are decompressed once into
+`CORRECTIONS_CACHE_DIR`, which is shared by all the processes (and runs) on a machine: the
+checkout root by default, or `MUSIC_CORRECTIONS_CACHE_DIR`. Files under /cvmfs are read from the
+local mirror, if one is set (see `cvmfs.cvmfs_path`).
+
+The compiled evaluators live in C++ and can not be shared between independent processes. Workers
+forked from a process that called `preload` inherit them for free. Spawned workers (pipeline compute
+processes, skimming pools) load them once when they start (warm start, see
+`classification.warm_start`), before their first chunk or file.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any
+
+import correctionlib
+import correctionlib.schemav2 as cs
+
+from .binned_lookup import BinnedLookup
+from .cvmfs import cvmfs_path
+
+logger = logging.getLogger("Corrections")
+
+CORRECTIONS_CACHE_DIR = Path(
+    os.environ.get(
+        "MUSIC_CORRECTIONS_CACHE_DIR",
+        Path(__file__).resolve().parents[1] / "corrections_cache",
+    )
+).absolute()
+
+_lock = threading.Lock()
+_correction_sets: dict[str, correctionlib.CorrectionSet] = {}
+_corrections: dict[tuple[str, str], correctionlib.highlevel.Correction] = {}
+_binned_lookups: dict[tuple[str, str, str], BinnedLookup] = {}
+
+
+def _decompressed(path: Path) -> Path:
+    """
+    Local decompressed copy of a gzipped correction file, keyed by its content: rewriting a file
+    with the same content reuses the copy.
+    """
+    if path.suffix != ".gz":
+        return path
+
+    with open(path, "rb") as fin:
+        key = hashlib.file_digest(fin, "sha256").hexdigest()[:16]
+    local_path = CORRECTIONS_CACHE_DIR / f"{Path(path.stem).stem}-{key}.json"
+
+    if not local_path.exists():
+        CORRECTIONS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CORRECTIONS_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fout, gzip.open(path, "rb") as fin:
+            shutil.copyfileobj(fin, fout)
+        os.replace(tmp_path, local_path)
+
+    return local_path
+
+
+def _load_correction_set(path: str) -> correctionlib.CorrectionSet:
+    # the caller holds the lock
+    if path not in _correction_sets:
+        logger.info(f"Loading corrections from {path}")
+        _correction_sets[path] = correctionlib.CorrectionSet.from_file(
+            str(_decompressed(cvmfs_path(path)))
+        )
+    return _correction_sets[path]
+
+
+def get_correction_set(path: str | Path) -> correctionlib.CorrectionSet:
+    """
+    The correction set in `path`, loaded on first use.
+    """
+    with _lock:
+        return _load_correction_set(str(path))
+
+
+def get_correction(path: str | Path, name: str) -> correctionlib.highlevel.Correction:
+    """
+    The correction `name` of the correction set in `path`, loaded on first use.
+    """
+    key = (str(path), name)
+    with _lock:
+        if key not in _corrections:
+            _corrections[key] = _load_correction_set(key[0])[name]
+        return _corrections[key]
+
+
+def get_binned_lookup(path: str | Path, name: str, **categories: Any) -> BinnedLookup:
+    """
+    The correction `name` of `path`, converted to a native `BinnedLookup`,
+    with its categorical inputs fixed to `categories` (e.g. `type="jetvetomap"`).
+    """
+    key = (str(path), name, repr(sorted(categories.items())))
+    with _lock:
+        if key not in _binned_lookups:
+            correction_set = cs.CorrectionSet.model_validate_json(
+                _decompressed(cvmfs_path(path)).read_bytes()
+            )
+            corrections = [c for c in correction_set.corrections if c.name == name]
+            if len(corrections) != 1:
+                raise ValueError(f"No correction {name} in {path}")
+            _binned_lookups[key] = BinnedLookup.from_correction(
+                corrections[0], categories
+            )
+        return _binned_lookups[key]
+
+
+def preload(corrections: list[tuple[str | Path, str]]) -> None:
+    """
+    Load the given (path, name) corrections now, e.g. before starting (forking) workers or when a
+    worker starts (see `classification.warm_start`).
+    """
+    for path, name in corrections:
+        get_correction(path, name)
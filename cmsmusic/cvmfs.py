@@ -0,0 +1,31 @@
+"""
+Access to the files read from /cvmfs (corrections, golden JSONs), optionally from a local mirror.
+
+With `MUSIC_CVMFS_MIRROR` set to a directory, `/cvmfs/<path>` is read from `<mirror>/<path>`
+instead, e.g. from the stand-ins written by `synthetic.write_stand_ins`, to run without grid
+access. Being an environment variable, it also holds in every worker process.
+"""
+
+import os
+from pathlib import Path
+
+CVMFS_ROOT = Path("/cvmfs")
+CVMFS_MIRROR_VAR = "MUSIC_CVMFS_MIRROR"
+
+
+def mirrored_path(path: str | Path, mirror: Path) -> Path:
+    """
+    Location of the /cvmfs `path` in `mirror`.
+    """
+    return mirror / Path(path).relative_to(CVMFS_ROOT)
+
+
+def cvmfs_path(path: str | Path) -> Path:
+    """
+    Path to read `path` from: in the mirror, if one is set and `path` is under /cvmfs.
+    """
+    path = Path(path)
+    mirror = os.environ.get(CVMFS_MIRROR_VAR)
+    if mirror is None or not path.is_relative_to(CVMFS_ROOT):
+        return path
+    return mirrored_path(path, Path(mirror))
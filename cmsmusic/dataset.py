@@ -3,6 +3,7 @@ import logging
 import os
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from enum import StrEnum
+from functools import cache
 from typing import Self
 
 import uproot
@@ -14,7 +15,7 @@ from .eras import LHCRun, NanoADODVersion, Year
 from .redirectors import Redirectors
 
 logger = logging.getLogger("Datasets")
-dbs = DbsApi("https://cmsweb.cern.ch/dbs/prod/global/DBSReader")
+DBS_URL = "https://cmsweb.cern.ch/dbs/prod/global/DBSReader"
 
 try:
     os.environ["USER"]
@@ -23,6 +24,14 @@ except KeyError as _:
     os.environ["USER"] = getpass.getuser()
 
 
+@cache
+def dbs() -> DbsApi:
+    """
+    DBS client, created on first use: it needs a grid certificate.
+    """
+    return DbsApi(DBS_URL)
+
+
 class ProcessGroup(StrEnum):
     DATA = "Data"
     DRELL_YAN = "Drell-Yan"
@@ -61,8 +70,8 @@ def get_sum_weights(evts: uproot.TTree, dataset_type: DatasetType) -> tuple[floa
     all_genWeight_are_one = False
     genWeight = None
     try:
-        genWeight = ak.sum(evts["genWeight"])
-        all_genWeight_are_one = ak.all(evts.array("genWeight") == 1)
+        genWeight = ak.sum(evts["genWeight"].array())
+        all_genWeight_are_one = ak.all(evts["genWeight"].array() == 1)
     except:
         has_genWeight = False
 
@@ -153,7 +162,7 @@ class Dataset(BaseModel):
                 logger.info(f"\nTesting files for {das_name}...")
                 all_files = [
                     file["logical_file_name"].strip()
-                    for file in dbs.listFiles(dataset=das_name)
+                    for file in dbs().listFiles(dataset=das_name)
                 ]
                 results = []
                 sum_weights = 0.0
@@ -0,0 +1,213 @@
+"""
+Cross-dataset duplicate event removal for Data.
+
+Overlapping primary datasets (e.g. /Muon0 and /Muon1) may contain the same event. Each event is
+assigned to exactly one dataset, the first one in priority order, and the copies in the other
+datasets are vetoed.
+
+1. `index_file` writes the event keys of every file, in row order, as one .npy per file.
+2. `resolve_duplicates` sorts the keys of each file once, spilling the sorted runs to disk, then
+   merges the runs of all files in priority order (external merge sort, only one file is ever in
+   memory) and writes a per-file veto mask .npy.
+3. `EventsBuilder.with_duplicate_veto` applies the mask as the `duplicate_veto` event filter.
+"""
+
+import logging
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from numba import njit
+from numpy.lib.format import open_memmap
+from numpy.typing import NDArray
+
+from .dataset import Dataset, DatasetType
+
+logger = logging.getLogger("Deduplication")
+
+# an event is identified by (run, event), packed as run << EVENT_BITS | event
+EVENT_BITS = 44
+
+
+def event_keys(runs: NDArray, events: NDArray) -> NDArray[np.uint64]:
+    runs = np.asarray(runs, dtype=np.uint64)
+    events = np.asarray(events, dtype=np.uint64)
+    if np.any(events >> np.uint64(EVENT_BITS)):
+        raise ValueError(f"Event numbers do not fit in {EVENT_BITS} bits")
+    return (runs << np.uint64(EVENT_BITS)) | events
+
+
+def index_path(index_dir: Path, dataset: Dataset, file_index: int) -> Path:
+    return index_dir / "keys" / str(dataset.process_name) / f"{file_index}.npy"
+
+
+def veto_path(index_dir: Path, dataset: Dataset, file_index: int) -> Path:
+    return index_dir / "veto" / str(dataset.process_name) / f"{file_index}.npy"
+
+
+def index_file(
+    dataset: Dataset, file_index: int, index_dir: Path, enable_cache: bool
+) -> Path:
+    """
+    Write the event keys of one file, in row order.
+    """
+    from .events.events import load_file
+
+    assert dataset.lfns is not None
+    evts = load_file(dataset.lfns[file_index], enable_cache)
+    columns = evts.arrays(["run", "event"], library="np")  # type: ignore
+
+    path = index_path(index_dir, dataset, file_index)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.save(path, event_keys(columns["run"], columns["event"]))
+    return path
+
+
+@njit(inline="always")
+def _before(keys, positions, a, b) -> bool:
+    """
+    Merge order of the heads of the runs `a` and `b`: by key, then by run (priority).
+    """
+    key_a = keys[positions[a]]
+    key_b = keys[positions[b]]
+    return key_a < key_b or (key_a == key_b and a < b)
+
+
+@njit(cache=True)
+def _merge_runs(keys, offsets, sorted_veto) -> None:
+    """
+    K-way merge of the sorted runs `keys[offsets[r]:offsets[r + 1]]`, in run order for equal keys:
+    every key but the first occurrence is vetoed, in place in `sorted_veto` (same layout as `keys`).
+    """
+    positions = offsets[:-1].copy()
+
+    # binary min-heap of the runs not exhausted yet
+    heap = np.empty(len(positions), dtype=np.int64)
+    size = 0
+    for run in range(len(positions)):
+        if positions[run] == offsets[run + 1]:
+            continue
+        # sift up
+        child = size
+        heap[child] = run
+        size += 1
+        while child > 0:
+            parent = (child - 1) // 2
+            if not _before(keys, positions, heap[child], heap[parent]):
+                break
+            heap[child], heap[parent] = heap[parent], heap[child]
+            child = parent
+
+    has_previous = False
+    previous = keys[0] if len(keys) > 0 else 0
+    while size > 0:
+        run = heap[0]
+        key = keys[positions[run]]
+        sorted_veto[positions[run]] = has_previous and key == previous
+        has_previous = True
+        previous = key
+
+        positions[run] += 1
+        if positions[run] == offsets[run + 1]:
+            size -= 1
+            heap[0] = heap[size]
+
+        # sift down
+        parent = 0
+        while True:
+            child = 2 * parent + 1
+            if child >= size:
+                break
+            if child + 1 < size and _before(
+                keys, positions, heap[child + 1], heap[child]
+            ):
+                child += 1
+            if not _before(keys, positions, heap[child], heap[parent]):
+                break
+            heap[child], heap[parent] = heap[parent], heap[child]
+            parent = child
+
+
+def resolve_duplicates(datasets: list[Dataset], index_dir: Path) -> dict[str, int]:
+    """
+    Write the veto mask of every file of `datasets` (in priority order): True for the events
+    already present in a previous file of a higher priority (or the same) dataset.
+
+    Every index is read once, to write its sorted run to disk. The runs of all files are then
+    merged in one pass over memory-mapped arrays.
+
+    Returns the number of vetoed events per dataset.
+    """
+    files: list[tuple[Dataset, int]] = []
+    for dataset in datasets:
+        if dataset.dataset_type != DatasetType.DATA:
+            raise ValueError(f"{dataset.short_str()} is not Data")
+        assert dataset.lfns is not None
+        files += [(dataset, i) for i in range(len(dataset.lfns))]
+
+    # only the headers are read here
+    sizes = [
+        len(np.load(index_path(index_dir, dataset, i), mmap_mode="r"))
+        for dataset, i in files
+    ]
+    offsets = np.zeros(len(files) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(sizes)
+
+    num_vetoed = {str(dataset.process_name): 0 for dataset in datasets}
+    with tempfile.TemporaryDirectory(dir=index_dir) as merge_dir:
+        # sorted keys of every file, and their rows in the file
+        keys = open_memmap(
+            Path(merge_dir) / "keys.npy",
+            mode="w+",
+            dtype=np.uint64,
+            shape=(offsets[-1],),
+        )
+        rows = open_memmap(
+            Path(merge_dir) / "rows.npy",
+            mode="w+",
+            dtype=np.int64,
+            shape=(offsets[-1],),
+        )
+        for (dataset, i), start, stop in zip(files, offsets[:-1], offsets[1:]):
+            file_keys = np.load(index_path(index_dir, dataset, i))
+            # stable: the first occurrence in the file comes first
+            order = np.argsort(file_keys, kind="stable")
+            keys[start:stop] = file_keys[order]
+            rows[start:stop] = order
+
+        sorted_veto = open_memmap(
+            Path(merge_dir) / "veto.npy",
+            mode="w+",
+            dtype=np.bool_,
+            shape=(offsets[-1],),
+        )
+        _merge_runs(keys, offsets, sorted_veto)
+
+        for (dataset, i), start, stop in zip(files, offsets[:-1], offsets[1:]):
+            veto = np.empty(stop - start, dtype=np.bool_)
+            veto[rows[start:stop]] = sorted_veto[start:stop]
+
+            path = veto_path(index_dir, dataset, i)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            np.save(path, veto)
+            num_vetoed[str(dataset.process_name)] += int(veto.sum())
+
+        # release the memory maps before the directory is removed
+        del keys, rows, sorted_veto
+
+    for process_name, n in num_vetoed.items():
+        logger.info(f"{process_name}: {n} duplicated events vetoed")
+
+    return num_vetoed
+
+
+def load_veto(index_dir: Path, dataset: Dataset, file_index: int) -> NDArray[np.bool_]:
+    """
+    Veto mask of one file (True for duplicates), memory-mapped.
+    """
+    path = veto_path(index_dir, dataset, file_index)
+    if not path.exists():
+        raise FileNotFoundError(
+            f"No duplicate veto for file {file_index} of {dataset.short_str()}. Run `music deduplicate` first."
+        )
+    return np.load(path, mmap_mode="r")
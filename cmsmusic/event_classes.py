@@ -0,0 +1,328 @@
+from enum import IntEnum, IntFlag
+from typing import NamedTuple
+
+import awkward as ak
+import numpy as np
+from numba import njit
+from numpy.typing import NDArray
+
+
+class ClassKind(IntEnum):
+    EXCLUSIVE = 0
+    INCLUSIVE = 1
+    JET_INCLUSIVE = 2
+
+
+class Overflow(IntFlag):
+    """
+    Object types with a multiplicity above its maximum, see `EventClassEncoding`.
+    """
+
+    JETS = 1
+    OTHERS = 2
+
+
+# numba kernels cannot combine enum flags with integers
+_OVERFLOW_JETS = int(Overflow.JETS)
+_OVERFLOW_OTHERS = int(Overflow.OTHERS)
+
+
+class ObjectType(IntEnum):
+    Muon = 0
+    Electron = 1
+    Tau = 2
+    Photon = 3
+    Jet = 4
+    MET = 5
+
+
+# Events.data collection counted for each object type
+OBJECT_COLLECTIONS = {
+    ObjectType.Muon: "muons",
+    ObjectType.Electron: "electrons",
+    ObjectType.Tau: "taus",
+    ObjectType.Photon: "photons",
+    ObjectType.Jet: "jets",
+    ObjectType.MET: "met",
+}
+
+
+class EventClassEncoding(NamedTuple):
+    """
+    Encodes an event class (the multiplicity of each object type) as a compact integer:
+    each multiplicity is clamped to its maximum and bit-packed, in the order of `ObjectType`.
+
+    Events with a multiplicity above its maximum get an `Overflow` flag in the two bits above the
+    multiplicities: they belong to no exclusive class, only to the inclusive classes of their
+    (clamped) objects and, if only the jets overflow, to the jet-inclusive ones.
+    The `ClassKind` is stored in the two bits above the overflow flags (0 for exclusive classes).
+
+    The MET multiplicity is 0 or 1, depending on `met_threshold`.
+    """
+
+    max_multiplicities: tuple[int, ...] = (4, 4, 4, 4, 6, 1)
+    met_threshold: float = 100.0
+
+    @property
+    def bits(self) -> NDArray[np.int64]:
+        return np.array(
+            [int(m).bit_length() for m in self.max_multiplicities], dtype=np.int64
+        )
+
+    @property
+    def shifts(self) -> NDArray[np.int64]:
+        return np.concatenate([[0], np.cumsum(self.bits)[:-1]]).astype(np.int64)
+
+    @property
+    def caps(self) -> NDArray[np.int64]:
+        return np.array(self.max_multiplicities, dtype=np.int64)
+
+    @property
+    def overflow_shift(self) -> int:
+        return int(self.bits.sum())
+
+    @property
+    def kind_shift(self) -> int:
+        return self.overflow_shift + 2
+
+    @property
+    def num_ids(self) -> int:
+        """
+        Size of the exclusive class ID space, overflow flags included (not all IDs are valid classes).
+        """
+        return 1 << self.kind_shift
+
+    def kind(self, class_id: int) -> ClassKind:
+        return ClassKind(class_id >> self.kind_shift)
+
+    def overflow(self, class_id: int) -> Overflow:
+        return Overflow((class_id >> self.overflow_shift) & 3)
+
+    def encode(self, counts: NDArray) -> NDArray[np.int64]:
+        """
+        Class IDs from a (events, object types) array of multiplicities.
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        above = counts > self.caps
+        is_jet = np.arange(len(self.caps)) == ObjectType.Jet
+        overflow = np.where(
+            above[..., is_jet].any(axis=-1), Overflow.JETS, 0
+        ) | np.where(above[..., ~is_jet].any(axis=-1), Overflow.OTHERS, 0)
+
+        class_ids = np.bitwise_or.reduce(
+            np.minimum(counts, self.caps) << self.shifts, axis=-1
+        )
+        return class_ids | (overflow.astype(np.int64) << self.overflow_shift)
+
+    def decode(self, class_id: int) -> tuple[int, ...]:
+        class_id = class_id & ((1 << self.overflow_shift) - 1)
+        masks = (1 << self.bits) - 1
+        return tuple(int(c) for c in (class_id >> self.shifts) & masks)
+
+    def is_valid(self, class_id: int) -> bool:
+        return all(
+            c <= m for c, m in zip(self.decode(class_id), self.max_multiplicities)
+        )
+
+    def class_name(self, class_id: int) -> str:
+        """
+        Human readable class name, e.g. "1Muon+2Jet+MET", "1Muon+2Jet+MET+X" (inclusive)
+        or "1Muon+2Jet+NJet" (jet-inclusive).
+        """
+        parts = []
+        for object_type, count in zip(ObjectType, self.decode(class_id)):
+            if count == 0:
+                continue
+            if object_type == ObjectType.MET:
+                parts.append("MET")
+            else:
+                parts.append(f"{count}{object_type.name}")
+
+        if len(parts) == 0:
+            parts.append("Empty")
+
+        if self.overflow(class_id):
+            parts.append("Overflow")
+
+        match self.kind(class_id):
+            case ClassKind.INCLUSIVE:
+                parts.append("X")
+            case ClassKind.JET_INCLUSIVE:
+                parts.append("NJet")
+
+        return "+".join(parts)
+
+
+def count_objects(data: ak.Array, encoding: EventClassEncoding) -> NDArray[np.int64]:
+    """
+    (events, object types) multiplicities of the (already selected) collections in `data`.
+    """
+    counts = np.empty((len(data), len(ObjectType)), dtype=np.int64)
+    for object_type, collection in OBJECT_COLLECTIONS.items():
+        if object_type == ObjectType.MET:
+            counts[:, object_type] = np.asarray(
+                data[collection].pt >= encoding.met_threshold
+            )
+        else:
+            counts[:, object_type] = np.asarray(ak.num(data[collection], axis=1))
+
+    return counts
+
+
+def event_class_ids(data: ak.Array, encoding: EventClassEncoding) -> NDArray[np.int64]:
+    """
+    Exclusive event class ID of each event.
+    """
+    return encoding.encode(count_objects(data, encoding))
+
+
+@njit(inline="always")
+def encode_event_class(counts, shifts, caps, overflow_shift, jet_index) -> int:
+    """
+    Class ID of one event, to be used inside kernels (`shifts`, `caps` and `overflow_shift` from
+    `EventClassEncoding`).
+    """
+    class_id = 0
+    overflow = 0
+    for i in range(len(counts)):
+        class_id |= min(counts[i], caps[i]) << shifts[i]
+        if counts[i] > caps[i]:
+            overflow |= _OVERFLOW_JETS if i == jet_index else _OVERFLOW_OTHERS
+    return class_id | (overflow << overflow_shift)
+
+
+class FanoutTable(NamedTuple):
+    """
+    CSR lookup table from an exclusive class ID to all the classes an event of that class
+    contributes to: the exclusive class itself, every (non-empty) inclusive class made of a
+    subset of its objects and every jet-inclusive class with the same non-jet objects and at
+    most as many jets. Overflow class IDs (see `EventClassEncoding`) have no exclusive target.
+
+    The classes of exclusive class `c` are `targets[offsets[c] : offsets[c + 1]]`.
+    """
+
+    offsets: NDArray[np.int64]
+    targets: NDArray[np.int32]
+
+
+def build_fanout_table(encoding: EventClassEncoding) -> FanoutTable:
+    """
+    Built once per run, from the class encoding only.
+    """
+    offsets, targets = _build_fanout_table(
+        encoding.caps,
+        encoding.shifts,
+        encoding.overflow_shift,
+        encoding.kind_shift,
+        int(ObjectType.Jet),
+    )
+    return FanoutTable(offsets, targets)
+
+
+@njit(cache=True)
+def _decode_radix(index, radix, out):
+    for i in range(len(radix)):
+        out[i] = index % radix[i]
+        index //= radix[i]
+
+
+@njit(cache=True)
+def _overflow_possible(counts, caps, overflow, jet_index):
+    """
+    Whether an event with the clamped `counts` can have the `overflow` flags.
+    """
+    if overflow & _OVERFLOW_JETS and counts[jet_index] < caps[jet_index]:
+        return False
+    if overflow & _OVERFLOW_OTHERS:
+        for i in range(len(caps)):
+            if i != jet_index and counts[i] == caps[i]:
+                return True
+        return False
+    return True
+
+
+@njit(cache=True)
+def _build_fanout_table(caps, shifts, overflow_shift, kind_shift, jet_index):
+    n_types = len(caps)
+    num_ids = 1 << kind_shift
+    inclusive = np.int64(ClassKind.INCLUSIVE) << kind_shift
+    jet_inclusive = np.int64(ClassKind.JET_INCLUSIVE) << kind_shift
+
+    radix = caps + 1
+    num_classes = 1
+    for r in radix:
+        num_classes *= r
+
+    counts = np.zeros(n_types, dtype=np.int64)
+    sub_counts = np.zeros(n_types, dtype=np.int64)
+
+    # first pass: number of targets of each exclusive class
+    sizes = np.zeros(num_ids, dtype=np.int64)
+    for overflow in range(4):
+        for c in range(num_classes):
+            _decode_radix(c, radix, counts)
+            if not _overflow_possible(counts, caps, overflow, jet_index):
+                continue
+            class_id = overflow << overflow_shift
+            num_subsets = 1
+            for i in range(n_types):
+                class_id |= counts[i] << shifts[i]
+                num_subsets *= counts[i] + 1
+
+            # non-empty inclusive
+            sizes[class_id] = num_subsets - 1
+            if overflow == 0:
+                # exclusive
+                sizes[class_id] += 1
+            if not overflow & _OVERFLOW_OTHERS:
+                # non-empty jet-inclusive
+                sizes[class_id] += counts[jet_index] + 1
+                if class_id & ((1 << overflow_shift) - 1) == (
+                    counts[jet_index] << shifts[jet_index]
+                ):
+                    # only jets: the jet-inclusive class with zero jets is empty
+                    sizes[class_id] -= 1
+
+    offsets = np.zeros(num_ids + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(sizes)
+    targets = np.empty(offsets[-1], dtype=np.int32)
+
+    # second pass: fill
+    for overflow in range(4):
+        for c in range(num_classes):
+            _decode_radix(c, radix, counts)
+            if not _overflow_possible(counts, caps, overflow, jet_index):
+                continue
+            exclusive_id = 0
+            for i in range(n_types):
+                exclusive_id |= counts[i] << shifts[i]
+            class_id = exclusive_id | (overflow << overflow_shift)
+
+            pos = offsets[class_id]
+            if overflow == 0:
+                targets[pos] = exclusive_id
+                pos += 1
+
+            sub_radix = counts + 1
+            num_subsets = 1
+            for r in sub_radix:
+                num_subsets *= r
+            for s in range(1, num_subsets):
+                _decode_radix(s, sub_radix, sub_counts)
+                sub_id = 0
+                for i in range(n_types):
+                    sub_id |= sub_counts[i] << shifts[i]
+                targets[pos] = inclusive | sub_id
+                pos += 1
+
+            if overflow & _OVERFLOW_OTHERS:
+                continue
+            without_jets = exclusive_id - (counts[jet_index] << shifts[jet_index])
+            for n_jets in range(counts[jet_index] + 1):
+                sub_id = without_jets | (n_jets << shifts[jet_index])
+                if sub_id == 0:
+                    continue
+                targets[pos] = jet_inclusive | sub_id
+                pos += 1
+
+    return offsets, targets
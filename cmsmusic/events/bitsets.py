@@ -0,0 +1,73 @@
+from typing import Iterable
+
+import awkward as ak
+import numpy as np
+from numpy.typing import NDArray
+
+BITS_PER_WORD = 64
+
+
+class BitIndex:
+    """
+    Position of each name in a packed bitset: bit `i % 64` of word `i // 64`,
+    with `i` the position of the name in `names`.
+    """
+
+    def __init__(self, names: list[str], num_words: int) -> None:
+        if len(names) > num_words * BITS_PER_WORD:
+            raise ValueError(
+                f"Can not pack {len(names)} names into {num_words} words of {BITS_PER_WORD} bits"
+            )
+        self.names = tuple(names)
+        self.num_words = num_words
+        self._positions = {name: i for i, name in enumerate(names)}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._positions
+
+    def bit(self, name: str) -> tuple[int, np.uint64]:
+        """
+        Word and mask of `name`, for kernels: `bits[word] & mask != 0`.
+        """
+        position = self._positions[name]
+        return position // BITS_PER_WORD, np.uint64(1 << (position % BITS_PER_WORD))
+
+    def mask(self, names: Iterable[str]) -> NDArray[np.uint64]:
+        """
+        One mask word per bitset word, with the bits of all `names` set.
+        """
+        mask = np.zeros(self.num_words, dtype=np.uint64)
+        for name in names:
+            word, bit = self.bit(name)
+            mask[word] |= bit
+        return mask
+
+
+def pack_bits(columns: list[NDArray[np.bool_]], num_words: int) -> NDArray[np.uint64]:
+    """
+    Pack per-event booleans into a (events, num_words) uint64 bitset, in the order of `columns`.
+    """
+    num_events = len(columns[0]) if len(columns) > 0 else 0
+    unpacked = np.zeros((num_events, num_words * BITS_PER_WORD), dtype=np.bool_)
+    for i, column in enumerate(columns):
+        unpacked[:, i] = column
+
+    packed = np.packbits(unpacked, axis=1, bitorder="little")
+    return np.ascontiguousarray(packed).view("<u8").astype(np.uint64, copy=False)
+
+
+def any_bit(bits: ak.Array | NDArray, mask: NDArray[np.uint64]) -> NDArray[np.bool_]:
+    """
+    Events with any of the `mask` bits set.
+    """
+    return np.any(np.asarray(bits) & mask, axis=1)
+
+
+def all_bits(bits: ak.Array | NDArray, mask: NDArray[np.uint64]) -> NDArray[np.bool_]:
+    """
+    Events with all of the `mask` bits set.
+    """
+    return np.all((np.asarray(bits) & mask) == mask, axis=1)
@@ -0,0 +1,101 @@
+from collections.abc import Callable
+from enum import IntEnum, auto
+from typing import NamedTuple
+
+import awkward as ak
+from numpy.typing import NDArray
+
+from ..ak_utils import overlay_fields
+
+# (varied data, nominal data) -> derived column or event filter
+type Compute = Callable[[ak.Array, ak.Array], ak.Array | NDArray]
+
+
+class DerivationTarget(IntEnum):
+    COLUMN = auto()
+    EVENT_FILTER = auto()
+
+
+class Derivation(NamedTuple):
+    name: str
+    inputs: tuple[str, ...]
+    compute: Compute
+    target: DerivationTarget
+
+
+class DerivationGraph:
+    """
+    Records how derived `Events` columns and event filters depend on other columns.
+
+    Derivations are kept in registration order, which has to be a topological order
+    (a derivation may only depend on loaded columns or on previously registered ones).
+    A derivation may overwrite one of its own inputs (e.g. adding the jet IDs to `jets`).
+    """
+
+    def __init__(self) -> None:
+        self.derivations: list[Derivation] = []
+
+    def add_column(self, name: str, inputs: tuple[str, ...], compute: Compute) -> None:
+        self._add(Derivation(name, inputs, compute, DerivationTarget.COLUMN))
+
+    def add_event_filter(
+        self, name: str, inputs: tuple[str, ...], compute: Compute
+    ) -> None:
+        self._add(Derivation(name, inputs, compute, DerivationTarget.EVENT_FILTER))
+
+    def _add(self, derivation: Derivation) -> None:
+        if any(
+            d.name == derivation.name and d.target == derivation.target
+            for d in self.derivations
+        ):
+            raise ValueError(f"{derivation.name} already in derivations")
+
+        self.derivations.append(derivation)
+
+    def event_filters(self, data: ak.Array) -> dict[str, ak.Array | NDArray]:
+        """
+        Evaluate all event filters on the nominal data.
+        """
+        return {
+            d.name: d.compute(data, data)
+            for d in self.derivations
+            if d.target == DerivationTarget.EVENT_FILTER
+        }
+
+    def invalidated_by(self, columns: set[str]) -> list[Derivation]:
+        """
+        Derivations that have to be recomputed if `columns` change.
+        """
+        dirty = set(columns)
+        invalidated: list[Derivation] = []
+        for d in self.derivations:
+            if dirty.isdisjoint(d.inputs):
+                continue
+
+            invalidated.append(d)
+            if d.target == DerivationTarget.COLUMN:
+                dirty.add(d.name)
+
+        return invalidated
+
+    def propagate(
+        self, nominal: ak.Array, payload: dict[str, ak.Array]
+    ) -> tuple[dict[str, ak.Array], dict[str, ak.Array | NDArray]]:
+        """
+        Recompute only the derivations invalidated by the columns in `payload`.
+        Everything else is reused from the nominal data.
+
+        Returns the varied columns (including the payload) and the recomputed event filters.
+        """
+        columns = dict(payload)
+        event_filters: dict[str, ak.Array | NDArray] = {}
+
+        for d in self.invalidated_by(set(payload)):
+            value = d.compute(overlay_fields(nominal, columns), nominal)
+            match d.target:
+                case DerivationTarget.COLUMN:
+                    columns[d.name] = value  # type: ignore
+                case DerivationTarget.EVENT_FILTER:
+                    event_filters[d.name] = value
+
+        return columns, event_filters
@@ -15,11 +15,11 @@ def _build_electrons(evts: uproot.TTree) -> ak.Array:
 
     _electrons = load_fields(
         [
-            "Electron_pt",
-            "Electron_eta",
-            "Electron_phi",
-            Field("Electron_mass", ELECTRON_MASS),
-            "Electron_charge",
+            Field("Electron_pt", dtype="float32"),
+            Field("Electron_eta", dtype="float32"),
+            Field("Electron_phi", dtype="float32"),
+            Field("Electron_mass", ELECTRON_MASS, "Electron_pt", "float32"),
+            Field("Electron_charge", dtype="int32"),
         ],
         evts,
     )
@@ -1,25 +1,37 @@
 import logging
 import subprocess
 from pathlib import Path
-from typing import Self
+from typing import Any, NamedTuple, Self
 
 import awkward as ak
+import numpy as np
 import uproot
 from numpy.typing import NDArray
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
-from ..dataset import Dataset
+from ..ak_utils import overlay_fields, project_fields
+from ..dataset import Dataset, DatasetType
+from ..deduplication import load_veto
 from ..redirectors import Redirectors
+from ..skims import find_skim, load_skim
+from ..weights import ObjectScaleFactors, compute_event_weights, weight_names
 from ..filters import JetVetoMaps, LumiMask, compute_met_filters
+from ..filters.lumi_filter import LumiMaskIndex
+from ..lumi_sections import lumi_ranges
+from .bitsets import BitIndex
+from .derivations import DerivationGraph, DerivationTarget
 from .electrons import _build_electrons
+from .filtered_tree import FilteredTree
 from .flags import _build_flags
-from .hlt_bits import _build_hlt_bits
+from .hlt_bits import _build_hlt_bits, _trigger_filter
 from .int_lumi import _build_int_lumi
-from .jets import _build_jets
-from .met import _build_met
+from .jets import _build_jet_ids, _build_jets
+from .met import _build_met, _propagate_jets_to_met
 from .muons import _build_muons
+from .padded import pad_collection, select_padded
 from .photons import _build_photons
 from .run_lumi import _build_run_lumi
+from .schema import check_schema
 from .gen_weights import _build_gen_weights
 from .taus import _build_taus
 from .trigobjs import _build_trigobjs
@@ -59,10 +71,146 @@ def load_file(file_lfn: str, enable_cache: bool) -> uproot.TTree:
     raise RuntimeError("File is not accessible by any redirector")
 
 
+# one bit per registered event filter
+MAX_EVENT_FILTERS = 64
+
+
+def _set_filter_bit(
+    filter_bits: NDArray[np.uint64], bit: int, filter_mask: NDArray | ak.Array
+) -> NDArray[np.uint64]:
+    _filter_mask = np.asarray(filter_mask, dtype=np.bool_).astype(np.uint64)
+    filter_bits = filter_bits & ~np.uint64(1 << bit)
+    filter_bits |= _filter_mask << np.uint64(bit)
+    return filter_bits
+
+
+def _unique_filter_masks(
+    filter_masks: dict[str, NDArray[np.bool_]],
+) -> tuple[dict[str, NDArray[np.bool_]], NDArray[np.float64]]:
+    """
+    Unique combinations of the given filter masks, and how many events have each.
+    """
+    filter_bits = np.zeros(len(next(iter(filter_masks.values()))), dtype=np.uint64)
+    for bit, filter_mask in enumerate(filter_masks.values()):
+        filter_bits = _set_filter_bit(filter_bits, bit, filter_mask)
+
+    patterns, counts = np.unique(filter_bits, return_counts=True)
+    return {
+        filter_name: (patterns >> np.uint64(bit)) & np.uint64(1) != 0
+        for bit, filter_name in enumerate(filter_masks)
+    }, counts.astype(np.float64)
+
+
+def _filter_patterns(
+    filter_names: list[str],
+    filter_masks: dict[str, NDArray[np.bool_]],
+    counts: NDArray[np.float64],
+) -> tuple[NDArray[np.uint64], NDArray[np.float64]]:
+    """
+    Unique filter bit patterns (and counts) of `counts` events with each combination of the given
+    filter masks. Filters without a mask count as passed.
+    """
+    filter_bits = np.zeros(len(counts), dtype=np.uint64)
+    for bit, filter_name in enumerate(filter_names):
+        filter_bits = _set_filter_bit(
+            filter_bits,
+            bit,
+            filter_masks.get(filter_name, np.ones(len(counts), dtype=np.bool_)),
+        )
+
+    patterns, inverse = np.unique(filter_bits, return_inverse=True)
+    return patterns, np.bincount(inverse, weights=counts, minlength=len(patterns))
+
+
+def cutflow_from_patterns(
+    filter_names: list[str], patterns: NDArray[np.uint64], counts: NDArray[np.float64]
+) -> dict[str, float]:
+    """
+    `Events.cutflow` from filter bit patterns and counts, see `Events.filter_patterns`.
+    """
+    cutflow = {"all_events": float(counts.sum())}
+    required = np.uint64(0)
+    for bit, filter_name in enumerate(filter_names):
+        required |= np.uint64(1 << bit)
+        cutflow[filter_name] = float(counts[(patterns & required) == required].sum())
+
+    return cutflow
+
+
+def n_minus_one_from_patterns(
+    filter_names: list[str], patterns: NDArray[np.uint64], counts: NDArray[np.float64]
+) -> dict[str, float]:
+    """
+    `Events.n_minus_one` from filter bit patterns and counts, see `Events.filter_patterns`.
+    """
+    all_filters = np.uint64((1 << len(filter_names)) - 1)
+    n_minus_one = {}
+    for bit, filter_name in enumerate(filter_names):
+        required = all_filters & ~np.uint64(1 << bit)
+        n_minus_one[filter_name] = float(
+            counts[(patterns & required) == required].sum()
+        )
+
+    return n_minus_one
+
+
+class EventLevel(NamedTuple):
+    """
+    Event-level columns of one file, read in the first phase of `EventsBuilder.build`.
+    """
+
+    # tree to read the collections from, the preselected entries only with `with_preselection`
+    evts: uproot.TTree | FilteredTree
+    run: ak.Array
+    lumi: ak.Array
+    hlt_bits: ak.Array
+    hlt_index: BitIndex
+    flags: ak.Array
+    flag_index: BitIndex
+    duplicates: NDArray[np.bool_] | None
+    processed_lumis: LumiMaskIndex | None
+    # unique preselection filter masks of the dropped events and their counts, see `_unique_filter_masks`
+    dropped_filters: tuple[dict[str, NDArray[np.bool_]], NDArray[np.float64]] | None
+
+
+def _read_collections(
+    evts: uproot.TTree | FilteredTree, run: ak.Array, dataset: Dataset
+) -> dict[str, ak.Array]:
+    """
+    Columns read in the second phase of `EventsBuilder.build`.
+    """
+    return {
+        "gen_weights": _build_gen_weights(evts),
+        "trigobjs": _build_trigobjs(evts),
+        "muons": _build_muons(evts),
+        "electrons": _build_electrons(evts),
+        "taus": _build_taus(evts),
+        "photons": _build_photons(evts),
+        "jets": _build_jets(evts),
+        "met": _build_met(evts),
+        "int_lumi": _build_int_lumi(evts, run, dataset),
+    }
+
+
 class Events(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
     data: ak.Array
-    event_filters: dict[str, NDArray | ak.Array] = {}
+    # event filters are packed as one bit per filter, in registration order
+    filter_names: list[str] = []
+    filter_bits: NDArray[np.uint64] | None = None
+    # filter bit patterns (and counts) of the events dropped by `compact`
+    dropped_filter_patterns: tuple[NDArray[np.uint64], NDArray[np.float64]] | None = (
+        None
+    )
+    derivations: DerivationGraph = Field(default_factory=DerivationGraph)
+    # pt-sorted, top-N padded struct-of-arrays copies of some collections (see `pad_collections`)
+    max_objects: dict[str, int] = {}
+    padded: dict[str, Any] = {}  # namedtuples, see `padded_collection_type`
+    # bit of each HLT path / flag in the packed `hlt_bits` / `flags` columns
+    hlt_index: BitIndex | None = None
+    flag_index: BitIndex | None = None
+    # (Data) lumisections of the events passing the run/lumi filter, see `lumi_sections`
+    processed_lumis: LumiMaskIndex | None = None
 
     @property
     def num_events(self) -> int:
@@ -73,93 +221,502 @@ class Events(BaseModel):
         filter_name: str,
         filter_mask: NDArray | ak.Array,
     ) -> None:
-        if filter_name in self.event_filters.keys():
+        if filter_name in self.filter_names:
             raise ValueError(f"{filter_name} already in event_filters")
 
-        self.event_filters |= {filter_name: filter_mask}
+        if len(self.filter_names) >= MAX_EVENT_FILTERS:
+            raise ValueError(
+                f"Can not add {filter_name}. At most {MAX_EVENT_FILTERS} event filters are supported."
+            )
 
-    def get_event_filter(self, *, block_list: list[str] = []):
-        if len(self.event_filters) == 0:
-            raise RuntimeError("No event filter has been set")
+        if self.filter_bits is None:
+            self.filter_bits = np.zeros(self.num_events, dtype=np.uint64)
 
-        _event_filter = ak.ones_like(
-            self.event_filters[next(iter(self.event_filters.keys()))]
+        self.filter_bits = _set_filter_bit(
+            self.filter_bits, len(self.filter_names), filter_mask
         )
-        for filter_name in self.event_filters:
+        # never modify the list in place, it might be shared with overlays
+        self.filter_names = self.filter_names + [filter_name]
+
+    def filter_bit(self, filter_name: str) -> np.uint64:
+        return np.uint64(1 << self.filter_names.index(filter_name))
+
+    def required_filter_bits(self, *, block_list: list[str] = []) -> np.uint64:
+        required = 0
+        for bit, filter_name in enumerate(self.filter_names):
             if filter_name not in block_list:
-                _event_filter = _event_filter & self.event_filters[filter_name]
+                required |= 1 << bit
+
+        return np.uint64(required)
+
+    def get_event_filter(self, *, block_list: list[str] = []) -> NDArray[np.bool_]:
+        if self.filter_bits is None:
+            raise RuntimeError("No event filter has been set")
+
+        required = self.required_filter_bits(block_list=block_list)
+        return (self.filter_bits & required) == required
+
+    def filter_patterns(
+        self, weights: NDArray | ak.Array | None = None
+    ) -> tuple[NDArray[np.uint64], NDArray[np.float64]]:
+        """
+        Distinct filter bit patterns and the (weighted) number of events with each of them.
+        This is the only pass over the events needed by `cutflow` and `n_minus_one`.
+        """
+        if self.filter_bits is None:
+            raise RuntimeError("No event filter has been set")
+
+        patterns, inverse = np.unique(self.filter_bits, return_inverse=True)
+        counts = np.bincount(
+            inverse,
+            weights=None if weights is None else np.asarray(weights, dtype=np.float64),
+            minlength=len(patterns),
+        ).astype(np.float64)
+
+        if self.dropped_filter_patterns is not None:
+            if weights is not None:
+                raise RuntimeError(
+                    "Weighted filter patterns are not available after compaction"
+                )
+            dropped_patterns, dropped_counts = self.dropped_filter_patterns
+            patterns = np.concatenate([patterns, dropped_patterns])
+            counts = np.concatenate([counts, dropped_counts])
+
+        return patterns, counts
+
+    def cutflow(self, weights: NDArray | ak.Array | None = None) -> dict[str, float]:
+        """
+        Cumulative (weighted) number of events passing the event filters, in registration order.
+        """
+        return cutflow_from_patterns(self.filter_names, *self.filter_patterns(weights))
+
+    def n_minus_one(
+        self, weights: NDArray | ak.Array | None = None
+    ) -> dict[str, float]:
+        """
+        (Weighted) number of events passing all event filters but the given one.
+        """
+        return n_minus_one_from_patterns(
+            self.filter_names, *self.filter_patterns(weights)
+        )
+
+    def project(self, fields: list[str] | tuple[str, ...]) -> ak.Array:
+        """
+        Minimal record with only the given `fields` of `data` (dotted paths for nested fields).
+        Pass this to kernels instead of the whole `data`: a smaller type means faster compilation,
+        less unboxing and fewer recompilations. See `utils.kernel_inputs`.
+        """
+        return project_fields(self.data, fields)
+
+    def compact(self, *, block_list: list[str] = []) -> "Events":
+        """
+        Drop the events rejected by the event filters registered so far, but those in `block_list`.
+
+        The filter bit patterns of the dropped events are kept, so `cutflow` and `n_minus_one`
+        still account for them. Should be called once all event-level filters are registered.
+        """
+        event_filter = self.get_event_filter(block_list=block_list)
+        assert self.filter_bits is not None
+
+        dropped_patterns, dropped_counts = np.unique(
+            self.filter_bits[~event_filter], return_counts=True
+        )
+        dropped_counts = dropped_counts.astype(np.float64)
+        if self.dropped_filter_patterns is not None:
+            dropped_patterns = np.concatenate(
+                [self.dropped_filter_patterns[0], dropped_patterns]
+            )
+            dropped_counts = np.concatenate(
+                [self.dropped_filter_patterns[1], dropped_counts]
+            )
+
+        return self.model_copy(
+            update={
+                "data": self.data[event_filter],
+                "filter_bits": self.filter_bits[event_filter],
+                "dropped_filter_patterns": (dropped_patterns, dropped_counts),
+                "padded": {
+                    name: select_padded(padded, event_filter)
+                    for name, padded in self.padded.items()
+                },
+            }
+        )
+
+    def pad_collections(self, max_objects: dict[str, int]) -> None:
+        """
+        Build regular (events, N) struct-of-arrays copies of the given collections,
+        sorted by pt and truncated to N objects. See `pad_collection`.
+        """
+        self.max_objects = max_objects
+        self.padded = {
+            name: pad_collection(self.data[name], n) for name, n in max_objects.items()
+        }
+
+    def overlay(
+        self,
+        columns: dict[str, ak.Array],
+        event_filters: dict[str, NDArray | ak.Array] = {},
+    ) -> "Events":
+        """
+        Varied view of these events, with `columns` and `event_filters` layered over the nominal ones.
+        The nominal data is shared, never copied nor modified.
+        """
+        if len(columns) == 0 and len(event_filters) == 0:
+            return self
+
+        data = overlay_fields(self.data, columns)
+        events = self.model_copy(
+            update={
+                "data": data,
+                "padded": {
+                    name: (
+                        pad_collection(data[name], self.max_objects[name])
+                        if name in columns
+                        else padded
+                    )
+                    for name, padded in self.padded.items()
+                },
+            }
+        )
+
+        for filter_name, filter_mask in event_filters.items():
+            if filter_name in events.filter_names:
+                assert events.filter_bits is not None
+                events.filter_bits = _set_filter_bit(
+                    events.filter_bits,
+                    events.filter_names.index(filter_name),
+                    filter_mask,
+                )
+            else:
+                events.add_event_filter(filter_name, filter_mask)
 
-        return _event_filter
+        return events
 
 
 class EventsBuilder:
     def __init__(self, dataset: Dataset, file_index: int, enable_cache: bool) -> None:
         assert dataset.lfns is not None
         self.input_file = dataset.lfns[file_index]
+        self.file_index = file_index
         self.enable_cache = enable_cache
         self.dataset = dataset
         self.transformation = None
+        self.compaction = False
+        self.max_objects: dict[str, int] = {}
+        self.scale_factors: list[ObjectScaleFactors] = []
+        self.duplicate_index_dir: Path | None = None
+        self.preselection = False
+        self.skims_dir: Path | None = None
+        self.tree: Any = None
+        self.entry_start = 0
+        self.skimmed = False
 
     def add_transformation(self, transformation) -> Self:
         self.transformation = transformation
         return self
 
-    def build(self) -> Events:
-        evts = load_file(self.input_file, self.enable_cache)
+    def with_compaction(self, compaction: bool = True) -> Self:
+        """
+        Drop the events rejected by the event-level filters (lumi, MET filters, trigger and
+        duplicate veto) right after they are computed, so that transformations, variations and
+        kernels only see the surviving events. The filters computed from the collections (jet veto
+        maps) stay masks: variations may change them.
+
+        Also adds the `trigger` event filter, as `with_preselection`.
+        """
+        self.compaction = compaction
+        return self
+
+    def with_preselection(self, preselection: bool = True) -> Self:
+        """
+        Two-phase read: first read only the event-level branches (run, lumi, HLT bits and flags) and
+        apply the run/lumi, MET filters, trigger (and duplicate) filters, then read the
+        collections only for the surviving entries (see `FilteredTree`).
+        """
+        self.preselection = preselection
+        return self
+
+    def with_skims(self, skims_dir: Path | None) -> Self:
+        """
+        Read the skim of the file in `skims_dir` (see `skims.skim_file`) instead of the NanoAOD
+        file, when its provenance matches the current filter definitions.
+        """
+        self.skims_dir = skims_dir
+        return self
+
+    def with_entries(self, tree: Any, entry_start: int, skimmed: bool = False) -> Self:
+        """
+        Build from `tree`, the entries of the file (or of its skim, if `skimmed`) starting at
+        `entry_start` already read into memory (e.g. a `pipeline.MemoryTree`), instead of opening
+        the file.
+        """
+        self.tree = tree
+        self.entry_start = entry_start
+        self.skimmed = skimmed
+        return self
+
+    def with_scale_factors(self, scale_factors: list[ObjectScaleFactors]) -> Self:
+        """
+        Add the `weights` column: per-event weights from the object scale factors, nominal and
+        up/down, computed once (after compaction and the transformation). See
+        `weights.compute_event_weights`.
+        """
+        self.scale_factors = scale_factors
+        return self
+
+    def with_duplicate_veto(self, index_dir: Path | None) -> Self:
+        """
+        Reject the events already present in a higher priority Data dataset, with the veto masks
+        written by `deduplication.resolve_duplicates` (`duplicate_veto` event filter).
+        """
+        self.duplicate_index_dir = index_dir
+        return self
+
+    def with_padded_collections(self, max_objects: dict[str, int]) -> Self:
+        """
+        Also provide pt-sorted, top-N padded regular copies of the given collections,
+        e.g. `{"muons": 4, "jets": 8}`, in `Events.padded`.
+        """
+        self.max_objects = max_objects
+        return self
+
+    def read_event_level(self) -> EventLevel:
+        """
+        First phase of `build`: the event-level columns, the processed lumisections and, with
+        `with_preselection`, the preselection. Reads the skim of the file instead, if there is a
+        matching one.
+        """
+        if self.skims_dir is not None and self.tree is None:
+            path = find_skim(
+                self.skims_dir, self.dataset, self.file_index, self.duplicate_index_dir
+            )
+            if path is not None:
+                logger.info(f"Reading skim {path}")
+                evts, _, dropped_filters, processed_lumis = load_skim(path)
+                run, lumi = _build_run_lumi(evts)
+                hlt_bits, hlt_index = _build_hlt_bits(evts, self.dataset.year)
+                flags, flag_index = _build_flags(evts)
+                # the duplicates are already removed from the skim
+                duplicates = None
+                if self.duplicate_index_dir is not None:
+                    duplicates = np.zeros(evts.num_entries, dtype=np.bool_)
+                return EventLevel(
+                    evts,
+                    run,
+                    lumi,
+                    hlt_bits,
+                    hlt_index,
+                    flags,
+                    flag_index,
+                    duplicates,
+                    processed_lumis,
+                    dropped_filters,
+                )
+
+        evts = self.tree
+        if evts is None:
+            evts = load_file(self.input_file, self.enable_cache)
 
         run, lumi = _build_run_lumi(evts)
-        gen_weights = _build_gen_weights(evts)
-        hlt_bits = _build_hlt_bits(evts)
-        trigobjs = _build_trigobjs(evts)
-        muons = _build_muons(evts)
-        electrons = _build_electrons(evts)
-        taus = _build_taus(evts)
-        photons = _build_photons(evts)
-        jets = _build_jets(evts, self.dataset)
-        met = _build_met(evts, jets)
-        flags = _build_flags(evts)
-        int_lumi = _build_int_lumi(evts, run, self.dataset)
+        hlt_bits, hlt_index = _build_hlt_bits(evts, self.dataset.year)
+        flags, flag_index = _build_flags(evts)
+
+        lumi_mask = LumiMask(self.dataset)
+        duplicates = None
+        if self.duplicate_index_dir is not None and self.skimmed:
+            # the duplicates are already removed from the skim
+            duplicates = np.zeros(evts.num_entries, dtype=np.bool_)
+        elif self.duplicate_index_dir is not None:
+            duplicates = load_veto(
+                self.duplicate_index_dir, self.dataset, self.file_index
+            )
+            if self.tree is not None:
+                duplicates = duplicates[
+                    self.entry_start : self.entry_start + evts.num_entries
+                ]
+            if len(duplicates) != evts.num_entries:
+                raise RuntimeError(
+                    f"Duplicate veto of {self.input_file} has {len(duplicates)} events, expected {evts.num_entries}"
+                )
+
+        # lumisections are booked before any other event filter
+        processed_lumis = None
+        if self.dataset.dataset_type == DatasetType.DATA:
+            certified = np.asarray(lumi_mask(run, lumi))
+            processed_lumis = lumi_ranges(
+                ak.to_numpy(run)[certified], ak.to_numpy(lumi)[certified]
+            )
+
+        if not self.preselection:
+            return EventLevel(
+                evts,
+                run,
+                lumi,
+                hlt_bits,
+                hlt_index,
+                flags,
+                flag_index,
+                duplicates,
+                processed_lumis,
+                None,
+            )
+
+        preselection_filters = {
+            "run_lumi_filter": np.asarray(lumi_mask(run, lumi)),
+            "met_filters": compute_met_filters(flags, flag_index, self.dataset),
+            "trigger": _trigger_filter(hlt_bits),
+        }
+        if duplicates is not None:
+            preselection_filters["duplicate_veto"] = ~duplicates
+
+        keep = np.logical_and.reduce(list(preselection_filters.values()))
+        evts = FilteredTree(evts, np.flatnonzero(keep))
+        logger.info(
+            f"Preselected {evts.num_entries} events, reading {evts.num_read_entries} "
+            f"of {evts.tree.num_entries}"
+        )
+
+        return EventLevel(
+            evts,
+            run[keep],
+            lumi[keep],
+            hlt_bits[keep],
+            hlt_index,
+            flags[keep],
+            flag_index,
+            duplicates[keep] if duplicates is not None else None,
+            processed_lumis,
+            _unique_filter_masks(
+                {name: mask[~keep] for name, mask in preselection_filters.items()}
+            ),
+        )
+
+    def build(self) -> Events:
+        event_level = self.read_event_level()
+        run, lumi = event_level.run, event_level.lumi
+        hlt_bits, hlt_index = event_level.hlt_bits, event_level.hlt_index
+        flags, flag_index = event_level.flags, event_level.flag_index
+        duplicates = event_level.duplicates
+        columns = _read_collections(event_level.evts, run, self.dataset)
 
         data = ak.zip(
             {
                 "run": run,
                 "luminosityBlock": lumi,
-                "gen_weights": gen_weights,
+                "gen_weights": columns["gen_weights"],
                 "hlt_bits": hlt_bits,
-                "trigobjs": trigobjs,
-                "muons": muons,
-                "electrons": electrons,
-                "taus": taus,
-                "photons": photons,
-                "jets": jets,
-                "met": met,
+                "trigobjs": columns["trigobjs"],
+                "muons": columns["muons"],
+                "electrons": columns["electrons"],
+                "taus": columns["taus"],
+                "photons": columns["photons"],
+                "jets": _build_jet_ids(columns["jets"], self.dataset),
+                "met": columns["met"],
                 "flags": flags,
-                "int_lumi": int_lumi,
+                "int_lumi": columns["int_lumi"],
             },
             depth_limit=1,  # zip at the event level only
         )
         print(data)
 
-        events = Events(data=ak.Array(data))
+        # how derived quantities depend on the loaded columns,
+        # used by DIFFERENTIAL variations to recompute only what they invalidate
+        derivations = DerivationGraph()
+        derivations.add_column(
+            "jets",
+            ("jets",),
+            lambda data, nominal: _build_jet_ids(data.jets, self.dataset),
+        )
+        derivations.add_column(
+            "met",
+            ("jets",),
+            lambda data, nominal: _propagate_jets_to_met(
+                data.met, nominal.jets, data.jets
+            ),
+        )
+        derivations.add_column(
+            "weights",
+            tuple(osf.collection for osf in self.scale_factors),
+            lambda data, nominal: compute_event_weights(
+                data, self.scale_factors, weight_names(self.dataset.year)
+            ),
+        )
 
         lumi_mask = LumiMask(self.dataset)
-        events.add_event_filter(
+        derivations.add_event_filter(
             "run_lumi_filter",
-            lumi_mask(events.data.run, events.data.luminosityBlock),
+            ("run", "luminosityBlock"),
+            lambda data, nominal: lumi_mask(data.run, data.luminosityBlock),
         )
-
-        events.add_event_filter(
+        derivations.add_event_filter(
             "met_filters",
-            compute_met_filters(events.data.flags, self.dataset),
+            ("flags",),
+            lambda data, nominal: compute_met_filters(
+                data.flags, flag_index, self.dataset
+            ),
         )
-
+        if self.compaction or self.skimmed or event_level.dropped_filters is not None:
+            # only when events are dropped on it, it changes the selection otherwise
+            derivations.add_event_filter(
+                "trigger",
+                ("hlt_bits",),
+                lambda data, nominal: _trigger_filter(data.hlt_bits),
+            )
+        # all the preselection filters come before the collection-level ones, which are never
+        # evaluated for the events dropped by the preselection (and count as passed for them)
+        if duplicates is not None:
+            derivations.add_event_filter(
+                "duplicate_veto", (), lambda data, nominal: ~duplicates
+            )
         jet_veto_maps = JetVetoMaps(self.dataset)
-        events.add_event_filter(
+        derivations.add_event_filter(
             "jet_veto_maps",
-            jet_veto_maps(events.data.jets, events.data.muons),
+            ("jets", "muons"),
+            lambda data, nominal: jet_veto_maps(data.jets, data.muons),
         )
 
+        events = Events(
+            data=ak.Array(data),
+            derivations=derivations,
+            hlt_index=hlt_index,
+            flag_index=flag_index,
+        )
+        for filter_name, filter_mask in derivations.event_filters(events.data).items():
+            events.add_event_filter(filter_name, filter_mask)
+
+        events.processed_lumis = event_level.processed_lumis
+
+        if event_level.dropped_filters is not None:
+            # the events rejected in the first phase still count in the cutflow, as passing
+            # the filters that were not evaluated for them
+            events.dropped_filter_patterns = _filter_patterns(
+                events.filter_names, *event_level.dropped_filters
+            )
+
+        if self.compaction:
+            # varied collections may pass the filters the nominal ones fail
+            varied_filters = [
+                d.name
+                for d in derivations.invalidated_by(set(columns))
+                if d.target == DerivationTarget.EVENT_FILTER
+            ]
+            events = events.compact(block_list=varied_filters)
+            logger.info(f"Compacted events: {events.num_events} remaining")
+
         if self.transformation is not None:
             events = self.transformation(events)
 
+        # from the transformed objects, e.g. with the nominal corrections applied
+        events.data = ak.with_field(
+            events.data,
+            compute_event_weights(
+                events.data, self.scale_factors, weight_names(self.dataset.year)
+            ),
+            "weights",
+        )
+        check_schema(events.data, self.dataset.nanoadod_version)
+
+        if len(self.max_objects) > 0:
+            events.pad_collections(self.max_objects)
+
         return events
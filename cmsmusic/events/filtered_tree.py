@@ -0,0 +1,75 @@
+import awkward as ak
+import numpy as np
+import uproot
+from numpy.typing import NDArray
+
+
+class FilteredTree:
+    """
+    Read-only view of the selected `entries` of a TTree, with the part of the `uproot.TTree`
+    interface used by the builders (`keys`, `arrays`, `num_entries` and `__getitem__`).
+
+    Only the entry ranges (clusters) holding at least one selected entry are read, and the
+    rejected rows are dropped right after each range is read.
+    """
+
+    def __init__(self, tree: uproot.TTree, entries: NDArray[np.int64]) -> None:
+        self.tree = tree
+        self.entries = np.asarray(entries, dtype=np.int64)
+
+        # clusters with selected entries, adjacent ones merged into a single read
+        cluster_offsets = np.asarray(tree.common_entry_offsets(), dtype=np.int64)
+        cluster = np.searchsorted(cluster_offsets, self.entries, side="right") - 1
+        selected_clusters = np.unique(cluster)
+        new_range = np.ones(len(selected_clusters), dtype=np.bool_)
+        new_range[1:] = np.diff(selected_clusters) != 1
+        range_ends = np.roll(new_range, -1)
+        self.ranges = list(
+            zip(
+                cluster_offsets[selected_clusters[new_range]].tolist(),
+                cluster_offsets[selected_clusters[range_ends] + 1].tolist(),
+            )
+        )
+
+    @property
+    def num_entries(self) -> int:
+        return len(self.entries)
+
+    @property
+    def num_read_entries(self) -> int:
+        """
+        Number of entries actually read (and decompressed), selected or not.
+        """
+        return sum(stop - start for start, stop in self.ranges)
+
+    def keys(self, *args, **kwargs) -> list[str]:
+        return self.tree.keys(*args, **kwargs)
+
+    def __getitem__(self, name: str):
+        return self.tree[name]
+
+    def arrays(self, expressions: list[str], library: str = "ak"):
+        if len(self.ranges) == 0:
+            return self.tree.arrays(
+                expressions, entry_start=0, entry_stop=0, library=library
+            )
+
+        chunks = []
+        for start, stop in self.ranges:
+            local_entries = self.entries[
+                np.searchsorted(self.entries, start) : np.searchsorted(
+                    self.entries, stop
+                )
+            ]
+            chunk = self.tree.arrays(
+                expressions, entry_start=start, entry_stop=stop, library=library
+            )
+            if library == "np":
+                chunks.append({k: v[local_entries - start] for k, v in chunk.items()})
+            else:
+                # packed, so that the rejected rows are actually released
+                chunks.append(ak.to_packed(chunk[local_entries - start]))
+
+        if library == "np":
+            return {k: np.concatenate([c[k] for c in chunks]) for k in chunks[0]}
+        return ak.concatenate(chunks)
@@ -1,27 +1,34 @@
 import awkward as ak
 import uproot
 
-from .load_fields import load_fields
+from .bitsets import BITS_PER_WORD, BitIndex, pack_bits
+from .load_fields import Field, load_fields
 
+# the MET filters of all eras (see `filters.met_filters.met_filter_names`), listed explicitly so
+# that every flag has the same bit in every file, and is always present (defaulting to True)
+FLAG_NAMES = [
+    "Flag_goodVertices",
+    "Flag_globalSuperTightHalo2016Filter",
+    "Flag_EcalDeadCellTriggerPrimitiveFilter",
+    "Flag_BadPFMuonFilter",
+    "Flag_BadPFMuonDzFilter",
+    "Flag_hfNoisyHitsFilter",
+    "Flag_eeBadScFilter",
+    "Flag_ecalBadCalibFilter",
+]
 
-def _build_flags(evts: uproot.TTree) -> ak.Array:
+# number of uint64 words of the flags bitset
+FLAG_WORDS = -(-len(FLAG_NAMES) // BITS_PER_WORD)
+
+
+def _build_flags(evts: uproot.TTree) -> tuple[ak.Array, BitIndex]:
+    """
+    The event flags, packed into a (events, FLAG_WORDS) uint64 bitset, and their bit index.
+    """
     FLAG_PREFIX = "Flag_"
 
-    _flag = load_fields(
-        [
-            "Flag_goodVertices",
-            "Flag_globalSuperTightHalo2016Filter",
-            "Flag_EcalDeadCellTriggerPrimitiveFilter",
-            "Flag_BadPFMuonFilter",
-            "Flag_BadPFMuonDzFilter",
-            "Flag_hfNoisyHitsFilter",
-            "Flag_eeBadScFilter",
-            "Flag_ecalBadCalibFilter",
-        ],
-        evts,
-    )
+    _flag = load_fields([Field(name, True, "run", "bool") for name in FLAG_NAMES], evts)
+    flags = pack_bits([ak.to_numpy(_flag[name]) for name in FLAG_NAMES], FLAG_WORDS)
 
-    flag = ak.zip(
-        {f[len(FLAG_PREFIX) :]: _flag[f] for f in ak.fields(_flag)},
-    )
-    return flag
+    flag_index = BitIndex([name[len(FLAG_PREFIX) :] for name in FLAG_NAMES], FLAG_WORDS)
+    return ak.from_numpy(flags), flag_index
@@ -7,8 +7,8 @@ from .load_fields import Field, load_fields
 def _build_gen_weights(evts: uproot.TTree) -> ak.Array:
     gen_weights = load_fields(
         [
-            Field("genWeight", 1.0, "run"),
-            Field("LHEWeight_originalXWGTUP", 1.0, "run"),
+            Field("genWeight", 1.0, "run", "float32"),
+            Field("LHEWeight_originalXWGTUP", 1.0, "run", "float32"),
         ],
         evts,
     )
@@ -1,16 +1,74 @@
 import awkward as ak
+import numpy as np
 import uproot
+from numpy.typing import NDArray
 
-
+from ..eras import Year
+from .bitsets import BitIndex, any_bit, pack_bits
 from .load_fields import Field, load_fields
 
+# number of uint64 words of the HLT bitset, fixed so that the Events schema does not depend on the file
+HLT_WORDS = 4
+
 
-def _build_hlt_bits(evts: uproot.TTree) -> ak.Array:
-    HLT_BITS_PREFIX = "HLT_"
+def hlt_paths(year: Year) -> list[str]:
+    """
+    HLT paths to load for each era. Their order is their bit in `hlt_bits`, the same for every
+    file: a path missing from a file keeps a zero bit.
+    """
+    match year:
+        case Year.RunSummer24:
+            return [
+                "HLT_IsoMu24",
+                "HLT_Mu50",
+                "HLT_HighPtTkMu100",
+                "HLT_CascadeMu100",
+                "HLT_Ele30_WPTight_Gsf",
+                "HLT_Ele115_CaloIdVT_GsfTrkIdT",
+                "HLT_Photon200",
+                "HLT_DoubleEle33_CaloIdL_MW",
+                "HLT_Mu17_TrkIsoVVL_Mu8_TrkIsoVVL_DZ_Mass3p8",
+                "HLT_Mu37_TkMu27",
+                "HLT_DoubleMediumDeepTauPFTauHPS35_L2NN_eta2p1",
+            ]
+        case Year.RunSummer23BPix:
+            raise NotImplementedError(year)
+        case Year.RunSummer23:
+            raise NotImplementedError(year)
+        case Year.RunSummer22EE:
+            raise NotImplementedError(year)
+        case Year.RunSummer22:
+            raise NotImplementedError(year)
+        case Year.Run2018:
+            raise NotImplementedError(year)
+        case Year.Run2017:
+            raise NotImplementedError(year)
+        case Year.Run2016preVFP:
+            raise NotImplementedError(year)
+        case Year.Run2016postVFP:
+            raise NotImplementedError(year)
+        case _:
+            raise ValueError(f"Invalid year {year}")
 
-    _hlt_bits = load_fields(["HLT_IsoMu24"], evts)
 
-    hlt_bits = ak.zip(
-        {f: _hlt_bits[f] for f in ak.fields(_hlt_bits)},
+def _build_hlt_bits(evts: uproot.TTree, year: Year) -> tuple[ak.Array, BitIndex]:
+    """
+    The HLT paths of `year`, packed into a (events, HLT_WORDS) uint64 bitset, and their bit index.
+    """
+    hlt_index = BitIndex(hlt_paths(year), HLT_WORDS)
+
+    _hlt_bits = load_fields(
+        [Field(path, False, "run", "bool") for path in hlt_index.names], evts
+    )
+    hlt_bits = pack_bits(
+        [ak.to_numpy(_hlt_bits[path]) for path in hlt_index.names], HLT_WORDS
     )
-    return hlt_bits
+
+    return ak.from_numpy(hlt_bits), hlt_index
+
+
+def _trigger_filter(hlt_bits: ak.Array) -> NDArray[np.bool_]:
+    """
+    Events firing any of the loaded HLT paths.
+    """
+    return any_bit(hlt_bits, np.full(HLT_WORDS, ~np.uint64(0)))
@@ -1,6 +1,9 @@
 import awkward as ak
+import numpy as np
 import uproot
 
+from ..ak_utils import constant_array
+
 from ..dataset import Dataset
 from ..eras import Year
 
@@ -9,7 +12,7 @@ def _build_int_lumi(evts: uproot.TTree, runs, dataset: Dataset) -> ak.Array:
     match dataset.year:
         case Year.RunSummer24:
             # From: https://twiki.cern.ch/twiki/bin/viewauth/CMS/PdmVRun3Analysis#DATA_AN1
-            int_lumi = ak.Array([109.09] * evts.num_entries)
+            int_lumi = constant_array(109.09, evts.num_entries, np.float64)
         case Year.RunSummer23BPix:
             raise NotImplementedError(dataset.year)
         case Year.RunSummer23:
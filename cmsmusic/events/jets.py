@@ -4,27 +4,29 @@ import vector
 from ..filters import JetId, JetIdWP
 from ..dataset import Dataset
 
-from .load_fields import load_fields
+from .load_fields import Field, load_fields
 
 vector.register_awkward()  # <- important
 
 
-def _build_jets(evts: uproot.TTree, dataset: Dataset) -> ak.Array:
+def _build_jets(evts: uproot.TTree) -> ak.Array:
     JET_PREFIX = "Jet_"
 
     _jets = load_fields(
         [
-            "Jet_pt",
-            "Jet_eta",
-            "Jet_phi",
-            "Jet_mass",
-            "Jet_chHEF",
-            "Jet_neHEF",
-            "Jet_chEmEF",
-            "Jet_neEmEF",
-            "Jet_muEF",
-            "Jet_chMultiplicity",
-            "Jet_neMultiplicity",
+            Field("Jet_pt", dtype="float32"),
+            Field("Jet_eta", dtype="float32"),
+            Field("Jet_phi", dtype="float32"),
+            Field("Jet_mass", dtype="float32"),
+            Field("Jet_chHEF", dtype="float32"),
+            Field("Jet_neHEF", dtype="float32"),
+            Field("Jet_chEmEF", dtype="float32"),
+            Field("Jet_neEmEF", dtype="float32"),
+            Field("Jet_muEF", dtype="float32"),
+            Field("Jet_chMultiplicity", dtype="int32"),
+            Field("Jet_neMultiplicity", dtype="int32"),
+            # only in Run2, otherwise passes all working points
+            Field("Jet_puId", 7, "Jet_pt", "int32"),
         ],
         evts,
     )
@@ -34,10 +36,12 @@ def _build_jets(evts: uproot.TTree, dataset: Dataset) -> ak.Array:
         with_name="Momentum4D",
     )
 
-    jet_id_tight = JetId(dataset, JetIdWP.AK4PUPPI_Tight)
-    jets = ak.with_field(jets, jet_id_tight(jets), "jet_id_tight")
+    return jets
 
-    jet_id_tight_lep_veto = JetId(dataset, JetIdWP.AK4PUPPI_TightLeptonVeto)
-    jets = ak.with_field(jets, jet_id_tight_lep_veto(jets), "jet_id_tight_lep_veto")
 
-    return jets
+def _build_jet_ids(jets: ak.Array, dataset: Dataset) -> ak.Array:
+    """
+    Adds `jet_id`, the packed bitfield of all the jet ID working points (see `JetIdWP.bit`).
+    """
+    jet_id = JetId(dataset, list(JetIdWP))
+    return ak.with_field(jets, jet_id(jets), "jet_id")
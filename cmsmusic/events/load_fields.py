@@ -6,6 +6,8 @@ import uproot
 
 import logging
 
+from ..ak_utils import constant_array, constant_jagged, constant_like
+
 logger = logging.getLogger("Events")
 
 
@@ -13,12 +15,50 @@ class Field(NamedTuple):
     name: str
     default: float | bool | int | None = None
     template: str | None = None
+    # canonical dtype, the same for every NanoAOD version and for Data/MC
+    dtype: str | None = None
+
+
+def _leaf_dtype(column: ak.Array) -> np.dtype:
+    layout = ak.to_layout(column)
+    while not isinstance(layout, ak.contents.NumpyArray):
+        layout = layout.content
+    return layout.dtype
+
+
+def _default_column(
+    f: Field, evts: uproot.TTree, _data: ak.Array | None, fields_to_load: list[str]
+) -> ak.Array:
+    """
+    Virtual column with the default value of `f` and the structure of its template.
+    The template values are never needed, only its length or its counts branch.
+    """
+    assert f.template is not None
+
+    if f.template in fields_to_load:
+        assert _data is not None
+        return constant_like(_data[f.template], f.default, f.dtype)
+
+    count_branch = evts[f.template].count_branch
+    if count_branch is None:
+        return constant_array(f.default, evts.num_entries, f.dtype)
+
+    counts = np.asarray(evts.arrays([count_branch.name])[count_branch.name])
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return constant_jagged(f.default, offsets, f.dtype)
 
 
 def load_fields(fields: list[Field | str], evts: uproot.TTree):
+    """
+    Load `fields` from `evts` into a record with exactly these fields, in this order.
+
+    Missing branches are filled with their default value, with the structure of their template
+    branch. Every field with a `dtype` is cast to it, so that the resulting type does not depend
+    on the NanoAOD version nor on the dataset type.
+    """
     if len(fields) == 0:
         raise RuntimeError("no fields to load")
-    num_events = evts.num_entries
 
     _fields: list[Field] = []
     for f in fields:
@@ -30,34 +70,27 @@ def load_fields(fields: list[Field | str], evts: uproot.TTree):
             case _:
                 raise ValueError(f"invalid field type for {f}")
 
-    fields_to_load: list[Field] = []
-    fields_not_found: list[Field] = []
+    available = set(evts.keys())
+    fields_to_load = [f.name for f in _fields if f.name in available]
+    _data = evts.arrays(fields_to_load) if len(fields_to_load) > 0 else None
+
+    columns: dict[str, ak.Array] = {}
     for f in _fields:
-        if f.name not in evts.keys():
-            fields_not_found.append(f)
+        if f.name in available:
+            assert _data is not None
+            column = _data[f.name]
         else:
-            fields_to_load.append(f)
-
-    _data = evts.arrays([f.name for f in fields_to_load])
+            if f.default is None:
+                raise ValueError(f"{f.name} not found and has no default value.")
 
-    for f in fields_not_found:
-        if f.default is None:
-            logger.warning(f"No default value for {f.name}. Skipping ...")
-            continue
+            if f.template is None:
+                raise ValueError(f"No template array for {f.name}.")
 
-        if f.template is None:
-            raise ValueError(f"No template array for {f.name}.")
+            column = _default_column(f, evts, _data, fields_to_load)
 
-        if len(_data) != 0:
-            _data = ak.with_field(
-                _data,
-                ak.full_like(evts.arrays([f.template])[f.template], f.default),
-                f.name,
-            )
+        if f.dtype is not None and _leaf_dtype(column) != np.dtype(f.dtype):
+            column = ak.values_astype(column, f.dtype)
 
-        else:
-            _data = ak.Array(
-                {f.name: ak.full_like(evts.arrays([f.template])[f.template], f.default)}
-            )
+        columns[f.name] = column
 
-    return _data
+    return ak.zip(columns, depth_limit=1)
@@ -1,4 +1,5 @@
 import awkward as ak
+import numpy as np
 import uproot
 import vector
 
@@ -7,19 +8,19 @@ from .load_fields import Field, load_fields
 vector.register_awkward()  # <- important
 
 
-def _build_met(evts: uproot.TTree, jets: ak.Array) -> ak.Array:
+def _build_met(evts: uproot.TTree) -> ak.Array:
     MET_PREFIX = "PuppiMET_"
 
     _met = load_fields(
         [
-            "PuppiMET_pt",
-            "PuppiMET_phi",
-            "PuppiMET_phiUnclusteredDown",
-            "PuppiMET_phiUnclusteredUp",
-            "PuppiMET_ptUnclusteredDown",
-            "PuppiMET_ptUnclusteredUp",
-            Field("PuppiMET_mass", 0.0, "PuppiMET_pt"),
-            Field("PuppiMET_eta", 0.0, "PuppiMET_pt"),
+            Field("PuppiMET_pt", dtype="float32"),
+            Field("PuppiMET_phi", dtype="float32"),
+            Field("PuppiMET_phiUnclusteredDown", dtype="float32"),
+            Field("PuppiMET_phiUnclusteredUp", dtype="float32"),
+            Field("PuppiMET_ptUnclusteredDown", dtype="float32"),
+            Field("PuppiMET_ptUnclusteredUp", dtype="float32"),
+            Field("PuppiMET_mass", 0.0, "PuppiMET_pt", "float32"),
+            Field("PuppiMET_eta", 0.0, "PuppiMET_pt", "float32"),
         ],
         evts,
     )
@@ -29,3 +30,20 @@ def _build_met(evts: uproot.TTree, jets: ak.Array) -> ak.Array:
         with_name="Momentum4D",
     )
     return met
+
+
+def _propagate_jets_to_met(
+    met: ak.Array, nominal_jets: ak.Array, jets: ak.Array
+) -> ak.Array:
+    """
+    Propagate a change of the jets momenta (e.g. a jet energy scale shift) to the MET.
+    """
+    delta_px = ak.sum(nominal_jets.px, axis=-1) - ak.sum(jets.px, axis=-1)
+    delta_py = ak.sum(nominal_jets.py, axis=-1) - ak.sum(jets.py, axis=-1)
+
+    met_px = met.px + delta_px
+    met_py = met.py + delta_py
+
+    met = ak.with_field(met, np.hypot(met_px, met_py), "pt")
+    met = ak.with_field(met, np.arctan2(met_py, met_px), "phi")
+    return met
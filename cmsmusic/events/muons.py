@@ -15,12 +15,12 @@ def _build_muons(evts: uproot.TTree) -> ak.Array:
 
     _muons = load_fields(
         [
-            "Muon_pt",
-            "Muon_eta",
-            "Muon_phi",
-            Field("Muon_mass", MUON_MASS),
-            "Muon_charge",
-            "Muon_isPFcand",
+            Field("Muon_pt", dtype="float32"),
+            Field("Muon_eta", dtype="float32"),
+            Field("Muon_phi", dtype="float32"),
+            Field("Muon_mass", MUON_MASS, "Muon_pt", "float32"),
+            Field("Muon_charge", dtype="int32"),
+            Field("Muon_isPFcand", dtype="bool"),
         ],
         evts,
     )
@@ -0,0 +1,61 @@
+from collections import namedtuple
+from functools import cache
+
+import awkward as ak
+import numpy as np
+from numpy.typing import NDArray
+
+from ..ak_utils import flat_np_view, flat_offsets
+
+
+@cache
+def padded_collection_type(fields: tuple[str, ...]) -> type:
+    """
+    One namedtuple type per field set, so that numba compiles kernels only once per layout.
+    """
+    return namedtuple("PaddedCollection", ("num",) + fields)
+
+
+def pad_collection(collection: ak.Array, max_objects: int) -> tuple:
+    """
+    Sort the objects of each event by decreasing pt, keep at most `max_objects` of them and
+    return a struct-of-arrays namedtuple of regular (events, max_objects) NumPy arrays
+    (missing slots are zero) plus `num`, the number of valid slots of each event.
+    """
+    if max_objects <= 0:
+        raise ValueError(f"Invalid max_objects {max_objects}")
+
+    collection = collection[ak.argsort(collection.pt, axis=1, ascending=False)]
+
+    offsets = flat_offsets(collection)
+    counts = np.diff(offsets)
+    num_events = len(counts)
+
+    # position of each flat object inside its event
+    local_index = np.arange(offsets[-1]) - np.repeat(offsets[:-1], counts)
+    keep = local_index < max_objects
+    rows = np.repeat(np.arange(num_events), counts)[keep]
+    cols = local_index[keep]
+
+    fields = tuple(ak.fields(collection))
+    padded: dict[str, NDArray] = {"num": np.minimum(counts, max_objects)}
+    for f in fields:
+        values = flat_np_view(collection[f])
+        padded[f] = np.zeros((num_events, max_objects), dtype=values.dtype)
+        padded[f][rows, cols] = values[keep]
+
+    return padded_collection_type(fields)(**padded)
+
+
+def select_padded(padded: tuple, mask: NDArray[np.bool_]) -> tuple:
+    return type(padded)(*(values[mask] for values in padded))
+
+
+def pad_values(collection: ak.Array, values: ak.Array, max_objects: int) -> NDArray:
+    """
+    Per-object `values` of `collection` (same jagged structure) in the layout of
+    `pad_collection(collection, max_objects)`, e.g. flags computed outside of `Events.data`.
+    """
+    return pad_collection(
+        ak.zip({"pt": collection.pt, "values": values}), max_objects
+    ).values
@@ -11,10 +11,10 @@ def _build_photons(evts: uproot.TTree) -> ak.Array:
     PHOTON_PREFIX = "Photon_"
 
     fields: list[Field] = [
-        Field("Photon_pt"),
-        Field("Photon_eta"),
-        Field("Photon_phi"),
-        Field("Photon_mass", 0.0, "Photon_pt"),
+        Field("Photon_pt", dtype="float32"),
+        Field("Photon_eta", dtype="float32"),
+        Field("Photon_phi", dtype="float32"),
+        Field("Photon_mass", 0.0, "Photon_pt", "float32"),
     ]
 
     _photons = load_fields(fields, evts)
@@ -2,14 +2,14 @@ import awkward as ak
 import uproot
 
 
-from .load_fields import load_fields
+from .load_fields import Field, load_fields
 
 
 def _build_run_lumi(evts: uproot.TTree) -> tuple[ak.Array, ak.Array]:
     _run_lumi = load_fields(
         [
-            "luminosityBlock",
-            "run",
+            Field("luminosityBlock", dtype="uint32"),
+            Field("run", dtype="uint32"),
         ],
         evts,
     )
@@ -0,0 +1,70 @@
+import awkward as ak
+
+from ..eras import NanoADODVersion
+from .flags import FLAG_WORDS
+from .hlt_bits import HLT_WORDS
+
+
+def canonical_schema(nanoaod_version: NanoADODVersion) -> dict[str, str]:
+    """
+    Type of each field of `Events.data`, in order, once fully built (`weights` included).
+    The same for Data and MC.
+    """
+    match nanoaod_version:
+        case NanoADODVersion.V15:
+            return {
+                "run": "uint32",
+                "luminosityBlock": "uint32",
+                "gen_weights": "{genWeight: float32, LHEWeight_originalXWGTUP: float32}",
+                "hlt_bits": f"{HLT_WORDS} * uint64",
+                "trigobjs": "var * Momentum4D[eta: float32, filterBits: uint64, id: int32, phi: float32, pt: float32, mass: float32]",
+                "muons": "var * Momentum4D[pt: float32, eta: float32, phi: float32, mass: float32, charge: int32, isPFcand: bool]",
+                "electrons": "var * Momentum4D[pt: float32, eta: float32, phi: float32, mass: float32, charge: int32]",
+                "taus": "var * Momentum4D[pt: float32, eta: float32, phi: float32, mass: float32, charge: int32]",
+                "photons": "var * Momentum4D[pt: float32, eta: float32, phi: float32, mass: float32]",
+                "jets": "var * Momentum4D[pt: float32, eta: float32, phi: float32, mass: float32, chHEF: float32, neHEF: float32, chEmEF: float32, neEmEF: float32, muEF: float32, chMultiplicity: int32, neMultiplicity: int32, puId: int32, jet_id: uint8]",
+                "met": "Momentum4D[pt: float32, phi: float32, phiUnclusteredDown: float32, phiUnclusteredUp: float32, ptUnclusteredDown: float32, ptUnclusteredUp: float32, mass: float32, eta: float32]",
+                "flags": f"{FLAG_WORDS} * uint64",
+                "int_lumi": "float64",
+                # see `weights.weight_names`
+                "weights": "{nominal: float64, MuonID_up: float64, MuonID_down: float64, MuonIso_up: float64, MuonIso_down: float64}",
+            }
+        case NanoADODVersion.V14:
+            raise NotImplementedError(nanoaod_version)
+        case NanoADODVersion.V13:
+            raise NotImplementedError(nanoaod_version)
+        case NanoADODVersion.V12:
+            raise NotImplementedError(nanoaod_version)
+        case NanoADODVersion.V11:
+            raise NotImplementedError(nanoaod_version)
+        case NanoADODVersion.V10:
+            raise NotImplementedError(nanoaod_version)
+        case NanoADODVersion.V9:
+            raise NotImplementedError(nanoaod_version)
+        case _:
+            raise ValueError(f"Invalid NanoAOD version {nanoaod_version}")
+
+
+def check_schema(data: ak.Array, nanoaod_version: NanoADODVersion) -> None:
+    """
+    Ensure that `data` has the canonical type (fields, dtypes and order) of its NanoAOD version.
+
+    `load_fields` defaults missing branches and normalizes dtypes, so every file of a given version
+    (Data or MC) must produce the same type. Otherwise numba would silently recompile every kernel.
+    """
+    schema = canonical_schema(nanoaod_version)
+    if data.fields != list(schema):
+        raise RuntimeError(
+            f"Events fields do not match the canonical ones for NanoAOD {nanoaod_version}.\n"
+            f"Expected: {list(schema)}\n"
+            f"Got: {data.fields}"
+        )
+
+    for field, expected in schema.items():
+        field_type = str(ak.type(data[field]).content)
+        if field_type != expected:
+            raise RuntimeError(
+                f"Events field {field} does not match the canonical schema for NanoAOD {nanoaod_version}.\n"
+                f"Expected: {expected}\n"
+                f"Got: {field_type}"
+            )
@@ -15,11 +15,11 @@ def _build_taus(evts: uproot.TTree) -> ak.Array:
 
     _taus = load_fields(
         [
-            "Tau_pt",
-            "Tau_eta",
-            "Tau_phi",
-            Field("Tau_mass", TAU_MASS),
-            "Tau_charge",
+            Field("Tau_pt", dtype="float32"),
+            Field("Tau_eta", dtype="float32"),
+            Field("Tau_phi", dtype="float32"),
+            Field("Tau_mass", TAU_MASS, "Tau_pt", "float32"),
+            Field("Tau_charge", dtype="int32"),
         ],
         evts,
     )
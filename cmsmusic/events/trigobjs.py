@@ -12,12 +12,12 @@ def _build_trigobjs(evts: uproot.TTree) -> ak.Array:
 
     _trigobjs = load_fields(
         [
-            "TrigObj_eta",
-            "TrigObj_filterBits",
-            "TrigObj_id",
-            "TrigObj_phi",
-            "TrigObj_pt",
-            Field("TrigObj_mass", 0.0, "TrigObj_pt"),
+            Field("TrigObj_eta", dtype="float32"),
+            Field("TrigObj_filterBits", dtype="uint64"),
+            Field("TrigObj_id", dtype="int32"),
+            Field("TrigObj_phi", dtype="float32"),
+            Field("TrigObj_pt", dtype="float32"),
+            Field("TrigObj_mass", 0.0, "TrigObj_pt", "float32"),
         ],
         evts,
     )
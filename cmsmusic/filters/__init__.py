@@ -1,4 +1,4 @@
 from .jet_veto_maps import JetVetoMaps
 from .jet_id import JetId, JetIdWP
 from .lumi_filter import LumiMask
-from .met_filters import compute_met_filters
+from .met_filters import compute_met_filters, met_filter_names
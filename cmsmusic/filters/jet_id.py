@@ -1,13 +1,14 @@
-import correctionlib
 import awkward as ak
 import numpy as np
 from numpy.typing import NDArray
 from enum import StrEnum
+from typing import Sequence
 
 from cmsmusic.ak_utils import flat_np_view
 
 from ..eras import Year
 from ..ak_utils import *
+from ..corrections import get_correction
 from ..dataset import Dataset
 
 
@@ -15,35 +16,54 @@ class JetIdWP(StrEnum):
     AK4PUPPI_TightLeptonVeto = "AK4PUPPI_TightLeptonVeto"
     AK4PUPPI_Tight = "AK4PUPPI_Tight"
 
+    @property
+    def bit(self) -> int:
+        """
+        Bit of this working point in the packed `jet_id` bitfield.
+        """
+        return 1 << list(JetIdWP).index(self)
+
+
+def jet_id_file(year: Year) -> str:
+    """
+    Correction file of the jet ID working points of `year`.
+    """
+    match year:
+        case Year.RunSummer24:
+            return "/cvmfs/cms-griddata.cern.ch/cat/metadata/JME/Run3-24CDEReprocessingFGHIPrompt-Summer24-NanoAODv15/latest/jetid.json.gz"
+        case Year.RunSummer23BPix:
+            raise NotImplementedError(year)
+        case Year.RunSummer23:
+            raise NotImplementedError(year)
+        case Year.RunSummer22EE:
+            raise NotImplementedError(year)
+        case Year.RunSummer22:
+            raise NotImplementedError(year)
+        case Year.Run2018:
+            raise NotImplementedError(year)
+        case Year.Run2017:
+            raise NotImplementedError(year)
+        case Year.Run2016preVFP:
+            raise NotImplementedError(year)
+        case Year.Run2016postVFP:
+            raise NotImplementedError(year)
+        case _:
+            raise ValueError(f"Invalid year {year}")
+
 
 class JetId:
-    def __init__(self, dataset: Dataset, jetid_wp: JetIdWP) -> None:
+    """
+    Evaluates all the requested working points together, on inputs flattened once,
+    and packs the results into one uint8 bitfield per jet (see `JetIdWP.bit`).
+    """
+
+    def __init__(self, dataset: Dataset, jetid_wps: Sequence[JetIdWP]) -> None:
         self.year = dataset.year
-        self.wp = jetid_wp
+        self.wps = list(jetid_wps)
 
-        match self.year:
-            case Year.RunSummer24:
-                self.evaluator = correctionlib.CorrectionSet.from_file(
-                    "/cvmfs/cms-griddata.cern.ch/cat/metadata/JME/Run3-24CDEReprocessingFGHIPrompt-Summer24-NanoAODv15/latest/jetid.json.gz"
-                )[self.wp]
-            case Year.RunSummer23BPix:
-                raise NotImplementedError(self.year)
-            case Year.RunSummer23:
-                raise NotImplementedError(self.year)
-            case Year.RunSummer22EE:
-                raise NotImplementedError(self.year)
-            case Year.RunSummer22:
-                raise NotImplementedError(self.year)
-            case Year.Run2018:
-                raise NotImplementedError(self.year)
-            case Year.Run2017:
-                raise NotImplementedError(self.year)
-            case Year.Run2016preVFP:
-                raise NotImplementedError(self.year)
-            case Year.Run2016postVFP:
-                raise NotImplementedError(self.year)
-            case _:
-                raise ValueError(f"Invalid year {year}")
+        self.evaluators = [
+            get_correction(jet_id_file(self.year), wp) for wp in self.wps
+        ]
 
     def __call__(self, jets: ak.Array) -> ak.Array:
         jets_eta = flat_np_view(jets.eta)  # type:ignore
@@ -56,17 +76,20 @@ class JetId:
         jets_neMultiplicity = flat_np_view(jets.neMultiplicity)  # type:ignore
         jets_multiplicity = jets_chMultiplicity + jets_neMultiplicity
 
-        res = self.evaluator.evaluate(
-            jets_eta,
-            jets_chHEF,
-            jets_neHEF,
-            jets_chEmEF,
-            jets_neEmEF,
-            jets_muEF,
-            jets_chMultiplicity,
-            jets_neMultiplicity,
-            jets_multiplicity,
-        )
+        res = np.zeros(len(jets_eta), dtype=np.uint8)
+        for wp, evaluator in zip(self.wps, self.evaluators):
+            passes = evaluator.evaluate(
+                jets_eta,
+                jets_chHEF,
+                jets_neHEF,
+                jets_chEmEF,
+                jets_neEmEF,
+                jets_muEF,
+                jets_chMultiplicity,
+                jets_neMultiplicity,
+                jets_multiplicity,
+            )
+            res[passes != 0] |= wp.bit
 
         res = layout_ak_array(res, jets.pt)  # type:ignore
         return res
@@ -1,28 +1,128 @@
+import hashlib
 import json
+import os
+import shutil
+import tempfile
+from functools import cache
 from pathlib import Path
+from typing import NamedTuple
 
 import awkward
 import numba
 import numpy
 import numpy as np
-from numba import types
-from numba.typed import Dict
+from numpy.typing import NDArray
 
+from ..cvmfs import cvmfs_path
 from ..dataset import Dataset, DatasetType
 from ..eras import Year
 
-_numba_bool = None
-if hasattr(types, "bool"):
-    _numba_bool = types.bool
-else:
-    _numba_bool = types.bool_
+# next to the checkout, not in the working directory, unless MUSIC_LUMI_MASK_CACHE_DIR is set
+LUMI_MASK_CACHE_DIR = Path(
+    os.environ.get(
+        "MUSIC_LUMI_MASK_CACHE_DIR",
+        Path(__file__).resolve().parents[2] / "lumi_mask_cache",
+    )
+).absolute()
+
+
+class LumiMaskIndex(NamedTuple):
+    """
+    Compiled golden JSON: the certified lumisections of `runs[i]` are the inclusive ranges
+    `[first[k], last[k]]` for `k` in `offsets[i]:offsets[i + 1]`.
+    Runs are sorted, and so are the (non-overlapping) ranges of each run.
+    """
+
+    runs: NDArray[np.uint32]
+    offsets: NDArray[np.int64]
+    first: NDArray[np.uint32]
+    last: NDArray[np.uint32]
+
+    @staticmethod
+    def from_golden_json(goldenjson: dict[str, list[list[int]]]) -> "LumiMaskIndex":
+        runs = np.array(sorted(int(run) for run in goldenjson), dtype=np.uint32)
+        offsets = np.zeros(len(runs) + 1, dtype=np.int64)
+        ranges = []
+        for i, run in enumerate(runs):
+            run_ranges = sorted(goldenjson[str(run)])
+            offsets[i + 1] = offsets[i] + len(run_ranges)
+            ranges.extend(run_ranges)
+
+        _ranges = np.array(ranges, dtype=np.uint32).reshape(-1, 2)
+        return LumiMaskIndex(
+            runs, offsets, np.ascontiguousarray(_ranges[:, 0]), _ranges[:, 1].copy()
+        )
+
+    def save(self, path: Path) -> None:
+        """
+        Write the index as one .npy per array in directory `path`, atomically.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = Path(tempfile.mkdtemp(dir=path.parent, prefix=f".{path.name}."))
+        for name, array in self._asdict().items():
+            np.save(tmp_path / f"{name}.npy", array)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # already written by another process
+            shutil.rmtree(tmp_path)
+
+    @staticmethod
+    def load(path: Path) -> "LumiMaskIndex":
+        """
+        Memory-mapped, read-only: worker processes share the same pages.
+        """
+        return LumiMaskIndex(
+            *(
+                np.load(path / f"{name}.npy", mmap_mode="r")
+                for name in LumiMaskIndex._fields
+            )
+        )
 
 
-def _make_lumi_mask_dict():
-    return Dict.empty(key_type=types.uint32, value_type=types.uint32[:])
+def golden_json(year: Year) -> Path:
+    """
+    Golden JSON of the certified lumisections of `year`.
+    """
+    match year:
+        case Year.RunSummer24:
+            return Path(
+                "/cvmfs/cms-griddata.cern.ch/cat/metadata/DC/Collisions24/latest/Cert_Collisions2024_378981_386951_Golden.json"
+            )
+        case Year.RunSummer23BPix:
+            raise NotImplementedError(year)
+        case Year.RunSummer23:
+            raise NotImplementedError(year)
+        case Year.RunSummer22EE:
+            raise NotImplementedError(year)
+        case Year.RunSummer22:
+            raise NotImplementedError(year)
+        case Year.Run2018:
+            raise NotImplementedError(year)
+        case Year.Run2017:
+            raise NotImplementedError(year)
+        case Year.Run2016preVFP:
+            raise NotImplementedError(year)
+        case Year.Run2016postVFP:
+            raise NotImplementedError(year)
+        case _:
+            raise ValueError(f"Invalid year {year}")
+
+
+@cache
+def load_lumi_mask_index(jsonfile: Path) -> LumiMaskIndex:
+    """
+    Compiled index of a golden JSON, built once and cached on disk, keyed by the JSON hash.
+    Also cached per process.
+    """
+    with open(cvmfs_path(jsonfile), "rb") as fin:
+        content = fin.read()
 
+    cache_path = LUMI_MASK_CACHE_DIR / hashlib.sha256(content).hexdigest()
+    if not cache_path.exists():
+        LumiMaskIndex.from_golden_json(json.loads(content)).save(cache_path)
 
-_lumi_mask_dict_type = numba.typeof(_make_lumi_mask_dict())
+    return LumiMaskIndex.load(cache_path)
 
 
 # From: https://github.com/scikit-hep/coffea/blob/master/src/coffea/lumi_tools/lumi_tools.py
@@ -41,39 +141,7 @@ class LumiMask:
     def __init__(self, dataset: Dataset):
         self.dataset_type = dataset.dataset_type
 
-        match dataset.year:
-            case Year.RunSummer24:
-                jsonfile = Path(
-                    "/cvmfs/cms-griddata.cern.ch/cat/metadata/DC/Collisions24/latest/Cert_Collisions2024_378981_386951_Golden.json"
-                )
-            case Year.RunSummer23BPix:
-                raise NotImplementedError(dataset.year)
-            case Year.RunSummer23:
-                raise NotImplementedError(dataset.year)
-            case Year.RunSummer22EE:
-                raise NotImplementedError(dataset.year)
-            case Year.RunSummer22:
-                raise NotImplementedError(dataset.year)
-            case Year.Run2018:
-                raise NotImplementedError(dataset.year)
-            case Year.Run2017:
-                raise NotImplementedError(dataset.year)
-            case Year.Run2016preVFP:
-                raise NotImplementedError(dataset.year)
-            case Year.Run2016postVFP:
-                raise NotImplementedError(dataset.year)
-            case _:
-                raise ValueError(f"Invalid year {year}")
-
-        with open(jsonfile) as fin:
-            goldenjson = json.load(fin)
-
-        self._masks = dict()
-
-        for run, lumilist in goldenjson.items():
-            mask = numpy.array(lumilist, dtype=numpy.uint32).flatten()
-            mask[::2] -= 1
-            self._masks[numpy.uint32(run)] = mask
+        self.index = load_lumi_mask_index(golden_json(dataset.year))
 
     def __call__(self, runs, lumis):
         """
@@ -97,11 +165,6 @@ class LumiMask:
             return awkward.from_numpy(np.asarray(np.ones(len(runs)), dtype=np.bool))
 
         def apply(runs, lumis):
-            # fill numba typed dict
-            _masks = _make_lumi_mask_dict()
-            for k, v in self._masks.items():
-                _masks[k] = v
-
             runs_orig = runs
             if isinstance(runs, awkward.highlevel.Array):
                 runs = awkward.to_numpy(
@@ -112,7 +175,9 @@ class LumiMask:
                     awkward.typetracer.length_zero_if_typetracer(lumis)
                 ).astype(numpy.uint32)
             mask_out = numpy.zeros(dtype=bool, shape=runs.shape)
-            LumiMask._apply_run_lumi_mask_kernel(_masks, runs, lumis, mask_out)
+            LumiMask._apply_run_lumi_mask_kernel(
+                *(np.asarray(array) for array in self.index), runs, lumis, mask_out
+            )
             if isinstance(runs_orig, awkward.Array):
                 mask_out = awkward.Array(mask_out)
             if awkward.backend(runs_orig) == "typetracer":
@@ -125,24 +190,24 @@ class LumiMask:
 
     # This could be run in parallel, but windows does not support it
     @staticmethod
-    @numba.njit(
-        types.void(
-            _lumi_mask_dict_type, types.uint32[:], types.uint32[:], _numba_bool[:]
-        ),
-        parallel=True,
-        fastmath=True,
-        cache=True,
-    )
-    def _apply_run_lumi_mask_kernel(masks, runs, lumis, mask_out):
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _apply_run_lumi_mask_kernel(
+        index_runs, index_offsets, index_first, index_last, runs, lumis, mask_out
+    ):
         for iev in numba.prange(len(runs)):
-            run = numpy.uint32(runs[iev])
-            lumi = numpy.uint32(lumis[iev])
-
-            if run in masks:
-                lumimask = masks[run]
-                ind = numpy.searchsorted(lumimask, lumi)
-                if numpy.mod(ind, 2) == 1:
-                    mask_out[iev] = 1
+            run = runs[iev]
+            lumi = lumis[iev]
+
+            i = numpy.searchsorted(index_runs, run)
+            if i == len(index_runs) or index_runs[i] != run:
+                continue
+
+            # first range of the run ending at or after lumi
+            begin = index_offsets[i]
+            end = index_offsets[i + 1]
+            k = begin + numpy.searchsorted(index_last[begin:end], lumi)
+            if k < end and index_first[k] <= lumi:
+                mask_out[iev] = 1
 
 
 def _wrap_unique(array):
@@ -1,21 +1,28 @@
 import awkward as ak
+import numpy as np
+from numpy.typing import NDArray
+
 from ..eras import Year
 from ..dataset import Dataset
+from ..events.bitsets import BitIndex, all_bits
 
 
-def compute_met_filters(flags, dataset: Dataset) -> ak.Array:
+def met_filter_names(dataset: Dataset) -> list[str]:
+    """
+    MET filters of the era (flag names without the `Flag_` prefix).
+    """
     match dataset.year:
         case Year.RunSummer24:
-            return ak.Array(
-                (flags.goodVertices == 1)
-                & (flags.globalSuperTightHalo2016Filter == 1)
-                & (flags.EcalDeadCellTriggerPrimitiveFilter == 1)
-                & (flags.BadPFMuonFilter == 1)
-                & (flags.BadPFMuonDzFilter == 1)
-                & (flags.hfNoisyHitsFilter == 1)
-                & (flags.eeBadScFilter == 1)
-                & (flags.ecalBadCalibFilter == 1)
-            )
+            return [
+                "goodVertices",
+                "globalSuperTightHalo2016Filter",
+                "EcalDeadCellTriggerPrimitiveFilter",
+                "BadPFMuonFilter",
+                "BadPFMuonDzFilter",
+                "hfNoisyHitsFilter",
+                "eeBadScFilter",
+                "ecalBadCalibFilter",
+            ]
         case Year.RunSummer23BPix:
             raise NotImplementedError(dataset.year)
         case Year.RunSummer23:
@@ -34,3 +41,12 @@ def compute_met_filters(flags, dataset: Dataset) -> ak.Array:
             raise NotImplementedError(dataset.year)
         case _:
             raise ValueError(f"Invalid year {dataset.year}")
+
+
+def compute_met_filters(
+    flags: ak.Array, flag_index: BitIndex, dataset: Dataset
+) -> NDArray[np.bool_]:
+    """
+    Events passing all the MET filters of the era, from the packed flags bitset.
+    """
+    return all_bits(flags, flag_index.mask(met_filter_names(dataset)))
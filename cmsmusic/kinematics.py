@@ -0,0 +1,182 @@
+"""
+Numba-native kinematics on plain (pt, eta, phi, mass) floats and arrays.
+
+Meant to be called from inside njit kernels, where boxing `vector` objects per object (or per pair)
+is much slower than plain float arithmetic. The `all_pairs_*` helpers work on flat arrays plus
+per-event offsets (see `ak_utils.flat_offsets`).
+"""
+
+import numpy as np
+from numba import njit
+
+
+@njit(inline="always")
+def to_pxpypze(pt, eta, phi, mass):
+    px = pt * np.cos(phi)
+    py = pt * np.sin(phi)
+    pz = pt * np.sinh(eta)
+    e = np.sqrt(px * px + py * py + pz * pz + mass * mass)
+    return px, py, pz, e
+
+
+@njit(inline="always")
+def delta_phi(phi1, phi2):
+    dphi = (phi1 - phi2) % (2.0 * np.pi)
+    if dphi > np.pi:
+        dphi -= 2.0 * np.pi
+    return dphi
+
+
+@njit(inline="always")
+def delta_r2(eta1, phi1, eta2, phi2):
+    deta = eta1 - eta2
+    dphi = delta_phi(phi1, phi2)
+    return deta * deta + dphi * dphi
+
+
+@njit(inline="always")
+def delta_r(eta1, phi1, eta2, phi2):
+    return np.sqrt(delta_r2(eta1, phi1, eta2, phi2))
+
+
+@njit(inline="always")
+def mass_from_pxpypze(px, py, pz, e):
+    m2 = e * e - px * px - py * py - pz * pz
+    if m2 < 0.0:
+        return 0.0
+    return np.sqrt(m2)
+
+
+@njit(inline="always")
+def invariant_mass(pt1, eta1, phi1, mass1, pt2, eta2, phi2, mass2):
+    px1, py1, pz1, e1 = to_pxpypze(pt1, eta1, phi1, mass1)
+    px2, py2, pz2, e2 = to_pxpypze(pt2, eta2, phi2, mass2)
+    return mass_from_pxpypze(px1 + px2, py1 + py2, pz1 + pz2, e1 + e2)
+
+
+@njit
+def invariant_mass_n(pt, eta, phi, mass):
+    """
+    Invariant mass of the N objects in the arrays.
+    """
+    px_sum = 0.0
+    py_sum = 0.0
+    pz_sum = 0.0
+    e_sum = 0.0
+    for i in range(len(pt)):
+        px, py, pz, e = to_pxpypze(pt[i], eta[i], phi[i], mass[i])
+        px_sum += px
+        py_sum += py
+        pz_sum += pz
+        e_sum += e
+    return mass_from_pxpypze(px_sum, py_sum, pz_sum, e_sum)
+
+
+@njit(inline="always")
+def transverse_mass(pt1, phi1, pt2, phi2):
+    """
+    Transverse mass of two massless objects, e.g. a lepton and the MET.
+    """
+    mt2 = 2.0 * pt1 * pt2 * (1.0 - np.cos(delta_phi(phi1, phi2)))
+    if mt2 < 0.0:
+        return 0.0
+    return np.sqrt(mt2)
+
+
+@njit
+def transverse_mass_n(pt, phi, mass, met_pt, met_phi):
+    """
+    Transverse mass of the system of N objects plus the MET.
+    """
+    et_sum = met_pt
+    px_sum = met_pt * np.cos(met_phi)
+    py_sum = met_pt * np.sin(met_phi)
+    for i in range(len(pt)):
+        et_sum += np.sqrt(pt[i] * pt[i] + mass[i] * mass[i])
+        px_sum += pt[i] * np.cos(phi[i])
+        py_sum += pt[i] * np.sin(phi[i])
+
+    mt2 = et_sum * et_sum - px_sum * px_sum - py_sum * py_sum
+    if mt2 < 0.0:
+        return 0.0
+    return np.sqrt(mt2)
+
+
+@njit
+def sum_pt(pt):
+    """
+    Scalar sum of transverse momenta.
+    """
+    _sum_pt = 0.0
+    for i in range(len(pt)):
+        _sum_pt += pt[i]
+    return _sum_pt
+
+
+@njit
+def missing_pt(pt, phi):
+    """
+    Magnitude and direction of the negative vector sum of the transverse momenta (e.g. MHT).
+    """
+    px_sum = 0.0
+    py_sum = 0.0
+    for i in range(len(pt)):
+        px_sum -= pt[i] * np.cos(phi[i])
+        py_sum -= pt[i] * np.sin(phi[i])
+    return np.hypot(px_sum, py_sum), np.arctan2(py_sum, px_sum)
+
+
+@njit
+def all_pairs(offsets):
+    """
+    Indices (into the flat arrays) of all the i < j object pairs of each event.
+
+    Returns the pair offsets per event and the flat `first` and `second` indices.
+    """
+    num_events = len(offsets) - 1
+    pair_offsets = np.zeros(num_events + 1, dtype=np.int64)
+    for evt in range(num_events):
+        n = offsets[evt + 1] - offsets[evt]
+        pair_offsets[evt + 1] = pair_offsets[evt] + n * (n - 1) // 2
+
+    first = np.empty(pair_offsets[-1], dtype=np.int64)
+    second = np.empty(pair_offsets[-1], dtype=np.int64)
+    for evt in range(num_events):
+        pos = pair_offsets[evt]
+        for i in range(offsets[evt], offsets[evt + 1]):
+            for j in range(i + 1, offsets[evt + 1]):
+                first[pos] = i
+                second[pos] = j
+                pos += 1
+
+    return pair_offsets, first, second
+
+
+@njit
+def all_pairs_invariant_mass(offsets, pt, eta, phi, mass):
+    """
+    Invariant mass of all the i < j object pairs of each event, with their pair offsets.
+    """
+    pair_offsets, first, second = all_pairs(offsets)
+    masses = np.empty(len(first), dtype=np.float64)
+    for k in range(len(first)):
+        i = first[k]
+        j = second[k]
+        masses[k] = invariant_mass(
+            pt[i], eta[i], phi[i], mass[i], pt[j], eta[j], phi[j], mass[j]
+        )
+    return pair_offsets, masses
+
+
+@njit
+def all_pairs_delta_r(offsets, eta, phi):
+    """
+    DeltaR of all the i < j object pairs of each event, with their pair offsets.
+    """
+    pair_offsets, first, second = all_pairs(offsets)
+    delta_rs = np.empty(len(first), dtype=np.float64)
+    for k in range(len(first)):
+        i = first[k]
+        j = second[k]
+        delta_rs[k] = delta_r(eta[i], phi[i], eta[j], phi[j])
+    return pair_offsets, delta_rs
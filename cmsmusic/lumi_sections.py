@@ -0,0 +1,160 @@
+"""
+Bookkeeping of the processed lumisections of Data.
+
+Lumisections are stored as run -> sorted, disjoint [first, last] ranges, in the same layout as the
+compiled golden JSON (`LumiMaskIndex`). Every task writes the ranges it processed, and they are
+merged at the end of the campaign into a golden-JSON-like report. Everything is vectorized.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .dataset import Dataset
+from .filters.lumi_filter import LumiMask, LumiMaskIndex
+
+PROCESSED_LUMIS_DIR = Path("processed_lumis")
+
+
+def processed_lumis_path(dataset: Dataset, file_index: int) -> Path:
+    return (
+        PROCESSED_LUMIS_DIR
+        / str(dataset.year)
+        / str(dataset.process_name)
+        / f"{file_index}.npz"
+    )
+
+
+def _from_sorted_ranges(
+    runs: NDArray[np.uint32], first: NDArray[np.uint32], last: NDArray[np.uint32]
+) -> LumiMaskIndex:
+    """
+    Index from ranges sorted by run, with the ranges of each run sorted and disjoint.
+    """
+    index_runs, counts = np.unique(runs, return_counts=True)
+    offsets = np.zeros(len(index_runs) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return LumiMaskIndex(
+        index_runs.astype(np.uint32),
+        offsets,
+        first.astype(np.uint32),
+        last.astype(np.uint32),
+    )
+
+
+def _run_per_range(index: LumiMaskIndex) -> NDArray[np.uint32]:
+    return np.repeat(np.asarray(index.runs), np.diff(index.offsets))
+
+
+def lumi_ranges(runs: NDArray, lumis: NDArray) -> LumiMaskIndex:
+    """
+    Ranges of the (run, lumi) pairs present in the given columns, e.g. of the events passing
+    the run/lumi filter.
+    """
+    keys = np.unique(
+        (np.asarray(runs, dtype=np.uint64) << np.uint64(32))
+        | np.asarray(lumis, dtype=np.uint64)
+    )
+    # consecutive lumis of the same run are consecutive keys
+    starts = np.ones(len(keys), dtype=np.bool_)
+    starts[1:] = np.diff(keys) != 1
+    ends = np.roll(starts, -1)
+
+    _runs = (keys[starts] >> np.uint64(32)).astype(np.uint32)
+    _lumis = (keys & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+    return _from_sorted_ranges(_runs, _lumis[starts], _lumis[ends])
+
+
+def merge_lumi_ranges(indices: list[LumiMaskIndex]) -> LumiMaskIndex:
+    """
+    Union of many range sets, merging overlapping and adjacent ranges.
+    """
+    if len(indices) == 0:
+        return _from_sorted_ranges(*(np.empty(0, dtype=np.uint32),) * 3)
+
+    runs = np.concatenate([_run_per_range(index) for index in indices])
+    first = np.concatenate([np.asarray(index.first) for index in indices])
+    last = np.concatenate([np.asarray(index.last) for index in indices])
+
+    order = np.lexsort((first, runs))
+    # (run, lumi) packed in a single key, so that a running maximum never crosses runs
+    first_keys = (runs[order].astype(np.uint64) << np.uint64(32)) | first[order]
+    last_keys = (runs[order].astype(np.uint64) << np.uint64(32)) | last[order]
+    max_last_keys = np.maximum.accumulate(last_keys)
+
+    # a range starts a new merged range if it begins after the end of all the previous ones
+    starts = np.ones(len(order), dtype=np.bool_)
+    starts[1:] = first_keys[1:] > max_last_keys[:-1] + np.uint64(1)
+    ends = np.roll(starts, -1)
+
+    return _from_sorted_ranges(
+        runs[order][starts],
+        first[order][starts],
+        (max_last_keys[ends] & np.uint64(0xFFFFFFFF)).astype(np.uint32),
+    )
+
+
+def num_lumis(index: LumiMaskIndex) -> int:
+    return int(
+        np.sum(
+            np.asarray(index.last, dtype=np.int64)
+            - np.asarray(index.first, dtype=np.int64)
+            + 1
+        )
+    )
+
+
+def expand_lumi_ranges(
+    index: LumiMaskIndex,
+) -> tuple[NDArray[np.uint32], NDArray[np.uint32]]:
+    """
+    All the (run, lumi) pairs of the ranges.
+    """
+    lengths = np.asarray(index.last, dtype=np.int64) - index.first + 1
+    range_starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    lumis = np.repeat(np.asarray(index.first, dtype=np.int64), lengths) + (
+        np.arange(lengths.sum()) - range_starts
+    )
+    return np.repeat(_run_per_range(index), lengths), lumis.astype(np.uint32)
+
+
+def certified(index: LumiMaskIndex, golden: LumiMaskIndex) -> NDArray[np.bool_]:
+    """
+    Whether each (run, lumi) pair of `expand_lumi_ranges(index)` is in `golden`.
+    """
+    runs, lumis = expand_lumi_ranges(index)
+    mask = np.zeros(len(runs), dtype=np.bool_)
+    LumiMask._apply_run_lumi_mask_kernel(
+        *(np.asarray(array) for array in golden), runs, lumis, mask
+    )
+    return mask
+
+
+def to_golden_json(index: LumiMaskIndex) -> dict[str, list[list[int]]]:
+    return {
+        str(run): [
+            [int(a), int(b)]
+            for a, b in zip(
+                index.first[index.offsets[i] : index.offsets[i + 1]],
+                index.last[index.offsets[i] : index.offsets[i + 1]],
+            )
+        ]
+        for i, run in enumerate(index.runs)
+    }
+
+
+def save_lumi_ranges(path: Path, index: LumiMaskIndex) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(path, **index._asdict())
+
+
+def load_lumi_ranges(path: Path) -> LumiMaskIndex:
+    with np.load(path) as f:
+        return LumiMaskIndex(*(f[name] for name in LumiMaskIndex._fields))
+
+
+def write_golden_json(path: Path, index: LumiMaskIndex) -> None:
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(to_golden_json(index), f, indent=1)
@@ -0,0 +1,108 @@
+"""
+DeltaR matching between collections: cross-cleaning (overlap removal) and offline-to-trigger
+object matching.
+
+Works on the flat contents and per-event offsets of the collections, one event at a time, so
+nothing proportional to the number of object pairs is ever allocated (as with `ak.cartesian`).
+"""
+
+from enum import IntEnum
+
+import awkward as ak
+import numpy as np
+from numba import njit
+
+from .ak_utils import flat_np_view, flat_offsets, layout_ak_array
+from .kinematics import delta_r2
+
+
+class TrigObjId(IntEnum):
+    """
+    NanoAOD `TrigObj_id`.
+    """
+
+    Jet = 1
+    MET = 2
+    HT = 3
+    MHT = 4
+    FatJet = 6
+    Electron = 11
+    Muon = 13
+    Tau = 15
+    Photon = 22
+
+
+def has_overlap(
+    objects: ak.Array,
+    others: ak.Array,
+    max_delta_r: float,
+    others_mask: ak.Array | None = None,
+) -> ak.Array:
+    """
+    For each object, whether there is an object of `others` in the same event within
+    `max_delta_r` (only among the `others` passing `others_mask`, if given).
+
+    Returns a jagged boolean array with the structure of `objects`, e.g. jets cleaned
+    against muons are `jets[~has_overlap(jets, muons, 0.4, muons.is_selected)]`.
+    """
+    if others_mask is None:
+        _others_mask = np.ones(ak.sum(ak.num(others, axis=1)), dtype=np.bool_)
+    else:
+        _others_mask = flat_np_view(others_mask)
+
+    overlap = _any_within_delta_r(
+        flat_offsets(objects),
+        flat_np_view(objects.eta),
+        flat_np_view(objects.phi),
+        flat_offsets(others),
+        flat_np_view(others.eta),
+        flat_np_view(others.phi),
+        _others_mask,
+        max_delta_r * max_delta_r,
+    )
+    return layout_ak_array(overlap, objects.pt)
+
+
+@njit(cache=True)
+def _any_within_delta_r(
+    offsets, eta, phi, other_offsets, other_eta, other_phi, other_mask, max_delta_r2
+):
+    overlap = np.zeros(offsets[-1], dtype=np.bool_)
+    for evt in range(len(offsets) - 1):
+        for j in range(other_offsets[evt], other_offsets[evt + 1]):
+            if not other_mask[j]:
+                continue
+            for i in range(offsets[evt], offsets[evt + 1]):
+                if overlap[i]:
+                    continue
+                if delta_r2(eta[i], phi[i], other_eta[j], other_phi[j]) < max_delta_r2:
+                    overlap[i] = True
+
+    return overlap
+
+
+# `TrigObj_filterBits` of a muon trigger object matched to HLT_IsoMu24 (NanoAOD v15):
+# bit 1 = Iso, bit 3 = 1mu
+ISO_MU24_FILTER_BITS = (1 << 1) | (1 << 3)
+
+
+def match_trigger_objects(
+    objects: ak.Array,
+    trigobjs: ak.Array,
+    trigobj_id: TrigObjId,
+    filter_bits: int,
+    max_delta_r: float = 0.1,
+) -> ak.Array:
+    """
+    For each offline object, whether there is a trigger object of the same event with id
+    `trigobj_id`, all the `filter_bits` set and within `max_delta_r`.
+
+    Returns a jagged boolean array with the structure of `objects`.
+    """
+    return has_overlap(
+        objects,
+        trigobjs,
+        max_delta_r,
+        (trigobjs.id == int(trigobj_id))
+        & (trigobjs.filterBits & np.uint64(filter_bits) == np.uint64(filter_bits)),
+    )
@@ -1,5 +1,6 @@
 from numba import njit, types, int64, float64, boolean
 from numba.experimental import jitclass
+from numba.typed import Dict
 import numpy as np
 import hist
 
@@ -145,6 +146,111 @@ def make_variable_hist(edges_in, name: str = "hist"):
     return Hist(name, counts, variances, edges, nbins, False, 0.0, 0.0, 0.0)
 
 
+# ---------- HISTOGRAM COLLECTION (one uniform histogram per integer key) ----------
+collection_spec = [
+    ("name", types.unicode_type),
+    ("nbins", int64),
+    ("low", float64),
+    ("high", float64),
+    ("width", float64),
+    ("index", types.DictType(int64, int64)),  # key -> row
+    ("keys", int64[:]),  # row -> key
+    # shape = (capacity, nbins + 2), with underflow at 0 and overflow at nbins + 1
+    ("counts", float64[:, :]),
+    ("variances", float64[:, :]),
+    ("size", int64),
+]
+
+
+@jitclass(collection_spec)  # type: ignore
+class HistCollection:
+    """
+    Histograms with the same uniform binning, indexed by an integer key (e.g. an event class ID).
+    Rows are allocated on first fill, so only the populated keys cost memory.
+    """
+
+    def __init__(self, name, nbins, low, high):
+        self.name = name
+        self.nbins = nbins
+        self.low = low
+        self.high = high
+        self.width = (high - low) / nbins
+        self.index = Dict.empty(key_type=int64, value_type=int64)
+        self.keys = np.zeros(16, dtype=np.int64)
+        self.counts = np.zeros((16, nbins + 2), dtype=np.float64)
+        self.variances = np.zeros((16, nbins + 2), dtype=np.float64)
+        self.size = 0
+
+    def _row(self, key):
+        if key in self.index:
+            return self.index[key]
+
+        if self.size == len(self.keys):
+            # grow by doubling
+            capacity = 2 * len(self.keys)
+            keys = np.zeros(capacity, dtype=np.int64)
+            counts = np.zeros((capacity, self.nbins + 2), dtype=np.float64)
+            variances = np.zeros((capacity, self.nbins + 2), dtype=np.float64)
+            keys[: self.size] = self.keys[: self.size]
+            counts[: self.size] = self.counts[: self.size]
+            variances[: self.size] = self.variances[: self.size]
+            self.keys = keys
+            self.counts = counts
+            self.variances = variances
+
+        row = self.size
+        self.index[key] = row
+        self.keys[row] = key
+        self.size += 1
+        return row
+
+    def fill(self, key, x, weight=1.0):
+        """
+        Fill a single value `x` with weight `weight` in the histogram of `key`.
+        Same flow and NaN/inf handling as `Hist.fill`.
+        """
+        if not np.isfinite(x):
+            return False
+
+        if x < self.low:
+            idx = 0
+        elif x >= self.high:
+            idx = self.nbins + 1
+        else:
+            idx = min(int((x - self.low) / self.width), self.nbins - 1) + 1
+
+        row = self._row(key)
+        self.counts[row, idx] += weight
+        self.variances[row, idx] += weight * weight
+        return True
+
+    def get(self, key):
+        """
+        Copy of the histogram of `key`, as a `Hist`.
+        """
+        h = make_uniform_hist(self.nbins, self.low, self.high, self.name)
+        if key not in self.index:
+            return h
+
+        row = self.index[key]
+        for i in range(self.nbins):
+            h.counts[i] = self.counts[row, i + 1]
+            h.variances[i] = self.variances[row, i + 1]
+        h.underflow = self.counts[row, 0]
+        h.underflow_variance = self.variances[row, 0]
+        h.overflow = self.counts[row, self.nbins + 1]
+        h.overflow_variance = self.variances[row, self.nbins + 1]
+        return h
+
+
+@njit
+def make_uniform_hist_collection(
+    bins: int, low: float, high: float, name: str = "hist"
+):
+    assert bins > 0
+    return HistCollection(name, bins, low, high)
+
+
 # ---------- EXAMPLES: using the Hist inside njit ----------
 @njit
 def example_fill_uniform_with_flows():
@@ -240,11 +346,25 @@ def to_hist(jit_hist):
     return h
 
 
+def collection_to_hists(jit_collection) -> dict:
+    """
+    Convert a Numba jitclass `HistCollection` into a dict of key -> scikit-hep `hist.Hist`.
+    """
+    return {
+        int(key): to_hist(jit_collection.get(key))
+        for key in jit_collection.keys[: jit_collection.size]
+    }
+
+
 def to_root(h):
+    """
+    Convert a jitclass `Hist` (or its `hist.Hist` conversion, see `to_hist`) into a ROOT TH1D.
+    """
     import ROOT
 
-    name = h.name
-    h = to_hist(h)
+    if not isinstance(h, hist.Hist):
+        h = to_hist(h)
+    name = h.axes[0].name
 
     # Extract info
     edges = h.axes[0].edges
@@ -0,0 +1,333 @@
+"""
+Pipelined processing of one file, with dedicated reader and compute processes.
+
+Readers decompress cluster-aligned entry ranges of the file (only the branches read by the
+builders) and hand them over as awkward buffers in shared memory. Compute processes attach to those
+buffers without copying them, build the events from them (see `MemoryTree`) and run the analysis.
+The queue between both stages is bounded: readers block when the compute processes lag behind, so
+at most `queue_size` chunks wait in memory at any time.
+
+All the processes share the resource tracker of the main process, which unlinks the shared memory
+blocks left behind by a failed run.
+"""
+
+import gc
+import logging
+import multiprocessing as mp
+import queue
+import traceback
+from collections.abc import Callable
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, NamedTuple
+
+import awkward as ak
+import numpy as np
+import uproot
+
+logger = logging.getLogger("Pipeline")
+
+# default number of entries per chunk (whole clusters are read, so chunks are at least a cluster)
+CHUNK_ENTRIES = 200_000
+
+# alignment of the buffers in the shared memory blocks, in bytes
+ALIGNMENT = 64
+
+
+class SharedChunk(NamedTuple):
+    """
+    Entries [entry_start, entry_stop) of the file, as awkward buffers in a shared memory block.
+    """
+
+    shm_name: str
+    form: str
+    length: int
+    # buffer key -> (offset, size) in the block
+    buffers: dict[str, tuple[int, int]]
+    # jagged branch -> its counter branch
+    counters: dict[str, str]
+    entry_start: int
+    entry_stop: int
+
+
+def to_shared_memory(
+    columns: ak.Array, counters: dict[str, str], entry_start: int, entry_stop: int
+) -> SharedChunk:
+    """
+    Copy `columns` into a new shared memory block. The block is owned by the consumer, which
+    unlinks it.
+    """
+    form, length, container = ak.to_buffers(ak.to_packed(columns))
+
+    buffers: dict[str, tuple[int, int]] = {}
+    size = 0
+    for key, buffer in container.items():
+        buffers[key] = (size, buffer.nbytes)
+        size += -(-buffer.nbytes // ALIGNMENT) * ALIGNMENT
+
+    shm = SharedMemory(create=True, size=max(size, 1))
+    for key, buffer in container.items():
+        offset, nbytes = buffers[key]
+        np.frombuffer(shm.buf, np.uint8, nbytes, offset)[:] = np.frombuffer(
+            np.ascontiguousarray(buffer), np.uint8
+        )
+    shm.close()
+
+    return SharedChunk(
+        shm.name, form.to_json(), length, buffers, counters, entry_start, entry_stop
+    )
+
+
+def from_shared_memory(chunk: SharedChunk) -> tuple[ak.Array, SharedMemory]:
+    """
+    Columns of `chunk`, viewing the shared memory block (zero-copy). The block must stay open
+    while the columns (or any view of them) are alive.
+    """
+    shm = SharedMemory(name=chunk.shm_name)
+    container = {
+        key: np.frombuffer(shm.buf, np.uint8, nbytes, offset)
+        for key, (offset, nbytes) in chunk.buffers.items()
+    }
+    columns = ak.from_buffers(
+        ak.forms.from_json(chunk.form), chunk.length, container, highlevel=True
+    )
+    return columns, shm
+
+
+def _try_close(shm: SharedMemory) -> bool:
+    """
+    Unmap the block, unless it is still viewed by a live array.
+    """
+    try:
+        shm.close()
+    except BufferError:
+        return False
+    return True
+
+
+class _MemoryBranch(NamedTuple):
+    name: str
+    count_branch: "_MemoryBranch | None"
+
+
+class MemoryTree:
+    """
+    In-memory stand-in for the entries of a TTree, with the part of the `uproot.TTree` interface
+    used by the builders (`keys`, `arrays`, `num_entries` and `__getitem__` for the counters), and
+    `common_entry_offsets` for `FilteredTree`.
+    """
+
+    def __init__(self, columns: ak.Array, counters: dict[str, str]) -> None:
+        self.columns = columns
+        self.counters = counters
+
+    @property
+    def num_entries(self) -> int:
+        return len(self.columns)
+
+    def keys(self, *args, **kwargs) -> list[str]:
+        return ak.fields(self.columns)
+
+    def __getitem__(self, name: str) -> _MemoryBranch:
+        if name not in ak.fields(self.columns):
+            raise KeyError(name)
+        if name in self.counters:
+            return _MemoryBranch(name, _MemoryBranch(self.counters[name], None))
+        return _MemoryBranch(name, None)
+
+    def common_entry_offsets(self) -> list[int]:
+        return [0, self.num_entries]
+
+    def arrays(
+        self,
+        expressions: list[str],
+        entry_start: int | None = None,
+        entry_stop: int | None = None,
+        library: str = "ak",
+    ):
+        columns = self.columns[entry_start:entry_stop][expressions]
+        if library == "np":
+            return {name: ak.to_numpy(columns[name]) for name in expressions}
+        return columns
+
+
+def chunk_ranges(tree: uproot.TTree, chunk_entries: int) -> list[tuple[int, int]]:
+    """
+    Entry ranges of whole clusters, of at least `chunk_entries` entries each (but the last one).
+    """
+    cluster_offsets = tree.common_entry_offsets()
+    ranges = []
+    start = 0
+    for stop in cluster_offsets[1:]:
+        if stop - start >= chunk_entries:
+            ranges.append((start, stop))
+            start = stop
+    if start < tree.num_entries:
+        ranges.append((start, tree.num_entries))
+    return ranges
+
+
+class _Failure(NamedTuple):
+    traceback: str
+
+
+def _read(
+    file_path: str,
+    object_path: str,
+    branches: list[str],
+    counters: dict[str, str],
+    range_queue: Any,
+    chunk_queue: Any,
+    result_queue: Any,
+) -> None:
+    entry_start = -1
+    try:
+        tree = uproot.open({file_path: object_path})
+        while (entry_range := range_queue.get()) is not None:
+            entry_start, entry_stop = entry_range
+            columns = tree.arrays(
+                branches, entry_start=entry_start, entry_stop=entry_stop
+            )
+            # blocks while the queue is full
+            chunk_queue.put(
+                to_shared_memory(columns, counters, entry_start, entry_stop)
+            )
+    except Exception:
+        result_queue.put((entry_start, _Failure(traceback.format_exc())))
+
+
+def _compute(
+    process_chunk: Callable[[MemoryTree, int], Any],
+    initializer: Callable[[], Any] | None,
+    chunk_queue: Any,
+    result_queue: Any,
+) -> None:
+    if initializer is not None:
+        try:
+            initializer()
+        except Exception:
+            result_queue.put((-1, _Failure(traceback.format_exc())))
+            return
+
+    # blocks still viewed, e.g. by a result being sent
+    mapped: list[SharedMemory] = []
+    while (chunk := chunk_queue.get()) is not None:
+        try:
+            columns, shm = from_shared_memory(chunk)
+            # the memory is freed once the last mapping is closed
+            shm.unlink()
+            mapped.append(shm)
+            result = process_chunk(
+                MemoryTree(columns, chunk.counters), chunk.entry_start
+            )
+            result_queue.put((chunk.entry_start, result))
+        except Exception:
+            result_queue.put((chunk.entry_start, _Failure(traceback.format_exc())))
+        finally:
+            columns = result = None
+            gc.collect()
+            mapped = [shm for shm in mapped if not _try_close(shm)]
+
+
+def run_pipeline(
+    tree: uproot.TTree,
+    branches: list[str],
+    process_chunk: Callable[[MemoryTree, int], Any],
+    num_readers: int,
+    num_workers: int,
+    chunk_entries: int = CHUNK_ENTRIES,
+    queue_size: int | None = None,
+    worker_initializer: Callable[[], Any] | None = None,
+) -> list[Any]:
+    """
+    Read `branches` of `tree` in chunks with `num_readers` processes and call
+    `process_chunk(memory_tree, entry_start)` on each of them in `num_workers` processes.
+    Each compute process first calls `worker_initializer`, while the readers fill the queue
+    (e.g. `classification.warm_start`).
+
+    `process_chunk` and `worker_initializer` must be picklable (module-level functions or
+    `functools.partial` of them) and the results too. Returns the results in entry order.
+    """
+    ranges = chunk_ranges(tree, chunk_entries)
+    counters = {
+        branch: tree[branch].count_branch.name
+        for branch in branches
+        if tree[branch].count_branch is not None
+    }
+    to_read = sorted(set(branches) | set(counters.values()))
+    logger.info(
+        f"Pipeline: {len(ranges)} chunks, {num_readers} readers, {num_workers} workers"
+    )
+
+    ctx = mp.get_context("spawn")
+    # started before the children, so that they all share it
+    resource_tracker.ensure_running()
+
+    range_queue = ctx.Queue()
+    for entry_range in ranges:
+        range_queue.put(entry_range)
+    for _ in range(num_readers):
+        range_queue.put(None)
+    chunk_queue = ctx.Queue(maxsize=queue_size or 2 * num_workers)
+    result_queue = ctx.Queue()
+
+    readers = [
+        ctx.Process(
+            target=_read,
+            args=(
+                tree.file.file_path,
+                tree.object_path,
+                to_read,
+                counters,
+                range_queue,
+                chunk_queue,
+                result_queue,
+            ),
+            daemon=True,
+        )
+        for _ in range(num_readers)
+    ]
+    workers = [
+        ctx.Process(
+            target=_compute,
+            args=(process_chunk, worker_initializer, chunk_queue, result_queue),
+            daemon=True,
+        )
+        for _ in range(num_workers)
+    ]
+    for process in readers + workers:
+        process.start()
+
+    results: dict[int, Any] = {}
+    try:
+        while len(results) < len(ranges):
+            try:
+                entry_start, result = result_queue.get(timeout=1.0)
+            except queue.Empty:
+                if any(p.exitcode not in (None, 0) for p in readers + workers):
+                    raise RuntimeError("A pipeline process died")
+                continue
+            if isinstance(result, _Failure):
+                raise RuntimeError(
+                    f"Pipeline failed at entry {entry_start}:\n{result.traceback}"
+                )
+            results[entry_start] = result
+
+        for _ in workers:
+            chunk_queue.put(None)
+        for process in readers + workers:
+            process.join()
+    finally:
+        for process in readers + workers:
+            if process.is_alive():
+                process.terminate()
+        # chunks read but never processed
+        while True:
+            try:
+                chunk = chunk_queue.get_nowait()
+            except queue.Empty:
+                break
+            if chunk is not None:
+                SharedMemory(name=chunk.shm_name).unlink()
+
+    return [results[entry_start] for entry_start, _ in ranges]
@@ -0,0 +1,344 @@
+"""
+Local skims of NanoAOD files, for repeated classification passes.
+
+`skim_file` applies the event-level preselection (see `EventsBuilder.with_preselection`) to one
+file and writes the surviving events to a local compressed ROOT file, keeping only the branches
+read by the builders. Next to it, a JSON provenance records the input LFN, the filter definitions,
+the code version and the sum of weights of the full input file, together with the cutflow of the
+dropped events (and, for Data, the processed lumisections of the full file).
+
+`EventsBuilder.with_skims` reads the skim instead of the NanoAOD file when its provenance matches
+the current configuration (see `find_skim`).
+"""
+
+import hashlib
+import logging
+import os
+import subprocess
+import tempfile
+from functools import cache
+from pathlib import Path
+from typing import Any
+
+import awkward as ak
+import numpy as np
+import uproot
+from numpy.typing import NDArray
+from pydantic import BaseModel
+
+from .cvmfs import cvmfs_path
+from .dataset import Dataset, DatasetType, get_sum_weights
+from .deduplication import load_veto, veto_path
+from .events.filtered_tree import FilteredTree
+from .events.hlt_bits import hlt_paths
+from .filters.lumi_filter import LumiMaskIndex, golden_json
+from .filters.met_filters import met_filter_names
+from .lumi_sections import load_lumi_ranges, save_lumi_ranges
+
+logger = logging.getLogger("Skims")
+
+SKIMS_DIR = Path("skims")
+
+# bump when the content of the skims changes in a way the filter definitions do not capture
+SKIM_FORMAT_VERSION = 1
+
+
+class SkimProvenance(BaseModel):
+    format_version: int = SKIM_FORMAT_VERSION
+    lfn: str
+    code_version: str
+    # see `filter_definitions`
+    filters: dict[str, Any]
+    branches: list[str]
+    # of the full input file
+    num_input_events: int
+    sum_weights: float
+    num_events: int
+    # unique preselection filter masks of the dropped events, and how many events have each
+    dropped_filters: dict[str, list[bool]]
+    dropped_counts: list[float]
+
+
+def skim_path(skims_dir: Path, dataset: Dataset, file_index: int) -> Path:
+    return (
+        skims_dir / str(dataset.year) / str(dataset.process_name) / f"{file_index}.root"
+    )
+
+
+def _provenance_path(path: Path) -> Path:
+    return path.with_suffix(".json")
+
+
+def _lumis_path(path: Path) -> Path:
+    return path.with_suffix(".lumis.npz")
+
+
+@cache
+def _file_sha256(path: Path) -> str:
+    """
+    Hash of the content of `path`, once per process.
+    """
+    with open(path, "rb") as fin:
+        return hashlib.file_digest(fin, "sha256").hexdigest()
+
+
+@cache
+def code_version() -> str:
+    """
+    `git describe` of the checkout, once per process.
+    """
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def filter_definitions(
+    dataset: Dataset, file_index: int, duplicate_index_dir: Path | None
+) -> dict[str, Any]:
+    """
+    Everything the preselection of one file depends on, to tell whether a skim is still valid.
+    """
+    definitions: dict[str, Any] = {
+        "run_lumi_filter": None,
+        "met_filters": met_filter_names(dataset),
+        "trigger": hlt_paths(dataset.year),
+        "duplicate_veto": None,
+    }
+    if dataset.dataset_type == DatasetType.DATA:
+        jsonfile = golden_json(dataset.year)
+        definitions["run_lumi_filter"] = {
+            "golden_json": str(jsonfile),
+            "sha256": _file_sha256(cvmfs_path(jsonfile)),
+        }
+    if duplicate_index_dir is not None:
+        # raises if there is no veto
+        load_veto(duplicate_index_dir, dataset, file_index)
+        definitions["duplicate_veto"] = _file_sha256(
+            veto_path(duplicate_index_dir, dataset, file_index).absolute()
+        )
+    return definitions
+
+
+class _BranchRecorder:
+    """
+    Tree wrapper recording the branches read through it.
+    """
+
+    def __init__(self, tree: FilteredTree) -> None:
+        self.tree = tree
+        self.branches: set[str] = set()
+
+    @property
+    def num_entries(self) -> int:
+        return self.tree.num_entries
+
+    def keys(self, *args, **kwargs) -> list[str]:
+        return self.tree.keys(*args, **kwargs)
+
+    def __getitem__(self, name: str):
+        self.branches.add(name)
+        return self.tree[name]
+
+    def arrays(self, expressions: list[str], library: str = "ak"):
+        self.branches.update(expressions)
+        return self.tree.arrays(expressions, library=library)
+
+
+def used_branches(tree: uproot.TTree, dataset: Dataset) -> list[str]:
+    """
+    Branches of `tree` read by the builders, found by building zero events.
+    """
+    from .events.events import _read_collections
+    from .events.flags import _build_flags
+    from .events.hlt_bits import _build_hlt_bits
+    from .events.run_lumi import _build_run_lumi
+
+    recorder = _BranchRecorder(FilteredTree(tree, np.empty(0, dtype=np.int64)))
+    run, _ = _build_run_lumi(recorder)  # type: ignore
+    _build_hlt_bits(recorder, dataset.year)  # type: ignore
+    _build_flags(recorder)  # type: ignore
+    _read_collections(recorder, run, dataset)  # type: ignore
+    return sorted(recorder.branches)
+
+
+def _tree_content(
+    tree: uproot.TTree, branches: list[str], columns: ak.Array
+) -> dict[str, ak.Array]:
+    """
+    Columns to write with uproot: jagged branches zipped per counter, so that the NanoAOD
+    `nX` / `X_y` naming is kept.
+    """
+    flat: dict[str, ak.Array] = {}
+    collections: dict[str, dict[str, ak.Array]] = {}
+    counters = set()
+    for branch in branches:
+        count_branch = tree[branch].count_branch
+        if count_branch is None:
+            flat[branch] = columns[branch]
+            continue
+        counters.add(count_branch.name)
+        collection = count_branch.name.removeprefix("n")
+        collections.setdefault(collection, {})[
+            branch.removeprefix(f"{collection}_")
+        ] = columns[branch]
+
+    return {
+        **{name: column for name, column in flat.items() if name not in counters},
+        **{name: ak.zip(fields) for name, fields in collections.items()},
+    }
+
+
+def skim_file(
+    dataset: Dataset,
+    file_index: int,
+    enable_cache: bool,
+    duplicate_index_dir: Path | None = None,
+    skims_dir: Path = SKIMS_DIR,
+) -> Path:
+    """
+    Write the skim of one file and its provenance.
+    """
+    from .events.events import EventsBuilder
+
+    event_level = (
+        EventsBuilder(dataset, file_index, enable_cache)
+        .with_duplicate_veto(duplicate_index_dir)
+        .with_preselection()
+        .with_skims(None)
+        .read_event_level()
+    )
+    evts = event_level.evts
+    assert isinstance(evts, FilteredTree) and event_level.dropped_filters is not None
+
+    branches = used_branches(evts.tree, dataset)
+    columns = evts.arrays(branches)
+    sum_weights, num_input_events = get_sum_weights(evts.tree, dataset.dataset_type)
+    dropped_filters, dropped_counts = event_level.dropped_filters
+
+    assert dataset.lfns is not None
+    provenance = SkimProvenance(
+        lfn=dataset.lfns[file_index],
+        code_version=code_version(),
+        filters=filter_definitions(dataset, file_index, duplicate_index_dir),
+        branches=branches,
+        num_input_events=num_input_events,
+        sum_weights=sum_weights,
+        num_events=evts.num_entries,
+        dropped_filters={name: mask.tolist() for name, mask in dropped_filters.items()},
+        dropped_counts=dropped_counts.tolist(),
+    )
+
+    path = skim_path(skims_dir, dataset, file_index)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # the provenance is written last: a skim without one is incomplete and never read
+    _provenance_path(path).unlink(missing_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    os.close(fd)
+    content = _tree_content(evts.tree, branches, columns)
+    with uproot.recreate(tmp_path, compression=uproot.ZSTD(5)) as f:
+        # a TTree, as the NanoAOD files
+        tree = f.mktree(
+            "Events", {name: column.type for name, column in content.items()}
+        )
+        if evts.num_entries > 0:
+            tree.extend(content)
+    os.replace(tmp_path, path)
+
+    if event_level.processed_lumis is not None:
+        save_lumi_ranges(_lumis_path(path), event_level.processed_lumis)
+
+    _provenance_path(path).write_text(
+        provenance.model_dump_json(indent=1), encoding="utf-8"
+    )
+    logger.info(
+        f"Skimmed {provenance.num_events} of {provenance.num_input_events} events into {path}"
+    )
+    return path
+
+
+def find_skim(
+    skims_dir: Path,
+    dataset: Dataset,
+    file_index: int,
+    duplicate_index_dir: Path | None,
+) -> Path | None:
+    """
+    Skim of one file, if there is a complete one matching the current filter definitions, code
+    version and branches read by the builders.
+    """
+    path = skim_path(skims_dir, dataset, file_index)
+    if not _provenance_path(path).exists():
+        return None
+
+    provenance = load_provenance(path)
+    assert dataset.lfns is not None
+    if (
+        provenance.format_version != SKIM_FORMAT_VERSION
+        or provenance.lfn != dataset.lfns[file_index]
+        or provenance.code_version != code_version()
+        or provenance.filters
+        != filter_definitions(dataset, file_index, duplicate_index_dir)
+        or not _has_branches(path, provenance, dataset)
+    ):
+        logger.info(f"Skim {path} is outdated")
+        return None
+
+    return path
+
+
+def _has_branches(path: Path, provenance: SkimProvenance, dataset: Dataset) -> bool:
+    """
+    Whether the builders read exactly the branches kept in the skim.
+    """
+    tree: uproot.TTree = uproot.open(f"{path}:Events")  # type: ignore
+    try:
+        branches = used_branches(tree, dataset)
+    except KeyError:
+        # a branch the builders need is missing from the skim
+        return False
+    return branches == provenance.branches
+
+
+def load_provenance(path: Path) -> SkimProvenance:
+    return SkimProvenance.model_validate_json(
+        _provenance_path(path).read_text(encoding="utf-8")
+    )
+
+
+def load_skim(
+    path: Path,
+) -> tuple[
+    uproot.TTree,
+    SkimProvenance,
+    tuple[dict[str, NDArray[np.bool_]], NDArray[np.float64]],
+    LumiMaskIndex | None,
+]:
+    """
+    Tree, provenance, dropped events cutflow and processed lumisections of a skim.
+    """
+    provenance = load_provenance(path)
+    dropped_filters = (
+        {
+            name: np.asarray(mask, dtype=np.bool_)
+            for name, mask in provenance.dropped_filters.items()
+        },
+        np.asarray(provenance.dropped_counts, dtype=np.float64),
+    )
+    processed_lumis = None
+    if _lumis_path(path).exists():
+        processed_lumis = load_lumi_ranges(_lumis_path(path))
+
+    return (
+        uproot.open(f"{path}:Events"),  # type: ignore
+        provenance,
+        dropped_filters,
+        processed_lumis,
+    )
@@ -0,0 +1,500 @@
+"""
+Synthetic NanoAOD-like files, and local stand-ins of the /cvmfs inputs, to run (and benchmark) the
+analysis without grid access.
+
+`write_synthetic_file` writes an `Events` TTree with the branches read by the builders, with the
+NanoAOD naming (`nX` / `X_y`) and dtypes, the objects of each event sorted by decreasing pt and one
+cluster every `SyntheticConfig.cluster_entries` events. The number of objects of each collection is
+Poisson distributed, with the means of `SyntheticConfig.multiplicities`.
+
+`write_stand_ins` writes a local mirror of the /cvmfs inputs (see `cvmfs.cvmfs_path`): a golden
+JSON certifying most of the synthetic lumisections, and simplified jet ID, jet veto map and muon
+scale factor corrections, with the names and inputs of the real ones.
+"""
+
+import gzip
+import json
+from pathlib import Path
+from typing import NamedTuple
+
+import awkward as ak
+import correctionlib.schemav2 as cs
+import numpy as np
+import uproot
+from pydantic import BaseModel
+
+from .cvmfs import mirrored_path
+from .dataset import Dataset, DatasetType, ProcessGroup
+from .eras import LHCRun, NanoADODVersion, Year
+from .events.flags import FLAG_NAMES
+from .events.hlt_bits import hlt_paths
+from .filters.jet_id import JetIdWP, jet_id_file
+from .filters.jet_veto_maps import jet_veto_map
+from .filters.lumi_filter import golden_json
+from .matching import ISO_MU24_FILTER_BITS, TrigObjId
+from .weights import scale_factors
+
+
+class ObjectKinematics(NamedTuple):
+    min_pt: float
+    # mean of the exponential pt spectrum above `min_pt`
+    mean_pt: float
+    max_eta: float
+
+
+KINEMATICS = {
+    "Muon": ObjectKinematics(3.0, 15.0, 2.4),
+    "Electron": ObjectKinematics(5.0, 15.0, 2.5),
+    "Tau": ObjectKinematics(18.0, 15.0, 2.5),
+    "Photon": ObjectKinematics(15.0, 20.0, 2.5),
+    "Jet": ObjectKinematics(15.0, 30.0, 4.7),
+    "TrigObj": ObjectKinematics(5.0, 20.0, 2.5),
+}
+
+# fraction of the jet veto map cells that veto
+HOT_CELL_FRACTION = 0.01
+
+
+class SyntheticConfig(BaseModel):
+    year: Year = Year.RunSummer24
+    nanoaod_version: NanoADODVersion = NanoADODVersion.V15
+    dataset_type: DatasetType = DatasetType.DATA
+    # Poisson mean of the number of objects per event, see `KINEMATICS` for the collections
+    multiplicities: dict[str, float] = {
+        "Muon": 1.2,
+        "Electron": 1.0,
+        "Tau": 0.8,
+        "Photon": 0.8,
+        "Jet": 4.5,
+        "TrigObj": 3.0,
+    }
+    # Data runs and lumisections (MC is all run 1), the events of a file fill them in order
+    first_run: int = 380_000
+    num_runs: int = 50
+    lumis_per_run: int = 500
+    events_per_lumi: int = 200
+    # HLT_IsoMu24 fires with this efficiency for a leading muon above 26 GeV
+    iso_mu24_efficiency: float = 0.9
+    # rate of each of the other HLT paths
+    trigger_rate: float = 0.02
+    # HLT paths not used by the analysis, as in the real files
+    num_extra_hlt_paths: int = 100
+    # rate of failures of each flag
+    flag_failure_rate: float = 0.002
+    # MC only
+    negative_weight_fraction: float = 0.1
+    cluster_entries: int = 100_000
+    seed: int = 1
+
+
+def synthetic_dataset(path: Path, config: SyntheticConfig) -> Dataset:
+    """
+    Dataset made of the synthetic file `path`.
+    """
+    is_data = config.dataset_type == DatasetType.DATA
+    return Dataset(
+        das_names=f"/Synthetic{config.dataset_type}/{config.year}/NANOAOD{'' if is_data else 'SIM'}",
+        process_group=ProcessGroup.DATA if is_data else ProcessGroup.DRELL_YAN,
+        year=config.year,
+        nanoadod_version=config.nanoaod_version,
+        lhc_run=LHCRun.Run3 if config.year.startswith("RunSummer") else LHCRun.Run2,
+        dataset_type=config.dataset_type,
+        xsec=1.0,
+        filter_eff=1.0,
+        k_factor=1.0,
+        lfns=[str(path)],
+    )
+
+
+def hlt_branches(config: SyntheticConfig) -> list[str]:
+    """
+    HLT branches of the synthetic files: the paths of `hlt_paths`, then the extra ones.
+    """
+    return hlt_paths(config.year) + [
+        f"HLT_Synthetic{i}" for i in range(config.num_extra_hlt_paths)
+    ]
+
+
+def _objects(
+    rng: np.random.Generator, name: str, num_events: int, config: SyntheticConfig
+) -> ak.Array:
+    counts = rng.poisson(config.multiplicities.get(name, 0.0), num_events)
+    n = int(counts.sum())
+    kinematics = KINEMATICS[name]
+
+    fields = {
+        "pt": (kinematics.min_pt + rng.exponential(kinematics.mean_pt, n)).astype(
+            np.float32
+        ),
+        "eta": rng.uniform(-kinematics.max_eta, kinematics.max_eta, n).astype(
+            np.float32
+        ),
+        "phi": rng.uniform(-np.pi, np.pi, n).astype(np.float32),
+    }
+    match name:
+        case "Muon":
+            fields["charge"] = rng.choice([-1, 1], n).astype(np.int32)
+            fields["isPFcand"] = rng.random(n) < 0.95
+        case "Electron":
+            fields["charge"] = rng.choice([-1, 1], n).astype(np.int32)
+        case "Tau":
+            fields["mass"] = rng.uniform(0.2, 1.7, n).astype(np.float32)
+            fields["charge"] = rng.choice([-1, 1], n).astype(np.int32)
+        case "Jet":
+            fields["mass"] = (fields["pt"] * rng.uniform(0.05, 0.2, n)).astype(
+                np.float32
+            )
+            # energy fractions adding up to one, only neutral ones outside the tracker
+            fractions = rng.dirichlet([5.0, 2.0, 0.2, 2.5, 0.1], n)
+            outside_tracker = np.abs(fields["eta"]) > 2.5
+            forward_em = rng.beta(1.0, 4.0, n)[outside_tracker]
+            fractions[outside_tracker] = 0.0
+            fractions[outside_tracker, 1] = 1.0 - forward_em
+            fractions[outside_tracker, 3] = forward_em
+            for i, fraction in enumerate(
+                ["chHEF", "neHEF", "chEmEF", "neEmEF", "muEF"]
+            ):
+                fields[fraction] = fractions[:, i].astype(np.float32)
+            fields["chMultiplicity"] = np.where(
+                outside_tracker, 0, np.minimum(rng.poisson(8, n), 255)
+            ).astype(np.uint8)
+            fields["neMultiplicity"] = np.minimum(rng.poisson(5, n), 255).astype(
+                np.uint8
+            )
+        case "TrigObj":
+            fields["id"] = rng.choice(list(TrigObjId), n).astype(np.uint16)
+            fields["filterBits"] = rng.integers(0, 1 << 16, n).astype(np.int32)
+
+    objects = ak.unflatten(ak.zip(fields), counts)
+    return ak.to_packed(objects[ak.argsort(objects.pt, ascending=False)])
+
+
+def _chunk(
+    rng: np.random.Generator,
+    entry_start: int,
+    entry_stop: int,
+    config: SyntheticConfig,
+) -> dict[str, ak.Array | np.ndarray]:
+    """
+    Content of the entries [entry_start, entry_stop) of a file.
+    """
+    num_events = entry_stop - entry_start
+    entries = np.arange(entry_start, entry_stop, dtype=np.int64)
+
+    content: dict[str, ak.Array | np.ndarray] = {}
+    if config.dataset_type == DatasetType.DATA:
+        lumi_index = (entries // config.events_per_lumi) % (
+            config.num_runs * config.lumis_per_run
+        )
+        content["run"] = (config.first_run + lumi_index // config.lumis_per_run).astype(
+            np.uint32
+        )
+        content["luminosityBlock"] = (1 + lumi_index % config.lumis_per_run).astype(
+            np.uint32
+        )
+    else:
+        content["run"] = np.ones(num_events, dtype=np.uint32)
+        content["luminosityBlock"] = (1 + entries // config.events_per_lumi).astype(
+            np.uint32
+        )
+    content["event"] = (1 + entries).astype(np.uint64)
+
+    if config.dataset_type != DatasetType.DATA:
+        gen_weight = np.where(
+            rng.random(num_events) < config.negative_weight_fraction, -1.0, 1.0
+        ).astype(np.float32)
+        content["genWeight"] = gen_weight
+        content["LHEWeight_originalXWGTUP"] = gen_weight
+
+    muons = _objects(rng, "Muon", num_events, config)
+    trigobjs = _objects(rng, "TrigObj", num_events, config)
+
+    # the leading muon fires HLT_IsoMu24, and has its matching trigger object
+    leading_muon_pt = ak.to_numpy(ak.fill_none(ak.firsts(muons.pt), 0.0))
+    iso_mu24 = (leading_muon_pt > 26.0) & (
+        rng.random(num_events) < config.iso_mu24_efficiency
+    )
+    leading_muons = muons[iso_mu24][:, 0]
+    matched = ak.zip(
+        {
+            "pt": leading_muons.pt,
+            "eta": leading_muons.eta,
+            "phi": leading_muons.phi,
+            "id": np.full(len(leading_muons), TrigObjId.Muon, dtype=np.uint16),
+            "filterBits": np.full(
+                len(leading_muons), ISO_MU24_FILTER_BITS, dtype=np.int32
+            ),
+        }
+    )
+    trigobjs = ak.to_packed(
+        ak.concatenate(
+            [ak.unflatten(matched, iso_mu24.astype(np.int64)), trigobjs], axis=1
+        )
+    )
+
+    for path in hlt_branches(config):
+        content[path] = (
+            iso_mu24
+            if path == "HLT_IsoMu24"
+            else rng.random(num_events) < config.trigger_rate
+        )
+    for flag in FLAG_NAMES:
+        content[flag] = rng.random(num_events) >= config.flag_failure_rate
+
+    content["Muon"] = muons
+    content["Electron"] = _objects(rng, "Electron", num_events, config)
+    content["Tau"] = _objects(rng, "Tau", num_events, config)
+    content["Photon"] = _objects(rng, "Photon", num_events, config)
+    content["Jet"] = _objects(rng, "Jet", num_events, config)
+    content["TrigObj"] = trigobjs
+
+    met_pt = rng.exponential(30.0, num_events).astype(np.float32)
+    met_phi = rng.uniform(-np.pi, np.pi, num_events).astype(np.float32)
+    content["PuppiMET_pt"] = met_pt
+    content["PuppiMET_phi"] = met_phi
+    for shift, factor in (("Up", 1.05), ("Down", 0.95)):
+        content[f"PuppiMET_ptUnclustered{shift}"] = met_pt * np.float32(factor)
+        content[f"PuppiMET_phiUnclustered{shift}"] = met_phi
+
+    return content
+
+
+def write_synthetic_file(
+    path: Path, num_events: int, config: SyntheticConfig = SyntheticConfig()
+) -> Path:
+    """
+    Write a synthetic file of `num_events` events. The content only depends on `config`, and the
+    first entries of a file are the same as the ones of a shorter file.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    ranges = [
+        (start, min(start + config.cluster_entries, num_events))
+        for start in range(0, num_events, config.cluster_entries)
+    ] or [(0, 0)]
+
+    with uproot.recreate(path, compression=uproot.ZSTD(5)) as f:
+        tree = None
+        for i, (entry_start, entry_stop) in enumerate(ranges):
+            rng = np.random.default_rng([config.seed, i])
+            content = _chunk(rng, entry_start, entry_stop, config)
+            if tree is None:
+                tree = f.mktree(
+                    "Events",
+                    {
+                        name: (
+                            column.type
+                            if isinstance(column, ak.Array)
+                            else column.dtype
+                        )
+                        for name, column in content.items()
+                    },
+                )
+            if entry_stop > entry_start:
+                # one cluster per call
+                tree.extend(content)
+
+    return path
+
+
+def synthetic_golden_json(config: SyntheticConfig) -> dict[str, list[list[int]]]:
+    """
+    Every tenth run is not certified, and neither are ten lumisections in the middle of the others.
+    """
+    middle = config.lumis_per_run // 2
+    return {
+        str(config.first_run + i): [
+            [1, middle - 1],
+            [middle + 10, config.lumis_per_run],
+        ]
+        for i in range(config.num_runs)
+        if i % 10 != 9
+    }
+
+
+def _formula(expression: str, variables: list[str]) -> cs.Formula:
+    return cs.Formula(
+        nodetype="formula",
+        expression=expression,
+        parser="TFormula",
+        variables=variables,
+    )
+
+
+def _binning(input: str, edges: list[float], content: list) -> cs.Binning:
+    return cs.Binning(
+        nodetype="binning", input=input, edges=edges, content=content, flow="clamp"
+    )
+
+
+def _jet_id_correction(wp: JetIdWP) -> cs.Correction:
+    """
+    Simplified jet ID: 1 for passing jets, 0 otherwise.
+    """
+    central = _binning(
+        "chHEF",
+        [0.0, 0.01, 1.0],
+        [
+            0.0,
+            _formula(
+                "(x<0.99)*(y<0.9)*(z>0)*(t>1)",
+                ["neHEF", "neEmEF", "chMultiplicity", "multiplicity"],
+            ),
+        ],
+    )
+    if wp == JetIdWP.AK4PUPPI_TightLeptonVeto:
+        central = _binning(
+            "muEF",
+            [0.0, 0.8, 1.0],
+            [_binning("chEmEF", [0.0, 0.8, 1.0], [central, 0.0]), 0.0],
+        )
+    transition = _formula("(x<0.9)*(y<0.99)", ["neHEF", "neEmEF"])
+    forward = _formula("(x<0.4)*(y>1)", ["neEmEF", "neMultiplicity"])
+
+    return cs.Correction(
+        name=str(wp),
+        version=1,
+        inputs=[
+            cs.Variable(name=name, type="real")
+            for name in [
+                "eta",
+                "chHEF",
+                "neHEF",
+                "chEmEF",
+                "neEmEF",
+                "muEF",
+                "chMultiplicity",
+                "neMultiplicity",
+                "multiplicity",
+            ]
+        ],
+        output=cs.Variable(name="jetId", type="real"),
+        data=_binning(
+            "eta",
+            [-5.0, -2.7, -2.6, 2.6, 2.7, 5.0],
+            [forward, transition, central, transition, forward],
+        ),
+    )
+
+
+def _jet_veto_map_correction(name: str, rng: np.random.Generator) -> cs.Correction:
+    """
+    Veto map of 82 x 72 (eta, phi) cells, `HOT_CELL_FRACTION` of them vetoing (non-zero).
+    """
+    eta_edges = np.linspace(-5.191, 5.191, 83)
+    phi_edges = np.linspace(-np.pi, np.pi, 73)
+    content = np.where(rng.random(82 * 72) < HOT_CELL_FRACTION, 100.0, 0.0)
+
+    return cs.Correction(
+        name=name,
+        version=1,
+        inputs=[
+            cs.Variable(name="type", type="string"),
+            cs.Variable(name="eta", type="real"),
+            cs.Variable(name="phi", type="real"),
+        ],
+        output=cs.Variable(name="vetomap", type="real"),
+        data=cs.Category(
+            nodetype="category",
+            input="type",
+            content=[
+                cs.CategoryItem(
+                    key="jetvetomap",
+                    value=cs.MultiBinning(
+                        nodetype="multibinning",
+                        inputs=["eta", "phi"],
+                        edges=[eta_edges.tolist(), phi_edges.tolist()],
+                        content=content.tolist(),
+                        flow="clamp",
+                    ),
+                )
+            ],
+        ),
+    )
+
+
+def _scale_factor_correction(
+    name: str, systematics: tuple[str, ...], rng: np.random.Generator
+) -> cs.Correction:
+    """
+    Scale factors in (|eta|, pt) bins, with the given nominal, up and down systematics.
+    """
+    abseta_edges = [0.0, 0.9, 1.2, 2.1, 2.4]
+    pt_edges = [15.0, 20.0, 25.0, 30.0, 40.0, 50.0, 60.0, 120.0, 200.0]
+    num_bins = (len(abseta_edges) - 1) * (len(pt_edges) - 1)
+    nominal = rng.normal(0.98, 0.01, num_bins)
+    uncertainty = rng.uniform(0.001, 0.01, num_bins)
+
+    return cs.Correction(
+        name=name,
+        version=1,
+        inputs=[
+            cs.Variable(name="abseta", type="real"),
+            cs.Variable(name="pt", type="real"),
+            cs.Variable(name="scale_factors", type="string"),
+        ],
+        output=cs.Variable(name="weight", type="real"),
+        data=cs.Category(
+            nodetype="category",
+            input="scale_factors",
+            content=[
+                cs.CategoryItem(
+                    key=systematic,
+                    value=cs.MultiBinning(
+                        nodetype="multibinning",
+                        inputs=["abseta", "pt"],
+                        edges=[abseta_edges, pt_edges],
+                        content=(nominal + shift * uncertainty).tolist(),
+                        flow="clamp",
+                    ),
+                )
+                for systematic, shift in zip(systematics, (0.0, 1.0, -1.0))
+            ],
+        ),
+    )
+
+
+def _write_correction_set(path: Path, corrections: list[cs.Correction]) -> None:
+    correction_set = cs.CorrectionSet(
+        schema_version=2,
+        description="Synthetic stand-in, see cmsmusic.synthetic",
+        corrections=corrections,
+    )
+    content = correction_set.model_dump_json(exclude_unset=True).encode()
+    if path.suffix == ".gz":
+        content = gzip.compress(content)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+
+
+def write_stand_ins(mirror: Path, config: SyntheticConfig = SyntheticConfig()) -> None:
+    """
+    Write the stand-ins of the /cvmfs inputs of `config.year` into `mirror`.
+    """
+    rng = np.random.default_rng(config.seed)
+
+    golden_json_path = mirrored_path(golden_json(config.year), mirror)
+    golden_json_path.parent.mkdir(parents=True, exist_ok=True)
+    golden_json_path.write_text(
+        json.dumps(synthetic_golden_json(config)), encoding="utf-8"
+    )
+
+    _write_correction_set(
+        mirrored_path(jet_id_file(config.year), mirror),
+        [_jet_id_correction(wp) for wp in JetIdWP],
+    )
+
+    path, name = jet_veto_map(config.year)
+    _write_correction_set(
+        mirrored_path(path, mirror), [_jet_veto_map_correction(name, rng)]
+    )
+
+    # the scale factors of MC, grouped by file
+    mc_config = config.model_copy(update={"dataset_type": DatasetType.BACKGROUND})
+    corrections: dict[str, list[cs.Correction]] = {}
+    for osf in scale_factors(synthetic_dataset(Path(), mc_config)):
+        for sf in osf.scale_factors:
+            corrections.setdefault(sf.path, []).append(
+                _scale_factor_correction(sf.correction, sf.systematics, rng)
+            )
+    for path, _corrections in corrections.items():
+        _write_correction_set(mirrored_path(path, mirror), _corrections)
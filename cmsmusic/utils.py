@@ -55,3 +55,16 @@ def make_null_vector() -> MomentumObject4D:
 
 
 null_vec = make_null_vector
+
+
+def kernel_inputs(*fields: str):
+    """
+    Declares the fields of `Events.data` (dotted paths, e.g. "muons.pt") a kernel reads,
+    so that it can be called with the slim projection `events.project(kernel.inputs)`.
+    """
+
+    def decorator(kernel):
+        kernel.inputs = fields
+        return kernel
+
+    return decorator
@@ -24,27 +24,32 @@ class Variation(NamedTuple):
 
 
 class VariationEngine:
+    """
+    Presents a varied view of the nominal events.
+
+    The payload of the variation is layered over the nominal columns (see `Events.overlay`),
+    so the nominal events are never modified and several variations can be alive at once.
+
+    For DIFFERENTIAL variations, the derived columns and event filters that depend on the
+    varied columns are recomputed (see `DerivationGraph`), everything else is taken from the
+    nominal events.
+    """
+
     def __init__(self, variation: Variation, dataset: Dataset, events: Events):
         self.variation = variation
         self.events = events
-        self.buffer: dict[str, ak.Array]
         self.payload = self.variation.transformer(self.events)
         self.skip = False
 
     def __enter__(self):
-        for field in self.payload:
-            # buffer old field
-            self.events.data[f"{field}_OLD"] = self.events.data[field]
+        if self.variation.variation_type == VariationType.DIFFERENTIAL:
+            columns, event_filters = self.events.derivations.propagate(
+                self.events.data, self.payload
+            )
+            return self.events.overlay(columns, event_filters)
 
-            # set new data
-            self.events.data[field] = self.payload[field]
-
-        return self.events
+        return self.events.overlay(self.payload)
 
     def __exit__(self, exc_type, exc_value, traceback):
-        for field in self.payload:
-            # recover buffered field
-            self.events.data[field] = self.events.data[f"{field}_OLD"]
-
-            # drop useless data
-            del self.events.data[f"{field}_OLD"]
+        # nothing to restore, the nominal events were never touched
+        pass
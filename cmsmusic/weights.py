@@ -0,0 +1,190 @@
+"""
+Per-object scale factors turned into per-event weights.
+
+All the scale factors of a collection are evaluated on the same flattened (selected) objects,
+nominal and up/down at once, and reduced to per-event products. The resulting weight columns are
+computed once per file and every variation only picks the column it needs (see `weight_variation`).
+"""
+
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Literal, NamedTuple
+
+import awkward as ak
+import numpy as np
+from numba import njit
+from numpy.typing import NDArray
+
+from .ak_utils import flat_offsets
+from .corrections import get_correction
+from .dataset import Dataset, DatasetType
+from .eras import Year
+
+if TYPE_CHECKING:
+    from .events import Events
+
+NOMINAL_WEIGHT = "nominal"
+
+
+class ScaleFactor(NamedTuple):
+    """
+    A correctionlib scale factor. `inputs` maps the flat (selected) objects to the correction
+    inputs, except for the last one, the systematic (`nominal`, `up` or `down`, see `systematics`).
+    """
+
+    name: str
+    path: str
+    correction: str
+    inputs: Callable[[ak.Array], tuple[NDArray, ...]]
+    systematics: tuple[str, str, str] = ("nominal", "systup", "systdown")
+
+
+class ObjectScaleFactors(NamedTuple):
+    """
+    Scale factors applied to the objects of `collection` passing `selection` (a jagged mask).
+    """
+
+    collection: str
+    selection: Callable[[ak.Array], ak.Array]
+    scale_factors: list[ScaleFactor]
+
+
+def compute_event_weights(
+    data: ak.Array, object_scale_factors: list[ObjectScaleFactors], names: list[str]
+) -> ak.Array:
+    """
+    Record of per-event weights: `nominal`, the product of all the nominal scale factors, and for
+    each scale factor `<name>_up` and `<name>_down`, the same product with that one shifted.
+
+    The record has exactly the fields `names` (see `weight_names`), so that Data and MC have the
+    same type: the shifts of scale factors not in `object_scale_factors` are the nominal weight.
+    """
+    # per-event product of each scale factor, for each systematic
+    products: dict[str, tuple[NDArray, NDArray, NDArray]] = {}
+    for osf in object_scale_factors:
+        collection = data[osf.collection]
+        selected = collection[osf.selection(collection)]
+        offsets = flat_offsets(selected)
+        flat_objects = ak.flatten(selected)
+
+        for sf in osf.scale_factors:
+            correction = get_correction(sf.path, sf.correction)
+            inputs = sf.inputs(flat_objects)
+            products[sf.name] = tuple(  # type: ignore
+                _segmented_product(
+                    np.asarray(correction.evaluate(*inputs, systematic), np.float64),
+                    offsets,
+                )
+                for systematic in sf.systematics
+            )
+
+    nominal = np.ones(len(data), dtype=np.float64)
+    for nominal_product, _, _ in products.values():
+        nominal *= nominal_product
+
+    weights = {NOMINAL_WEIGHT: nominal}
+    for name, (_, up_product, down_product) in products.items():
+        others = np.ones(len(data), dtype=np.float64)
+        for other_name, (other_product, _, _) in products.items():
+            if other_name != name:
+                others *= other_product
+        weights[f"{name}_up"] = others * up_product
+        weights[f"{name}_down"] = others * down_product
+
+    if not set(weights).issubset(names):
+        raise ValueError(f"Unexpected weights {set(weights) - set(names)}")
+    return ak.zip({name: weights.get(name, nominal) for name in names})
+
+
+def weight_variation(
+    events: "Events", name: str, shift: Literal["up"] | Literal["down"]
+) -> dict[str, ak.Array]:
+    """
+    Variation payload using the `name` weights shifted `up` or `down` as nominal weights.
+    No scale factor is evaluated again.
+    """
+    weights = events.data.weights
+    return {
+        "weights": ak.with_field(weights, weights[f"{name}_{shift}"], NOMINAL_WEIGHT)
+    }
+
+
+@njit(cache=True)
+def _segmented_product(values, offsets):
+    res = np.ones(len(offsets) - 1, dtype=np.float64)
+    for evt in range(len(offsets) - 1):
+        for i in range(offsets[evt], offsets[evt + 1]):
+            res[evt] *= values[i]
+    return res
+
+
+def scale_factors(dataset: Dataset) -> list[ObjectScaleFactors]:
+    """
+    Object scale factors of the era. None for Data.
+    """
+    if dataset.dataset_type == DatasetType.DATA:
+        return []
+    return _era_scale_factors(dataset.year)
+
+
+def weight_names(year: Year) -> list[str]:
+    """
+    Fields of the `weights` record of the era, for Data and MC.
+    """
+    return [NOMINAL_WEIGHT] + [
+        f"{sf.name}_{shift}"
+        for osf in _era_scale_factors(year)
+        for sf in osf.scale_factors
+        for shift in ("up", "down")
+    ]
+
+
+def _era_scale_factors(year: Year) -> list[ObjectScaleFactors]:
+    match year:
+        case Year.RunSummer24:
+            muon_sf_path = "/cvmfs/cms-griddata.cern.ch/cat/metadata/MUO/Run3-24CDEReprocessingFGHIPrompt-Summer24-NanoAODv15/latest/muon_Z.json.gz"
+            return [
+                ObjectScaleFactors(
+                    collection="muons",
+                    # inside the scale factors phase space
+                    selection=lambda muons: (muons.pt >= 15.0)
+                    & (np.abs(muons.eta) < 2.4),
+                    scale_factors=[
+                        ScaleFactor(
+                            name="MuonID",
+                            path=muon_sf_path,
+                            correction="NUM_TightID_DEN_TrackerMuons",
+                            inputs=lambda muons: (
+                                np.abs(np.asarray(muons.eta, np.float64)),
+                                np.asarray(muons.pt, np.float64),
+                            ),
+                        ),
+                        ScaleFactor(
+                            name="MuonIso",
+                            path=muon_sf_path,
+                            correction="NUM_TightPFIso_DEN_TightID",
+                            inputs=lambda muons: (
+                                np.abs(np.asarray(muons.eta, np.float64)),
+                                np.asarray(muons.pt, np.float64),
+                            ),
+                        ),
+                    ],
+                )
+            ]
+        case Year.RunSummer23BPix:
+            raise NotImplementedError(year)
+        case Year.RunSummer23:
+            raise NotImplementedError(year)
+        case Year.RunSummer22EE:
+            raise NotImplementedError(year)
+        case Year.RunSummer22:
+            raise NotImplementedError(year)
+        case Year.Run2018:
+            raise NotImplementedError(year)
+        case Year.Run2017:
+            raise NotImplementedError(year)
+        case Year.Run2016preVFP:
+            raise NotImplementedError(year)
+        case Year.Run2016postVFP:
+            raise NotImplementedError(year)
+        case _:
+            raise ValueError(f"Invalid year {year}")
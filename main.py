@@ -2,6 +2,7 @@ import importlib
 import json
 import logging
 import os
+import shlex
 import time
 from functools import wraps
 from pathlib import Path
@@ -115,11 +116,36 @@ def run_serial(
     parsed_datasets_file: Path = Path("parsed_datasets.json"),
     verbose: bool = False,
     enable_cache: bool = False,
+    compact_events: bool = False,
+    duplicate_index_dir: Path | None = None,
+    preselection: bool = False,
+    skims_dir: Path = Path("skims"),
+    use_skims: bool = typer.Option(
+        False, help="Read the files from their skims in --skims-dir, when they match."
+    ),
+    num_readers: int = typer.Option(
+        0, help="Reader processes of the pipelined mode (see --num-workers)."
+    ),
+    num_workers: int = typer.Option(
+        0, help="Compute processes. If > 0, run each file pipelined, in chunks."
+    ),
+    chunk_entries: int = 200_000,
 ):
     """
     Run selection and classification.
     """
+    from functools import partial
+
     from cmsmusic import run_classification
+    from cmsmusic.classification import run_classification_pipelined
+
+    if num_workers > 0:
+        run_classification = partial(
+            run_classification_pipelined,
+            num_readers=max(num_readers, 1),
+            num_workers=num_workers,
+            chunk_entries=chunk_entries,
+        )
 
     logging_level = logging.WARNING
     if verbose:
@@ -150,9 +176,25 @@ def run_serial(
                         )
                     ):
                         if max_files <= 0 or (max_files > 0 and i + 1 <= max_files):
-                            run_classification(i, dataset, enable_cache)
+                            run_classification(
+                                i,
+                                dataset,
+                                enable_cache,
+                                compact_events,
+                                duplicate_index_dir,
+                                preselection,
+                                skims_dir if use_skims else None,
+                            )
                 case int():
-                    run_classification(file_index, dataset, enable_cache)
+                    run_classification(
+                        file_index,
+                        dataset,
+                        enable_cache,
+                        compact_events,
+                        duplicate_index_dir,
+                        preselection,
+                        skims_dir if use_skims else None,
+                    )
 
 
 @classification_app.command()
@@ -162,6 +204,21 @@ def run_parallel(
     year: msc.Year | None = None,
     max_files: int = -1,
     parsed_datasets_file: Path = Path("parsed_datasets.json"),
+    enable_cache: bool = False,
+    compact_events: bool = False,
+    duplicate_index_dir: Path | None = None,
+    preselection: bool = False,
+    skims_dir: Path = Path("skims"),
+    use_skims: bool = typer.Option(
+        False, help="Read the files from their skims in --skims-dir, when they match."
+    ),
+    num_readers: int = typer.Option(
+        0, help="Reader processes of the pipelined mode (see --num-workers)."
+    ),
+    num_workers: int = typer.Option(
+        0, help="Compute processes. If > 0, run each file pipelined, in chunks."
+    ),
+    chunk_entries: int = 200_000,
 ):
     """
     Run selection and classification.
@@ -177,6 +234,21 @@ def run_parallel(
         msc.Dataset.model_validate(obj) for obj in parsed_datasets
     ]
 
+    # the options of run-serial, forwarded to every job
+    options = [
+        f"--parsed-datasets-file {shlex.quote(str(parsed_datasets_file))}",
+        "--enable-cache" if enable_cache else "--no-enable-cache",
+        "--compact-events" if compact_events else "--no-compact-events",
+        "--preselection" if preselection else "--no-preselection",
+        f"--skims-dir {shlex.quote(str(skims_dir))}",
+        "--use-skims" if use_skims else "--no-use-skims",
+        f"--num-readers {num_readers}",
+        f"--num-workers {num_workers}",
+        f"--chunk-entries {chunk_entries}",
+    ]
+    if duplicate_index_dir is not None:
+        options.append(f"--duplicate-index-dir {shlex.quote(str(duplicate_index_dir))}")
+
     cmds: list[str] = []
     for dataset in parsed_datasets:
         if dataset.process_name == process_name or process_name is None:
@@ -185,7 +257,7 @@ def run_parallel(
                 for i, _ in enumerate(dataset.lfns):
                     if max_files <= 0 or (max_files > 0 and i + 1 <= max_files):
                         cmds.append(
-                            f"music classification run-serial {dataset.process_name} {dataset.year} --file-index {i}"
+                            f"music classification run-serial {dataset.process_name} {dataset.year} --file-index {i} {' '.join(options)}"
                         )
 
     Path("cmds.txt").write_text("\n".join(cmds) + "\n", encoding="utf-8")
@@ -204,6 +276,247 @@ def run_parallel(
     logger.info(f"\n[exit code: {rc}]")
 
 
+@app.command()
+@execution_time
+def deduplicate(
+    year: msc.Year,
+    priority: list[str] = typer.Option(
+        ..., help="Data process names, from the highest to the lowest priority."
+    ),
+    parsed_datasets_file: Path = Path("parsed_datasets.json"),
+    index_dir: Path = Path("duplicate_index"),
+    enable_cache: bool = False,
+):
+    """
+    Build the cross-dataset duplicate event vetoes of Data (see `--duplicate-index-dir`).
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from cmsmusic.deduplication import index_file, resolve_duplicates
+
+    logging_level = logging.INFO
+    setup_logging(logging_level)
+
+    logger = logging.getLogger("MUSiC")
+
+    with parsed_datasets_file.open("r", encoding="utf-8") as f:
+        parsed_datasets: list[msc.Dataset] = json.load(f)
+    parsed_datasets: list[msc.Dataset] = [
+        msc.Dataset.model_validate(obj) for obj in parsed_datasets
+    ]
+
+    datasets: list[msc.Dataset] = []
+    for process_name in priority:
+        matches = [
+            d
+            for d in parsed_datasets
+            if d.process_name == process_name and d.year == year
+        ]
+        if len(matches) != 1:
+            raise ValueError(f"Expected one {process_name} dataset for {year}")
+        datasets.append(matches[0])
+
+    if enable_cache:
+        Path("nanoaod_files_cache").mkdir(parents=True, exist_ok=True)
+
+    with ProcessPoolExecutor() as ex:
+        futures = [
+            ex.submit(index_file, dataset, i, index_dir, enable_cache)
+            for dataset in datasets
+            for i, _ in enumerate(dataset.lfns or [])
+        ]
+        for fut in track(futures, description="Indexing events ..."):
+            fut.result()
+
+    num_vetoed = resolve_duplicates(datasets, index_dir)
+    logger.info(f"Duplicated events vetoed: {num_vetoed}")
+
+
+@app.command()
+@execution_time
+def skim(
+    process_name: str,
+    year: msc.Year,
+    max_files: int = -1,
+    parsed_datasets_file: Path = Path("parsed_datasets.json"),
+    enable_cache: bool = False,
+    duplicate_index_dir: Path | None = None,
+    skims_dir: Path = Path("skims"),
+):
+    """
+    Write local skims of the preselected events, read by `classification run-serial` when they match.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from cmsmusic.classification import warm_start
+    from cmsmusic.skims import skim_file
+
+    logging_level = logging.INFO
+    setup_logging(logging_level)
+
+    logger = logging.getLogger("MUSiC")
+
+    with parsed_datasets_file.open("r", encoding="utf-8") as f:
+        parsed_datasets: list[msc.Dataset] = json.load(f)
+    parsed_datasets: list[msc.Dataset] = [
+        msc.Dataset.model_validate(obj) for obj in parsed_datasets
+    ]
+
+    if enable_cache:
+        Path("nanoaod_files_cache").mkdir(parents=True, exist_ok=True)
+
+    for dataset in parsed_datasets:
+        if dataset.process_name == process_name and dataset.year == year:
+            assert dataset.lfns is not None
+            with ProcessPoolExecutor(initializer=warm_start, initargs=(dataset,)) as ex:
+                futures = [
+                    ex.submit(
+                        skim_file,
+                        dataset,
+                        i,
+                        enable_cache,
+                        duplicate_index_dir,
+                        skims_dir,
+                    )
+                    for i, _ in enumerate(dataset.lfns)
+                    if max_files <= 0 or i + 1 <= max_files
+                ]
+                for fut in track(
+                    futures, description=f"Skimming {dataset.short_str()} ..."
+                ):
+                    logger.info(f"Skim written: {fut.result()}")
+
+
+@app.command()
+@execution_time
+def lumis_report(
+    year: msc.Year,
+    output: Path | None = None,
+):
+    """
+    Merge the lumisections processed by all the Data tasks of a year into a golden-JSON-like report.
+    """
+    from cmsmusic.filters.lumi_filter import golden_json, load_lumi_mask_index
+    from cmsmusic.lumi_sections import (
+        PROCESSED_LUMIS_DIR,
+        certified,
+        load_lumi_ranges,
+        merge_lumi_ranges,
+        num_lumis,
+        write_golden_json,
+    )
+
+    logging_level = logging.INFO
+    setup_logging(logging_level)
+
+    logger = logging.getLogger("MUSiC")
+
+    inputs = sorted((PROCESSED_LUMIS_DIR / str(year)).glob("*/*.npz"))
+    processed = merge_lumi_ranges([load_lumi_ranges(p) for p in inputs])
+
+    if output is None:
+        output = Path(f"processed_lumis_{year}.json")
+    write_golden_json(output, processed)
+
+    golden = load_lumi_mask_index(golden_json(year))
+    num_certified = int(certified(processed, golden).sum())
+    logger.info(
+        f"Merged {len(inputs)} tasks into {output}: {num_lumis(processed)} lumisections processed, "
+        f"{num_certified} of the {num_lumis(golden)} certified ones "
+        f"({num_lumis(processed) - num_certified} not certified)"
+    )
+
+
+@app.command()
+@execution_time
+def synthetic(
+    output: Path,
+    num_events: int = 100_000,
+    year: msc.Year = msc.Year.RunSummer24,
+    dataset_type: DatasetType = DatasetType.DATA,
+    stand_ins_dir: Path | None = typer.Option(
+        None,
+        help="Also write the stand-ins of the /cvmfs inputs there (see MUSIC_CVMFS_MIRROR).",
+    ),
+    seed: int = 1,
+):
+    """
+    Write a synthetic NanoAOD-like file, to run without grid access.
+    """
+    from cmsmusic.synthetic import (
+        SyntheticConfig,
+        write_stand_ins,
+        write_synthetic_file,
+    )
+
+    logging_level = logging.INFO
+    setup_logging(logging_level)
+
+    logger = logging.getLogger("MUSiC")
+
+    config = SyntheticConfig(year=year, dataset_type=dataset_type, seed=seed)
+    write_synthetic_file(output, num_events, config)
+    logger.info(f"Synthetic file written: {output}")
+
+    if stand_ins_dir is not None:
+        write_stand_ins(stand_ins_dir, config)
+        logger.info(
+            f"Stand-ins written: export MUSIC_CVMFS_MIRROR={stand_ins_dir.resolve()}"
+        )
+
+
+@app.command()
+@execution_time
+def benchmark(
+    num_events: list[int] = typer.Option([10_000, 100_000]),
+    dataset_type: list[DatasetType] = typer.Option(
+        [DatasetType.DATA, DatasetType.BACKGROUND]
+    ),
+    repeat: int = 3,
+    benchmark_dir: Path = Path("benchmark"),
+    output: Path | None = typer.Option(None, help="Also write the results as JSON."),
+    verbose: bool = False,
+):
+    """
+    Time the building blocks of the analysis on synthetic files, without grid access.
+    """
+    from rich.console import Console
+    from rich.table import Table
+
+    from cmsmusic.benchmark import run_benchmarks
+
+    logging_level = logging.WARNING
+    if verbose:
+        logging_level = logging.INFO
+    setup_logging(logging_level)
+
+    results = run_benchmarks(num_events, dataset_type, repeat, benchmark_dir)
+
+    table = Table(title=f"Benchmarks (fastest of {repeat})")
+    for column in ["Benchmark", "Dataset type", "Events", "Time [s]", "Events/s"]:
+        table.add_column(column, justify="left" if column == "Benchmark" else "right")
+    for result in results:
+        table.add_row(
+            result.name,
+            str(result.dataset_type),
+            str(result.num_events),
+            f"{result.seconds:.4f}",
+            f"{result.events_per_second:.3g}",
+        )
+    Console().print(table)
+
+    if output is not None:
+        with output.open("w", encoding="utf-8") as f:
+            json.dump(
+                [
+                    {**result._asdict(), "events_per_second": result.events_per_second}
+                    for result in results
+                ],
+                f,
+                indent=2,
+            )
+
+
 @plotter_app.command()
 @execution_time
 def plot(